@@ -0,0 +1,107 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+from tracing import span
+
+# Быстрый ответ, когда LLM перегружен и запрос не дождался своей очереди
+OVERLOADED_REPLY = "Сейчас много обращений — менеджер ответит через минуту. Если удобно, оставьте телефон или email, и мы свяжемся с вами сами."
+
+
+class AdmissionController:
+    """
+    Контроль допуска к LLM: не больше max_concurrent генераций одновременно,
+    не больше max_queue ожидающих и не дольше queue_timeout секунд в очереди.
+    Всё, что сверх этого, сразу получает отказ (load shedding),
+    чтобы задержка не росла для всех остальных.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, queue_timeout: float):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._active = 0
+        self._waiting = 0
+
+        # Счётчики для /health
+        self.admitted = 0
+        self.shed_queue_full = 0
+        self.shed_timeout = 0
+        self.max_waiting_seen = 0
+
+    async def acquire(self) -> bool:
+        """Ждём свободный слот. False — запрос отброшен."""
+        with span("admission_wait") as attrs:
+            admitted = await self._acquire()
+            attrs["admitted"] = admitted
+            return admitted
+
+    def _queued(self) -> int:
+        """
+        Длина очереди по занятым местам: после release() разбуженный запрос
+        ещё числится в _waiting, хотя слот уже его.
+        """
+        return max(0, self._active + self._waiting - self.max_concurrent)
+
+    async def _acquire(self) -> bool:
+        # Место занимаем синхронно, до первого await: semaphore.locked()
+        # не видит запросы, пришедшие в том же тике цикла, и пропустил бы их все
+        if self._active + self._waiting >= self.max_concurrent + self.max_queue:
+            self.shed_queue_full += 1
+            print(f"🚧 LLM перегружен: очередь полна ({self._queued()}), отказ")
+            return False
+
+        if not self._semaphore.locked():
+            # Свободный слот: Semaphore.acquire() берёт его без ожидания, в очередь не встаём
+            await self._semaphore.acquire()
+        else:
+            admitted = await self._wait_in_queue()
+            if not admitted:
+                return False
+
+        self._active += 1
+        self.admitted += 1
+        return True
+
+    async def _wait_in_queue(self) -> bool:
+        self._waiting += 1
+        self.max_waiting_seen = max(self.max_waiting_seen, self._queued())
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.shed_timeout += 1
+            print(f"🚧 LLM перегружен: ожидание больше {self.queue_timeout} с, отказ")
+            return False
+        finally:
+            self._waiting -= 1
+        return True
+
+    def release(self):
+        self._active -= 1
+        self._semaphore.release()
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        async with controller.slot() as admitted:
+            if not admitted: ... отдаём OVERLOADED_REPLY
+        """
+        admitted = await self.acquire()
+        try:
+            yield admitted
+        finally:
+            if admitted:
+                self.release()
+
+    def stats(self) -> dict:
+        return {
+            "active": self._active,
+            "queued": self._queued(),
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "queue_timeout_seconds": self.queue_timeout,
+            "admitted": self.admitted,
+            "shed_queue_full": self.shed_queue_full,
+            "shed_timeout": self.shed_timeout,
+            "max_queued_seen": self.max_waiting_seen,
+        }
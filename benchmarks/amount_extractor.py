@@ -0,0 +1,164 @@
+"""
+Пропускная способность извлечения суммы заявки.
+
+    python benchmarks/amount_extractor.py
+    python benchmarks/amount_extractor.py --rounds 10 --baseline <ревизия>
+
+Сравниваем текущий check_interesting_application (телефоны + normalize_numbers +
+каскад шаблонов) с каскадом до появления ru_numbers.py: старая версия
+chatbot_logic.py берётся из git. Печать отладки отключена в обоих случаях —
+меряем разбор, а не вывод в консоль. Раунды чередуются, берём медиану.
+
+Затем — патологические входы (длинные цепочки цифр и пробелов, повторы
+числительных, сообщения на 100k символов) на 1k, 10k и 100k символов:
+время на 1k символов не должно расти с длиной, иначе где-то в регулярках
+появился возврат (backtracking) и разбор стал сверхлинейным.
+"""
+import os
+import sys
+import time
+import types
+import argparse
+import contextlib
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+with contextlib.redirect_stdout(None):
+    import chatbot_logic  # noqa: E402
+from ru_numbers import normalize_numbers  # noqa: E402
+
+# Типичные сообщения с сайта: вопросы без сумм, заявки цифрами и словами,
+# телефоны, длинные описания
+MESSAGES = [
+    "Здравствуйте! Есть ли в наличии труба 57х3.5 ст20?",
+    "Сколько стоит лист 2 мм горячекатаный?",
+    "Нужна арматура А500С 12 мм, около 5 тонн",
+    "Хотим заказать профнастил на 150000 рублей, мой телефон +7 916 123-45-67",
+    "Заказ на сумму 75000, швеллер 10П 30 шт",
+    "Купить уголок 50х50х5, 2 тонны по 65000",
+    "Бюджет полтора миллиона, нужна металлоконструкция, оформим договор",
+    "Цена 1,5 млн за партию устраивает, когда поставка?",
+    "Оплатим 100 000 руб сразу, нужен лист оцинкованный",
+    "Итого 150 000,50 руб по счёту, арматура",
+    "Сумма заказа 1.000.000 руб, балка 20Б1",
+    "Подскажите по доставке в область, металл заберём сами",
+    "Оптовая партия рулона 2,5 тонны, звоните 89161234567",
+    "Нужен перфорированный лист 1250х2500, штук двадцать",
+    "Интересует арматура, сто тысяч бюджет, заявку пришлю на почту",
+] + [
+    "Добрый день. " + "Интересует металлопрокат для стройки, список позиций во вложении. " * 20
+    + "Ориентировочно на 300 тыс.",
+]
+
+
+# Патологические входы: фрагмент повторяется до нужной длины
+ADVERSARIAL = {
+    "цифры": "1234567890",
+    "цифры с пробелами": "1 ",
+    "группы тысяч": "100 000 ",
+    "группы без денег": "100 100 шт ",
+    "точки и запятые": "1.000,",
+    "числительные": "сто двадцать пять тысяч ",
+    "повтор одного слова": "тысяча ",
+    "телефоны": "+7 916 123-45-67 ",
+    "обычный текст": "Интересует лист 2 мм 5 тонн по 78 000 руб, доставка. ",
+}
+SIZES = [1_000, 10_000, 100_000]
+
+
+def load_baseline(revision: str):
+    """Модуль chatbot_logic из указанной ревизии git."""
+    source = subprocess.run(
+        ["git", "show", f"{revision}:chatbot_logic.py"],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    module = types.ModuleType("chatbot_logic_baseline")
+    exec(compile(source, f"{revision}:chatbot_logic.py", "exec"), module.__dict__)
+    return module
+
+
+def default_baseline() -> str:
+    """Ревизия перед коммитом, добавившим ru_numbers.py."""
+    added = subprocess.run(
+        ["git", "log", "--diff-filter=A", "--format=%H", "--", "ru_numbers.py"],
+        check=True, capture_output=True, text=True,
+    ).stdout.split()
+    return f"{added[-1]}^"
+
+
+def run_round(check, count: int) -> float:
+    """Сообщений в секунду."""
+    with contextlib.redirect_stdout(None):
+        started = time.perf_counter()
+        for i in range(count):
+            check(MESSAGES[i % len(MESSAGES)])
+        elapsed = time.perf_counter() - started
+    return count / elapsed
+
+
+def time_call(check, text: str, rounds: int) -> float:
+    """Медианное время одного вызова, с."""
+    timings = []
+    with contextlib.redirect_stdout(None):
+        for _ in range(rounds):
+            started = time.perf_counter()
+            check(text)
+            timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def run_adversarial(rounds: int):
+    check = chatbot_logic.check_interesting_application
+    print(f"\n{'вход':<22}" + "".join(f"{f'{size // 1000}k, мкс/1k':>14}" for size in SIZES) + f"{'рост':>8}")
+    worst = 0.0
+    for name, piece in ADVERSARIAL.items():
+        per_k = []
+        for size in SIZES:
+            text = (piece * (size // len(piece) + 1))[:size]
+            per_k.append(time_call(check, text, rounds) / (size / 1000) * 1e6)
+        # При линейном разборе время на 1k символов одинаково на любой длине
+        growth = per_k[-1] / per_k[0]
+        worst = max(worst, growth)
+        print(f"{name:<22}" + "".join(f"{value:>14.1f}" for value in per_k) + f"{growth:>7.1f}×")
+    verdict = "линейно" if worst < 3 else "⚠️ сверхлинейный рост"
+    print(f"Худший рост времени на 1k символов при 100× длине: {worst:.1f}× — {verdict}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=20000, help="сообщений в раунде")
+    parser.add_argument("--rounds", type=int, default=7)
+    parser.add_argument("--baseline", default=None, help="ревизия git со старым каскадом")
+    parser.add_argument("--adversarial-rounds", type=int, default=5, help="повторов на патологический вход")
+    args = parser.parse_args()
+
+    revision = args.baseline or default_baseline()
+    baseline = load_baseline(revision)
+
+    results = {"baseline": [], "current": [], "normalize": []}
+    checks = {
+        "baseline": baseline.check_interesting_application,
+        "current": chatbot_logic.check_interesting_application,
+        "normalize": lambda text: normalize_numbers(text.lower()),
+    }
+    for check in checks.values():
+        run_round(check, len(MESSAGES))  # прогрев
+    for _ in range(args.rounds):
+        for name, check in checks.items():
+            results[name].append(run_round(check, args.messages))
+
+    print(f"Старый каскад: {revision}")
+    for name, rates in results.items():
+        print(f"{name:>10}: {statistics.median(rates):>10,.0f} сообщ/с")
+    ratio = statistics.median(results["current"]) / statistics.median(results["baseline"])
+    print(f"Текущий / старый: {ratio:.0%}")
+
+    run_adversarial(args.adversarial_rounds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Поиск по каталогу на 100k позиций.
+
+    python benchmarks/catalog_search.py
+    python benchmarks/catalog_search.py --skus 200000 --queries 5000
+
+Каталог синтетический: типы проката × марки × размеры × ГОСТы, как в
+catalog.example.csv. Меряем построение индекса и задержку search() на
+типичных вопросах клиентов (слова, марки, размеры, диапазоны).
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import contextlib
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+with contextlib.redirect_stdout(None):
+    from catalog import Catalog, CatalogItem  # noqa: E402
+
+PRODUCTS = [
+    ("Лист г/к", "Листовой прокат", "19903-2015", "thickness"),
+    ("Лист х/к", "Листовой прокат", "19904-90", "thickness"),
+    ("Лист оцинкованный", "Листовой прокат", "14918-2020", "thickness"),
+    ("Лист рифлёный", "Листовой прокат", "8568-77", "thickness"),
+    ("Труба электросварная", "Трубы", "10704-91", "pipe"),
+    ("Труба профильная", "Трубы", "30245-2003", "pipe"),
+    ("Труба бесшовная", "Трубы", "8732-78", "pipe"),
+    ("Арматура", "Арматура", "34028-2016", "diameter"),
+    ("Круг", "Сортовой прокат", "2590-2006", "diameter"),
+    ("Швеллер", "Фасонный прокат", "8240-97", "thickness"),
+    ("Уголок равнополочный", "Фасонный прокат", "8509-93", "thickness"),
+    ("Балка двутавровая", "Фасонный прокат", "57837-2017", "thickness"),
+]
+GRADES = ["Ст3сп", "Ст3пс", "09Г2С", "08пс", "А500С", "А240", "Ст20", "Ст45", "12Х18Н10Т", "AISI 304"]
+THICKNESS = [0.5, 0.7, 1, 1.5, 2, 2.5, 3, 4, 5, 6, 8, 10, 12, 16, 20]
+DIAMETER = [6, 8, 10, 12, 14, 16, 20, 25, 32, 40, 57, 76, 89, 108, 159]
+
+QUERIES = [
+    "лист 2 мм",
+    "Сколько стоит лист оцинкованный 0,7 мм?",
+    "труба 57х3 есть в наличии?",
+    "арматура А500С 12 мм цена",
+    "нужен лист 09г2с толщина от 4 до 10",
+    "круг ст45 диаметр 40",
+    "швеллер",
+    "балка двутавровая ст3сп",
+    "труба профильная стенка 3",
+    "лист aisi 304 толщина 1",
+    "уголок 5 мм 100 штук",
+    "Здравствуйте, есть ли доставка?",
+]
+
+
+def build_items(count: int, seed: int = 1) -> list:
+    rng = random.Random(seed)
+    items = []
+    for index in range(count):
+        name, category, gost, size = PRODUCTS[index % len(PRODUCTS)]
+        grade = rng.choice(GRADES)
+        thickness = rng.choice(THICKNESS)
+        diameter = rng.choice(DIAMETER) if size in ("pipe", "diameter") else None
+        if size == "pipe":
+            title = f"{name} {diameter:g}х{thickness:g}"
+        elif size == "diameter":
+            title = f"{name} {grade} {diameter:g} мм"
+            thickness = None
+        else:
+            title = f"{name} {thickness:g} мм"
+        items.append(CatalogItem(
+            sku=f"SKU-{index}", name=title, category=category, gost=gost, grade=grade,
+            thickness_mm=thickness, diameter_mm=diameter,
+            price=rng.randrange(50_000, 300_000, 500), in_stock=rng.random() < 0.7,
+        ))
+    return items
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--skus", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    items = build_items(args.skus)
+    started = time.perf_counter()
+    catalog = Catalog(items)
+    build = time.perf_counter() - started
+    print(f"Каталог: {len(catalog):,} позиций, {len(catalog._postings):,} токенов, индекс за {build:.2f} с")
+
+    for query in QUERIES:
+        catalog.search(query, args.k)  # прогрев
+
+    latencies = {query: [] for query in QUERIES}
+    found = {}
+    for i in range(args.queries):
+        query = QUERIES[i % len(QUERIES)]
+        started = time.perf_counter()
+        found[query] = len(catalog.search(query, args.k))
+        latencies[query].append((time.perf_counter() - started) * 1000)
+
+    timings = []
+    print(f"{'запрос':<45} {'найдено':>8} {'медиана, мс':>12}")
+    for query, values in latencies.items():
+        timings.extend(values)
+        print(f"{query:<45} {found[query]:>8} {statistics.median(values):>12.3f}")
+    timings.sort()
+    p99 = timings[int(len(timings) * 0.99) - 1]
+    print(f"Все запросы: медиана {statistics.median(timings):.3f} мс, p99 {p99:.3f} мс, "
+          f"максимум {timings[-1]:.3f} мс")
+
+
+if __name__ == "__main__":
+    main()
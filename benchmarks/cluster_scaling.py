@@ -0,0 +1,159 @@
+"""
+Масштабирование пути без LLM по воркерам serve.py.
+
+    python benchmarks/cluster_scaling.py
+    python benchmarks/cluster_scaling.py --max-workers 8 --seconds 10 --path /health
+
+Для WEB_CONCURRENCY = 1..N поднимаем serve.py и нагружаем его
+несколькими процессами-клиентами (чтобы упиралось не в генератор нагрузки):
+  router — запросы идут через маршрутизатор на $PORT, как в продакшене;
+           при WEB_CONCURRENCY=1 маршрутизатора нет, uvicorn слушает $PORT сам;
+  direct — те же воркеры, но клиенты ходят на их порты напрямую.
+Разница router/direct — цена маршрутизатора: все байты проходят через один
+процесс Python (serve._pipe), и при многих ядрах упереться можно в него.
+Каждый запрос — отдельное соединение: маршрутизатор всё равно закрывает
+соединение после ответа. Числа имеют смысл, только если ядер не меньше,
+чем воркеров плюс процессов-клиентов.
+"""
+import os
+import sys
+import time
+import socket
+import signal
+import asyncio
+import argparse
+import subprocess
+import multiprocessing
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+
+def free_port_block(size: int) -> int:
+    """Начало диапазона из size свободных портов подряд."""
+    for _ in range(100):
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            base = probe.getsockname()[1]
+        if base + size >= 65535:
+            continue
+        try:
+            sockets = []
+            for port in range(base, base + size):
+                s = socket.socket()
+                sockets.append(s)
+                s.bind(("127.0.0.1", port))
+            return base
+        except OSError:
+            continue
+        finally:
+            for s in sockets:
+                s.close()
+    raise RuntimeError("нет свободных портов")
+
+
+def start_cluster(workers: int, port: int) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "WEB_CONCURRENCY": str(workers),
+        "PORT": str(port),
+        "WORKER_BASE_PORT": str(port + 1),
+        "ENVIRONMENT": "development",
+        "SESSION_DB_PATH": "",
+        "RENDER_EXTERNAL_URL": "",
+    }
+    env.pop("REPLICATE_API_TOKEN", None)
+    return subprocess.Popen([sys.executable, "serve.py"], env=env, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.DEVNULL, start_new_session=True)
+
+
+def wait_ready(ports: list, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    for port in ports:
+        while True:
+            try:
+                with socket.create_connection(("127.0.0.1", port), timeout=1) as conn:
+                    conn.sendall(b"GET /ping HTTP/1.1\r\nHost: bench\r\nConnection: close\r\n\r\n")
+                    if conn.recv(16).startswith(b"HTTP/1.1 200"):
+                        break
+            except OSError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"порт {port} не отвечает")
+            time.sleep(0.2)
+
+
+def stop_cluster(process: subprocess.Popen):
+    os.killpg(process.pid, signal.SIGTERM)
+    try:
+        process.wait(timeout=20)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+
+
+async def _load(ports: list, path: str, connections: int, seconds: float, client: int) -> int:
+    deadline = time.monotonic() + seconds
+    done = 0
+
+    async def loop(index: int):
+        nonlocal done
+        port = ports[index % len(ports)]
+        # Токен сессии разный у каждого соединения — маршрутизатор раскладывает их по воркерам
+        request = (f"GET {path} HTTP/1.1\r\nHost: bench\r\nX-Session-Id: bench-{client}-{index}\r\n"
+                   f"Connection: close\r\n\r\n").encode()
+        while time.monotonic() < deadline:
+            try:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                writer.write(request)
+                response = await reader.read()
+                writer.close()
+            except OSError:
+                continue
+            if response.startswith(b"HTTP/1.1 200"):
+                done += 1
+
+    await asyncio.gather(*(loop(i) for i in range(connections)))
+    return done
+
+
+def _client(args) -> int:
+    return asyncio.run(_load(*args))
+
+
+def measure(ports: list, path: str, clients: int, connections: int, seconds: float) -> float:
+    """Успешных запросов в секунду со всех клиентов."""
+    jobs = [(ports, path, connections, seconds, client) for client in range(clients)]
+    with multiprocessing.Pool(clients) as pool:
+        return sum(pool.map(_client, jobs)) / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--clients", type=int, default=2, help="процессов-генераторов нагрузки")
+    parser.add_argument("--connections", type=int, default=32, help="одновременных соединений на клиента")
+    parser.add_argument("--path", default="/health")
+    args = parser.parse_args()
+
+    print(f"Ядер: {os.cpu_count()}, клиентов: {args.clients} × {args.connections} соединений, {args.path}")
+    print(f"{'воркеров':>8} {'router, з/с':>12} {'direct, з/с':>12} {'router/1':>9} {'router/direct':>14}")
+    base = None
+    for workers in range(1, args.max_workers + 1):
+        port = free_port_block(workers + 1)
+        process = start_cluster(workers, port)
+        try:
+            worker_ports = [port] if workers == 1 else [port + 1 + i for i in range(workers)]
+            wait_ready([port] + (worker_ports if workers > 1 else []))
+            routed = measure([port], args.path, args.clients, args.connections, args.seconds)
+            direct = measure(worker_ports, args.path, args.clients, args.connections, args.seconds)
+        finally:
+            stop_cluster(process)
+        base = base or routed
+        print(f"{workers:>8} {routed:>12.0f} {direct:>12.0f} {routed / base:>9.2f} {routed / direct:>14.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Цена сериализации JSON-ответа на запрос.
+
+    python benchmarks/json_responses.py
+    python benchmarks/json_responses.py --requests 20000
+
+Приложение вызываем напрямую через ASGI, без сети и HTTP-клиента. Сравниваем
+на одних и тех же данных:
+  dict      — обработчик отдаёт dict без response_model (как было раньше):
+              jsonable_encoder + stdlib json;
+  model     — response_model: FastAPI сериализует сразу в байты через Pydantic;
+  bytes     — заранее сериализованный ответ (/ и /ping).
+Отдельно — те же эндпоинты в настоящем main.app (с middleware).
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import contextlib
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+os.environ.setdefault("ENVIRONMENT", "development")
+os.environ.setdefault("SESSION_DB_PATH", "")
+os.environ.setdefault("RENDER_EXTERNAL_URL", "")
+os.environ.pop("REPLICATE_API_TOKEN", None)
+
+with contextlib.redirect_stdout(None):
+    import main  # noqa: E402
+from fastapi import FastAPI, Request, Response  # noqa: E402
+from schemas import HealthResponse, ServiceInfo, PingResponse, ChatResponse  # noqa: E402
+
+
+async def call(app, path: str):
+    scope = {
+        "type": "http", "method": "GET", "path": path, "raw_path": path.encode(),
+        "query_string": b"", "headers": [], "http_version": "1.1", "scheme": "http",
+        "server": ("bench", 80), "client": ("198.51.100.1", 40000), "root_path": "",
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    await app(scope, receive, send)
+
+
+async def build_apps() -> dict:
+    """Три варианта одних и тех же эндпоинтов на голом FastAPI."""
+    with contextlib.redirect_stdout(None):
+        health = await main.health_check(Request({"type": "http", "method": "GET", "headers": []}))
+    root = json.loads(main.ROOT_PAYLOAD)
+    ping = json.loads(main.PING_PAYLOAD)
+    chat = {"reply": "Добрый день! Лист 2 мм есть в наличии, 78 000 руб/т. " * 4}
+    payloads = {"/": (root, ServiceInfo), "/ping": (ping, PingResponse),
+                "/health": (health, HealthResponse), "/chat": (chat, ChatResponse)}
+
+    def endpoint(result):
+        # async, как в main.py: синхронный обработчик ушёл бы в пул потоков,
+        # и переключение потоков заглушило бы разницу в сериализации
+        async def handler():
+            return result() if callable(result) else result
+        return handler
+
+    plain, typed, precomputed = FastAPI(), FastAPI(), FastAPI()
+    for path, (payload, model) in payloads.items():
+        body = model.model_validate(payload).model_dump_json().encode()
+        plain.get(path)(endpoint(payload))
+        typed.get(path, response_model=model)(endpoint(payload))
+        precomputed.get(path, response_class=Response)(
+            endpoint(lambda body=body: Response(content=body, media_type="application/json")))
+    return {"dict": plain, "model": typed, "bytes": precomputed, "main.app": main.app}
+
+
+async def measure(app, path: str, count: int) -> list:
+    timings = []
+    for _ in range(count):
+        started = time.perf_counter()
+        await call(app, path)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+async def run(count: int, rounds: int):
+    apps = await build_apps()
+    paths = ["/", "/ping", "/health", "/chat"]
+    print(f"{'эндпоинт':<10}" + "".join(f"{name:>12}" for name in apps) + "   (мкс на запрос, медиана)")
+    with contextlib.redirect_stdout(None):
+        for app in apps.values():
+            for path in paths:
+                await measure(app, path, 200)  # прогрев
+        rows = []
+        for path in paths:
+            # настоящий /chat — POST с разбором заявки и LLM, его здесь не гоняем
+            names = [name for name in apps if not (name == "main.app" and path == "/chat")]
+            timings = {name: [] for name in names}
+            # Варианты чередуем раундами, чтобы дрейф частоты CPU не попадал в сравнение
+            for _ in range(rounds):
+                for name in names:
+                    timings[name].extend(await measure(apps[name], path, count // rounds))
+            rows.append((path, [statistics.median(timings[name]) * 1e6 if name in timings else None
+                                for name in apps]))
+    for path, row in rows:
+        print(f"{path:<10}" + "".join(f"{value:>12.1f}" if value is not None else f"{'-':>12}" for value in row))
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(run(args.requests, args.rounds))
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,100 @@
+"""
+Replicate против llama.cpp: задержка первого токена и скорость генерации.
+
+    REPLICATE_API_TOKEN=r8_... LLM_MODEL_PATH=models/model.gguf python benchmarks/llm_backends.py
+    python benchmarks/llm_backends.py --runs 10 --max-tokens 200
+
+Для каждого настроенного backend'а несколько раз стримим ответ на типичные
+вопросы клиентов и печатаем медианы:
+  первый токен — от вызова stream() до первого куска текста (для Replicate
+                 сюда входят сеть, очередь и холодный старт модели);
+  токенов/с    — куски текста после первого, делённые на время от первого
+                 до последнего (оба backend'а отдают примерно по токену).
+Backend без токена, без llama-cpp-python или без модели пропускается.
+"""
+import os
+import sys
+import time
+import argparse
+import contextlib
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+with contextlib.redirect_stdout(None):
+    import llm_backends  # noqa: E402
+    from llm_backends import ReplicateBackend, LlamaCppBackend  # noqa: E402
+
+PROMPTS = [
+    "Вы — консультант металлобазы. Клиент: Сколько стоит лист 2 мм? Ответ:",
+    "Вы — консультант металлобазы. Клиент: Есть ли доставка арматуры А500С 12 мм по области? Ответ:",
+    "Вы — консультант металлобазы. Клиент: Нужна труба 57х3.5, 2 тонны, какие сроки? Ответ:",
+]
+
+
+def build_backends() -> dict:
+    backends = {}
+    token = os.getenv("REPLICATE_API_TOKEN")
+    if token:
+        backends["replicate"] = ReplicateBackend(
+            token, model=os.getenv("REPLICATE_MODEL", "meta/meta-llama-3-70b-instruct"))
+    else:
+        print("⏭️ replicate: нет REPLICATE_API_TOKEN")
+    try:
+        threads = os.getenv("LLM_THREADS")
+        backends["llamacpp"] = LlamaCppBackend(
+            os.getenv("LLM_MODEL_PATH"), n_threads=int(threads) if threads else None,
+            n_ctx=int(os.getenv("LLM_CONTEXT_SIZE", "4096")))
+    except RuntimeError as e:
+        print(f"⏭️ llamacpp: {e}")
+    return backends
+
+
+def measure(backend, prompt: str) -> tuple:
+    """(первый токен, с; токенов/с после первого; всего кусков)."""
+    started = time.perf_counter()
+    first = last = None
+    chunks = 0
+    for _ in backend.stream(prompt):
+        last = time.perf_counter()
+        if first is None:
+            first = last
+        chunks += 1
+    if first is None:
+        raise RuntimeError("пустой ответ")
+    rate = (chunks - 1) / (last - first) if chunks > 1 and last > first else 0.0
+    return first - started, rate, chunks
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5, help="прогонов на каждый вопрос")
+    parser.add_argument("--max-tokens", type=int, default=150)
+    args = parser.parse_args()
+
+    # Ограничиваем длину ответа одинаково для обоих backend'ов
+    llm_backends.GENERATION_PARAMS["max_tokens"] = args.max_tokens
+    backends = build_backends()
+    if not backends:
+        print("Нет ни одного настроенного backend'а")
+        return
+
+    print(f"{'backend':<55} {'первый токен, с':>16} {'токенов/с':>10} {'токенов':>8}")
+    for name, backend in backends.items():
+        measure(backend, PROMPTS[0])  # прогрев: холодный старт и загрузка модели
+        firsts, rates, counts = [], [], []
+        # Вопросы чередуем, чтобы кэш промпта не давал одному из них фору
+        for _ in range(args.runs):
+            for prompt in PROMPTS:
+                first, rate, chunks = measure(backend, prompt)
+                firsts.append(first)
+                rates.append(rate)
+                counts.append(chunks)
+        print(f"{backend.describe():<55} {statistics.median(firsts):>16.2f} "
+              f"{statistics.median(rates):>10.1f} {statistics.median(counts):>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
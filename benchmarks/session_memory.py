@@ -0,0 +1,97 @@
+"""
+Память на сессию: SessionRecord против прежнего словаря с text_parts.
+
+    python benchmarks/session_memory.py
+    python benchmarks/session_memory.py --sessions 10000 100000 --turns 4 --long-sessions 2000
+
+Считаем через tracemalloc всё, что держит user_sessions: ключ, запись,
+буфер сообщений и сами строки. Сообщения у каждой сессии свои,
+чтобы интернирование строк не занижало результат.
+"""
+import os
+import sys
+import argparse
+import contextlib
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sessions import SessionRecord  # noqa: E402
+from chatbot_logic import score_application  # noqa: E402
+
+MESSAGE = "Нужна труба профильная 80х80х4 ст3, около 12 тонн, доставка в Подольск, счёт на юрлицо. Заявка №{}-{}"
+
+
+def legacy_session(amount: int) -> dict:
+    """Запись сессии до перехода на SessionRecord."""
+    return {
+        "created_at": datetime.now(),
+        "amount": amount,
+        "phone": None,
+        "email": None,
+        "text_parts": [],
+        "email_sent": False,
+        "incomplete_sent": False,
+        "reminder_sent": False,
+        "message_count": 0,
+    }
+
+
+def build_legacy(count: int, turns: int) -> dict:
+    sessions = {}
+    for i in range(count):
+        session = sessions[f"session-{i:08d}"] = legacy_session(1_500_000)
+        for turn in range(turns):
+            session["text_parts"].append(MESSAGE.format(i, turn))
+            session["message_count"] += 1
+        session["phone"] = f"+7916{i:07d}"
+    return sessions
+
+
+def build_records(count: int, turns: int) -> dict:
+    with contextlib.redirect_stdout(None):
+        score = score_application("нужно металла на 1,5 млн руб")
+    sessions = {}
+    for i in range(count):
+        session = sessions[f"session-{i:08d}"] = SessionRecord(amount=score.amount, score=score)
+        for turn in range(turns):
+            session.transcript.append(MESSAGE.format(i, turn))
+            session.message_count += 1
+        session.phone = f"+7916{i:07d}"
+    return sessions
+
+
+def measure(build, count: int, turns: int) -> float:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    sessions = build(count, turns)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del sessions
+    return (after - before) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--turns", type=int, default=4, help="сообщений в обычной сессии")
+    parser.add_argument("--long-sessions", type=int, default=2000,
+                        help="сессий в сценарии с длинной перепиской (0 — пропустить)")
+    parser.add_argument("--long-turns", type=int, default=200,
+                        help="сообщений в длинной переписке (больше лимита SESSION_MAX_TURNS)")
+    args = parser.parse_args()
+
+    runs = [(count, args.turns) for count in args.sessions]
+    if args.long_sessions:
+        runs.append((args.long_sessions, args.long_turns))
+
+    print(f"{'сессий':>8} {'сообщ.':>7} {'dict, Б/сессию':>15} {'SessionRecord':>14} {'экономия':>9}")
+    for count, turns in runs:
+        legacy = measure(build_legacy, count, turns)
+        record = measure(build_records, count, turns)
+        print(f"{count:>8} {turns:>7} {legacy:>15,.0f} {record:>14,.0f} {1 - record / legacy:>8.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Цена снимков сессий и время восстановления после рестарта.
+
+    python benchmarks/session_snapshot.py
+    python benchmarks/session_snapshot.py --sessions 100000 --dirty 500
+
+Что меряем:
+- mark_dirty() — то, что добавляется к обработке каждого сообщения заявки;
+- flush() — фоновая запись изменённых за интервал сессий (в потоке, не в event loop),
+  в пересчёте на одну сессию;
+- load_all() — восстановление всех сессий при старте.
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sessions import SessionRecord  # noqa: E402
+from session_store import SessionSnapshotStore  # noqa: E402
+from chatbot_logic import score_application  # noqa: E402
+
+
+def make_sessions(count: int) -> dict:
+    with contextlib.redirect_stdout(None):
+        score = score_application("нужно 20 тонн арматуры А500С, бюджет 1,5 млн руб")
+    sessions = {}
+    for i in range(count):
+        record = SessionRecord(amount=score.amount, score=score)
+        record.transcript.append(f"Нужно 20 тонн арматуры А500С, бюджет 1,5 млн руб. Объект №{i}")
+        record.transcript.append(f"Телефон +7916{i:07d}")
+        record.phone = f"+7916{i:07d}"
+        record.message_count = 2
+        sessions[f"session-{i:08d}"] = record
+    return sessions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=100_000)
+    parser.add_argument("--dirty", type=int, default=500, help="изменённых сессий за один интервал снимка")
+    args = parser.parse_args()
+
+    sessions = make_sessions(args.sessions)
+    ids = list(sessions)
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = SessionSnapshotStore(os.path.join(directory, "sessions.db"))
+
+        started = time.perf_counter()
+        for session_id in ids:
+            store.mark_dirty(session_id)
+        mark_us = (time.perf_counter() - started) / len(ids) * 1e6
+
+        started = time.perf_counter()
+        store.flush(sessions)
+        full_flush = time.perf_counter() - started
+
+        batch = ids[:args.dirty]
+        for session_id in batch:
+            sessions[session_id].message_count += 1
+            store.mark_dirty(session_id)
+        started = time.perf_counter()
+        store.flush(sessions)
+        batch_flush = time.perf_counter() - started
+
+        size_mb = os.path.getsize(os.path.join(directory, "sessions.db")) / 2**20
+        store.close()
+
+        # Восстановление — новым соединением, как после рестарта процесса
+        started = time.perf_counter()
+        store = SessionSnapshotStore(os.path.join(directory, "sessions.db"))
+        restored = store.load_all()
+        recovery = time.perf_counter() - started
+        store.close()
+
+    assert len(restored) == args.sessions
+    rows = [
+        ("mark_dirty на сообщение", f"{mark_us:.2f} мкс"),
+        (f"flush {args.dirty} изменённых сессий",
+         f"{batch_flush * 1000:.1f} мс ({batch_flush / len(batch) * 1e6:.0f} мкс на сессию, в фоновом потоке)"),
+        (f"первый снимок {args.sessions} сессий", f"{full_flush:.2f} с, файл {size_mb:.1f} МБ"),
+        (f"восстановление {args.sessions} сессий", f"{recovery:.2f} с"),
+    ]
+    for name, value in rows:
+        print(f"{name + ':':<36} {value}")
+
+
+if __name__ == "__main__":
+    main()
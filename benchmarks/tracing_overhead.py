@@ -0,0 +1,111 @@
+"""
+Накладные расходы трассировки на запрос /chat.
+
+    python benchmarks/tracing_overhead.py
+    python benchmarks/tracing_overhead.py --requests 5000 --llm-ms 2000
+
+Гоняем process_http_message (весь путь /chat: оценка заявки, лимиты,
+допуск к LLM, генерация в рабочем потоке) с мгновенной фейковой моделью —
+так разница не тонет в задержке LLM. Режимы чередуются по раундам,
+чтобы дрейф частоты CPU не попадал в сравнение:
+  off  — без активной трассы (span() ничего не делает);
+  on   — start_trace + все спаны + кольцевой буфер;
+  otlp — то же плюс экспорт в файл OTLP/JSON;
+  10%  — otlp с TRACE_SAMPLE_RATE=0.1: остальные сессии только получают id запроса.
+Главная цифра — "+% без LLM": доля от серверной части запроса. Доля от запроса
+с реальной задержкой LLM (--llm-ms) печатается отдельно и всегда мала.
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import contextlib
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+os.environ.setdefault("ENVIRONMENT", "development")
+os.environ.setdefault("SESSION_DB_PATH", "")
+os.environ.setdefault("RENDER_EXTERNAL_URL", "")
+os.environ.pop("REPLICATE_API_TOKEN", None)
+
+with contextlib.redirect_stdout(None):
+    import main  # noqa: E402
+    import tracing  # noqa: E402
+    from llm_backends import LLMBackend  # noqa: E402
+
+MESSAGES = [
+    "Здравствуйте! Есть ли в наличии труба 57х3.5 ст20?",
+    "Сколько стоит лист 2 мм горячекатаный?",
+    "Нужна арматура А500С 12 мм, около 5 тонн",
+]
+
+
+class InstantBackend(LLMBackend):
+    name = "instant"
+
+    def stream(self, prompt: str):
+        yield from ("Добрый ", "день! ", "Есть ", "в наличии.")
+
+
+async def run_round(mode: str, count: int) -> list:
+    timings = []
+    for i in range(count):
+        session_id = f"bench-{mode}-{i}"
+        message = MESSAGES[i % len(MESSAGES)]
+        started = time.perf_counter()
+        if mode == "off":
+            await main.process_http_message(session_id, "198.51.100.1", message)
+        else:
+            with tracing.start_trace("http.chat", session_id=session_id, ip="198.51.100.1", message_length=len(message)):
+                await main.process_http_message(session_id, "198.51.100.1", message)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+async def bench(requests: int, rounds: int, otlp_path: str) -> dict:
+    timings = {"off": [], "on": [], "otlp": [], "10%": []}
+    file_exporter = tracing.OTLPFileExporter(otlp_path)
+    for _ in range(rounds):
+        for mode in timings:
+            tracing.recorder.exporter = file_exporter if mode in ("otlp", "10%") else None
+            tracing.TRACE_SAMPLE_RATE = 0.1 if mode == "10%" else 1.0
+            timings[mode] += await run_round(mode, requests // rounds)
+    tracing.recorder.exporter = None
+    tracing.TRACE_SAMPLE_RATE = 1.0
+    file_exporter.close()
+    return timings
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=6000, help="запросов на режим")
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--llm-ms", type=float, default=1500, help="типичная задержка ответа LLM для пересчёта в %%")
+    args = parser.parse_args()
+
+    main.llm_backend = InstantBackend()
+    # Лимиты и допуск не должны отбрасывать запросы бенчмарка
+    for limiter in (main.llm_limiter, main.lead_limiter):
+        limiter.limits = {kind: (10**9, 10**9) for kind in limiter.limits}
+
+    with tempfile.TemporaryDirectory() as directory, open(os.devnull, "w") as devnull:
+        # print() в обработчике остаётся (в проде он тоже есть), но пишет в /dev/null
+        with contextlib.redirect_stdout(devnull):
+            timings = asyncio.run(bench(args.requests, args.rounds, os.path.join(directory, "traces.jsonl")))
+
+    base = statistics.median(timings["off"])
+    print(f"{'режим':<6} {'медиана, мкс':>13} {'p90, мкс':>9} {'+мкс':>7} {'+% без LLM':>11} {f'+% при LLM {args.llm_ms:.0f} мс':>20}")
+    for mode, values in timings.items():
+        median = statistics.median(values)
+        p90 = statistics.quantiles(values, n=10)[-1]
+        extra = median - base
+        print(f"{mode:<6} {median * 1e6:>13.0f} {p90 * 1e6:>9.0f} {extra * 1e6:>7.0f} "
+              f"{extra / base:>10.1%} {extra / (base + args.llm_ms / 1000):>19.3%}")
+
+
+if __name__ == "__main__":
+    main_()
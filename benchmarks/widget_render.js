@@ -0,0 +1,109 @@
+// Отрисовка виджета чата в jsdom: 1000 сообщений со стримингом токенов.
+//
+//     npm install --no-save jsdom
+//     node benchmarks/widget_render.js
+//     node benchmarks/widget_render.js --messages 2000 --tokens 80
+//
+// Грузим настоящий static/widget.js, WebSocket подменяем заглушкой, которая
+// на каждое сообщение отвечает кадрами token/done. Печатаем время на
+// сообщение (строка посетителя + строка бота + все токены), время на
+// токен (appendData в текстовый узел) и число узлов DOM в окне чата —
+// при оконной отрисовке оно не растёт с длиной истории.
+"use strict";
+
+const fs = require("fs");
+const path = require("path");
+const { JSDOM } = require("jsdom");
+
+const WIDGET = path.join(__dirname, "..", "static", "widget.js");
+
+function option(name, fallback) {
+    const index = process.argv.indexOf("--" + name);
+    return index >= 0 ? Number(process.argv[index + 1]) : fallback;
+}
+
+function countNodes(node) {
+    let count = 1;
+    for (let child = node.firstChild; child; child = child.nextSibling) {
+        count += countNodes(child);
+    }
+    return count;
+}
+
+function loadWidget(tokensPerReply) {
+    const dom = new JSDOM("<!DOCTYPE html><body></body>", {
+        url: "https://fortis.example/",
+        runScripts: "outside-only",
+    });
+    const { window } = dom;
+    const reply = Array.from({ length: tokensPerReply }, (_, i) => "слово" + i + " ");
+
+    // Соединение открывается сразу, на сообщение отвечает токенами и done
+    class FakeWebSocket {
+        constructor() {
+            this.readyState = 0;
+            setImmediate(() => {
+                this.readyState = FakeWebSocket.OPEN;
+                this.onopen();
+            });
+        }
+        send(data) {
+            const frame = JSON.parse(data);
+            if (frame.type !== "message") return;
+            for (const text of reply) {
+                this.onmessage({ data: JSON.stringify({ type: "token", text }) });
+            }
+            this.onmessage({ data: JSON.stringify({ type: "done", reply: reply.join("") }) });
+        }
+        close() {}
+    }
+    FakeWebSocket.OPEN = 1;
+    window.WebSocket = FakeWebSocket;
+    window.eval(fs.readFileSync(WIDGET, "utf8"));
+
+    const input = window.document.querySelector("input");
+    const chat = input.previousSibling;
+    return {
+        window,
+        chat,
+        loadEarlier: chat.firstChild,
+        async send(text) {
+            input.value = text;
+            input.dispatchEvent(new window.KeyboardEvent("keypress", { key: "Enter" }));
+            // Обработчик асинхронный: ждём, пока он дойдёт до конца
+            await new Promise((resolve) => setImmediate(resolve));
+        },
+    };
+}
+
+async function main() {
+    const messages = option("messages", 1000);
+    const tokens = option("tokens", 40);
+    const widget = loadWidget(tokens);
+
+    const perMessage = [];
+    let nodesAt100 = null;
+    for (let i = 0; i < messages; i++) {
+        const started = process.hrtime.bigint();
+        await widget.send("Сообщение " + i + ": нужен лист 2 мм");
+        perMessage.push(Number(process.hrtime.bigint() - started) / 1e6);
+        if (i === 99) nodesAt100 = countNodes(widget.chat);
+    }
+
+    const average = (values) => values.reduce((a, b) => a + b, 0) / values.length;
+    const first = average(perMessage.slice(0, 100));
+    const last = average(perMessage.slice(-100));
+    const rows = widget.chat.children.length - 1; // без "Показать ранние сообщения"
+    console.log(`Сообщений: ${messages}, токенов в ответе: ${tokens}`);
+    console.log(`Строк в DOM: ${rows}, узлов в окне чата: после 100 сообщений ${nodesAt100}, в конце ${countNodes(widget.chat)}`);
+    console.log(`На сообщение: первые 100 — ${first.toFixed(3)} мс, последние 100 — ${last.toFixed(3)} мс`);
+    // На сообщение приходится две новые строки и tokens дописываний в узел
+    console.log(`На добавление (строка или токен): ${(average(perMessage) / (tokens + 2) * 1000).toFixed(1)} мкс`);
+    widget.window.close();
+}
+
+module.exports = { loadWidget };
+
+if (require.main === module) {
+    main();
+}
@@ -0,0 +1,13 @@
+"""
+Сборка widget.js для продакшена: минификация, хеш содержимого в имени,
+предварительное сжатие gzip/brotli. Результат — static/dist/.
+
+Запуск: python build_widget.py
+"""
+from static_assets import build_widget, DIST_DIR
+
+if __name__ == "__main__":
+    bundle = build_widget(write=True)
+    print(f"✅ Собран {bundle['filename']} в {DIST_DIR}")
+    for encoding, data in sorted(bundle["variants"].items()):
+        print(f"   {encoding}: {len(data)} байт")
@@ -0,0 +1,247 @@
+import os
+import re
+import csv
+import json
+import heapq
+import bisect
+from collections import defaultdict
+from dataclasses import dataclass
+
+# Файл каталога (CSV или JSON) и сколько позиций отдаём в промпт
+CATALOG_PATH = os.getenv("CATALOG_PATH", "catalog.csv")
+CATALOG_TOP_K = int(os.getenv("CATALOG_TOP_K", "5"))
+# Допуск для размера без диапазона: "лист 2 мм" ищет 1.9–2.1 мм
+SIZE_TOLERANCE = 0.05
+
+# Окончания для лёгкого стемминга: отрезаем самое длинное, оставляя основу от 3 букв
+_ENDINGS = sorted((
+    "иями", "ями", "ами", "ого", "его", "ому", "ему", "ыми", "ими", "ых", "их",
+    "ой", "ей", "ий", "ый", "ая", "яя", "ое", "ее", "ые", "ие", "ую", "юю",
+    "ов", "ев", "ом", "ем", "ам", "ям", "ах", "ях",
+    "а", "я", "о", "е", "ы", "и", "у", "ю", "ь", "й",
+), key=len, reverse=True)
+
+# "2х1250х2500", "57x3.5" → отдельные числа
+_SIZE_SEPARATOR_RE = re.compile(r"(\d)\s*[хx×*]\s*(?=\d)")
+_TOKEN_RE = re.compile(r"[0-9a-zа-я]+(?:\.\d+)?")
+
+_NUMBER = r"(\d{1,4}(?:[.,]\d{1,2})?)"
+# Диапазоны и значения размеров в сообщении клиента
+_RANGE_RE = re.compile(r"(толщин|диаметр|стенк)\w*\s*(?:от\s*)?" + _NUMBER + r"\s*(?:до|-|–)\s*" + _NUMBER)
+_VALUE_RE = re.compile(r"(толщин|диаметр|стенк)\w*\s*" + _NUMBER)
+_PIPE_SIZE_RE = re.compile(_NUMBER + r"\s*[хx×*]\s*" + _NUMBER + r"(?!\s*[хx×*]?\s*\d)")
+_MM_RE = re.compile(_NUMBER + r"\s*мм")
+
+_ATTRIBUTE_BY_WORD = {"толщин": ("thickness_mm",), "стенк": ("thickness_mm",), "диаметр": ("diameter_mm",)}
+
+
+def stem(word: str) -> str:
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= 3:
+            return word[:-len(ending)]
+    return word
+
+
+# Единицы и общие слова запроса: в названиях они есть не у всех позиций,
+# поэтому в пересечении только мешают ("лист 2 мм" не находил лист без "мм"
+# в названии). Хранятся основами — как их выдаёт tokenize()
+_STOP_WORDS = frozenset(stem(word) for word in (
+    "мм", "см", "м", "метр", "метров", "т", "тн", "тонна", "тонн", "кг", "шт", "штук",
+    "руб", "рублей", "р", "цена", "стоимость", "сколько", "стоит", "почем",
+    "есть", "наличии", "нужен", "нужна", "нужно", "купить", "заказать",
+    "в", "на", "и", "по", "для", "с", "за", "от", "до",
+))
+
+
+def tokenize(text: str) -> list:
+    """
+    Токены для индекса и запроса: слова — основами, числа и марки стали — как есть,
+    единицы измерения и общие слова (_STOP_WORDS) отбрасываем.
+    """
+    text = _SIZE_SEPARATOR_RE.sub(r"\1 ", text.lower().replace("ё", "е").replace(",", "."))
+    tokens = (stem(token) if token.isalpha() else token for token in _TOKEN_RE.findall(text))
+    return [token for token in tokens if token not in _STOP_WORDS]
+
+
+def _number(value):
+    if value in (None, ""):
+        return None
+    return float(str(value).replace(",", "."))
+
+
+@dataclass(slots=True)
+class CatalogItem:
+    sku: str
+    name: str
+    category: str = ""
+    gost: str = ""
+    grade: str = ""
+    thickness_mm: float = None
+    diameter_mm: float = None
+    unit: str = "т"
+    price: float = None
+    in_stock: bool = True
+
+    @classmethod
+    def from_row(cls, row: dict) -> "CatalogItem":
+        in_stock = row.get("in_stock", True)
+        if isinstance(in_stock, str):
+            in_stock = in_stock.strip().lower() in ("1", "true", "yes", "да", "+")
+        return cls(
+            sku=str(row["sku"]),
+            name=row["name"],
+            category=row.get("category") or "",
+            gost=row.get("gost") or "",
+            grade=row.get("grade") or "",
+            thickness_mm=_number(row.get("thickness_mm")),
+            diameter_mm=_number(row.get("diameter_mm")),
+            unit=row.get("unit") or "т",
+            price=_number(row.get("price")),
+            in_stock=bool(in_stock),
+        )
+
+    def prompt_line(self) -> str:
+        price = f"{self.price:,.0f} руб/{self.unit}" if self.price else "цена по запросу"
+        parts = [self.name, f"ГОСТ {self.gost}" if self.gost else None, self.grade or None,
+                 price, "в наличии" if self.in_stock else "под заказ"]
+        return "- " + " | ".join(part for part in parts if part)
+
+
+class Catalog:
+    """
+    Каталог продукции в памяти: инвертированный индекс по основам слов
+    и отсортированные списки размеров для фильтров по диапазону.
+    search() отдаёт top-k позиций для промпта.
+
+    Позиции в наличии получают меньшие номера, поэтому "лучшие k" среди
+    одинаково подходящих — это просто k наименьших номеров.
+    """
+
+    def __init__(self, items: list = ()):
+        self.items = []
+        self._postings = defaultdict(set)   # токен → номера позиций
+        # Размеры в каталоге дискретны: значение → номера позиций,
+        # плюс отсортированный список значений для поиска диапазона
+        self._sizes = {"thickness_mm": defaultdict(set), "diameter_mm": defaultdict(set)}
+        for item in sorted(items, key=lambda item: not item.in_stock):
+            self._add(item)
+        self._size_values = {attribute: sorted(values) for attribute, values in self._sizes.items()}
+
+    @classmethod
+    def from_file(cls, path: str) -> "Catalog":
+        if path.endswith(".json"):
+            with open(path, encoding="utf-8") as f:
+                rows = json.load(f)
+        else:
+            with open(path, encoding="utf-8", newline="") as f:
+                rows = list(csv.DictReader(f))
+        return cls(CatalogItem.from_row(row) for row in rows)
+
+    def _add(self, item: CatalogItem):
+        index = len(self.items)
+        self.items.append(item)
+        for token in tokenize(f"{item.name} {item.category} {item.gost} {item.grade}"):
+            self._postings[token].add(index)
+        for attribute, values in self._sizes.items():
+            value = getattr(item, attribute)
+            if value is not None:
+                values[value].add(index)
+
+    def __len__(self):
+        return len(self.items)
+
+    def _in_range(self, attributes: tuple, low: float, high: float) -> set:
+        result = set()
+        for attribute in attributes:
+            values = self._size_values[attribute]
+            start = bisect.bisect_left(values, low)
+            end = bisect.bisect_right(values, high)
+            result.update(*(self._sizes[attribute][value] for value in values[start:end]))
+        return result
+
+    @staticmethod
+    def parse_filters(text: str) -> list:
+        """
+        Размеры из сообщения → [(атрибуты, от, до)]:
+        "толщина от 2 до 4", "диаметр 57", "труба 57х3.5", "лист 2 мм".
+        """
+        t = text.lower().replace("ё", "е")
+        filters = []
+
+        def around(value):
+            value = float(value.replace(",", "."))
+            return value * (1 - SIZE_TOLERANCE), value * (1 + SIZE_TOLERANCE)
+
+        for word, low, high in _RANGE_RE.findall(t):
+            filters.append((_ATTRIBUTE_BY_WORD[word], float(low.replace(",", ".")), float(high.replace(",", "."))))
+        if not filters:
+            for word, value in _VALUE_RE.findall(t):
+                filters.append((_ATTRIBUTE_BY_WORD[word], *around(value)))
+        if not filters:
+            pipe = _PIPE_SIZE_RE.search(t)
+            if pipe:
+                filters.append((("diameter_mm",), *around(pipe.group(1))))
+                filters.append((("thickness_mm",), *around(pipe.group(2))))
+        if not filters:
+            mm = _MM_RE.search(t)
+            if mm:
+                filters.append((("thickness_mm", "diameter_mm"), *around(mm.group(1))))
+        return filters
+
+    def search(self, text: str, k: int = CATALOG_TOP_K) -> list:
+        """
+        Top-k позиций. Сначала те, где есть все слова запроса; если их меньше k —
+        отбрасываем самые частые слова по одному (редкие слова важнее).
+        Пересечения множеств идут в C: на 100k позиций около миллисекунды на запрос.
+        """
+        if not self.items:
+            return []
+        filters = self.parse_filters(text)
+        tokens = {token for token in tokenize(text) if token in self._postings}
+        if filters:
+            # Числа из запроса уже учтены фильтрами по размерам
+            tokens = {token for token in tokens if not token.replace(".", "").isdigit()}
+        if not any(token.isalpha() for token in tokens):
+            return []
+
+        allowed = None
+        for attributes, low, high in filters:
+            matched = self._in_range(attributes, low, high)
+            allowed = matched if allowed is None else allowed & matched
+
+        postings = sorted((self._postings[token] for token in tokens), key=len)
+        found = []
+        for n in range(len(postings), 0, -1):
+            candidates = set.intersection(*postings[:n])
+            if allowed is not None:
+                candidates &= allowed
+            candidates.difference_update(found)
+            found.extend(heapq.nsmallest(k - len(found), candidates))
+            if len(found) >= k:
+                break
+        return [self.items[index] for index in found]
+
+    def prompt_section(self, text: str, k: int = CATALOG_TOP_K) -> str:
+        """Блок для промпта или пустая строка, если ничего не нашли."""
+        items = self.search(text, k)
+        if not items:
+            return ""
+        lines = "\n".join(item.prompt_line() for item in items)
+        return f"Позиции из каталога, подходящие под вопрос (цены и наличие называй только отсюда):\n{lines}"
+
+
+def load_catalog(path: str = CATALOG_PATH) -> Catalog:
+    """Каталог не обязателен: без файла бот работает как раньше."""
+    if not os.path.exists(path):
+        print(f"📦 Каталог не найден ({path}), ответы без данных о наличии")
+        return Catalog()
+    try:
+        catalog = Catalog.from_file(path)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"⚠️ Не удалось загрузить каталог {path}: {e}")
+        return Catalog()
+    print(f"📦 Каталог загружен: {len(catalog)} позиций из {path}")
+    return catalog
+
+
+catalog = load_catalog()
@@ -1,5 +1,11 @@
-import requests
-import replicate
+import re
+import time
+from dataclasses import dataclass, field
+
+from tracing import span
+from stats import dashboard
+from catalog import catalog
+from ru_numbers import normalize_numbers, sub_tracked, original_position
 
 SYSTEM_PROMPT = """
 Ты — опытный менеджер по продажам компании Фортис металл и дизайн, специализирующейся на оптовых и розничных поставках металлопроката. Ты вежливый, компетентный, ориентированный на клиента и умеешь вести деловой диалог. Твоя задача — помочь посетителю сайта подобрать нужный вид металлопроката, ответить на вопросы, предложить выгодные решения и, при наличии интересной заявки (от 50 000 рублей), корректно собрать контактные данные и отправить заявку на почту отдела продаж.
@@ -61,59 +67,65 @@ SYSTEM_PROMPT = """
 Не предлагай скидки без подтверждения. Лучше: «По таким объёмам менеджер может предложить индивидуальные условия.»
 """
 
-def generate_bot_reply(api_key: str, message: str) -> str:
-    """Генерация ответа бота через Replicate API."""
-    try:
-        print(f"\n=== ДЕБАГ: Начинаем генерацию ===")
-        print(f"Сообщение: '{message}'")
-        
-        client = replicate.Client(api_token=api_key)
-        
-        # 1. Создаем ПРАВИЛЬНЫЙ промпт для GPT-5
-        full_prompt = f"""{SYSTEM_PROMPT}
+FALLBACK_REPLY = "Извините, не получилось сгенерировать ответ."
+
 
+def build_prompt(message: str) -> str:
+    """
+    Собираем полный промпт для модели. Из каталога добавляем только
+    несколько подходящих позиций — промпт остаётся коротким, а цены настоящими.
+    """
+    with span("catalog_lookup") as attrs:
+        catalog_section = catalog.prompt_section(message)
+        attrs["found"] = catalog_section.count("\n- ")
+    if catalog_section:
+        catalog_section = f"\n{catalog_section}\n"
+    
+    return f"""{SYSTEM_PROMPT}
+{catalog_section}
 Теперь отвечай как менеджер Аркадий.
 
 Вопрос клиента: {message}
 
 Ответ Аркадия:"""
+
+
+def stream_bot_reply(backend, message: str):
+    """
+    Потоковая генерация ответа через выбранный LLM backend.
+    Отдаёт куски текста по мере их появления; исключения пробрасывает.
+    """
+    full_prompt = build_prompt(message)
+    print(f"Длина полного промпта: {len(full_prompt)} символов")
+    
+    with span("llm_generate", backend=backend.name, prompt_chars=len(full_prompt)) as attrs:
+        start = time.perf_counter()
+        chunks = 0
+        try:
+            for chunk in backend.stream(full_prompt):
+                if chunks == 0:
+                    attrs["first_token_ms"] = round((time.perf_counter() - start) * 1000, 3)
+                chunks += 1
+                yield chunk
+        except Exception:
+            dashboard.record_llm_error()
+            raise
+        attrs["chunks"] = chunks
+        dashboard.record_llm((time.perf_counter() - start) * 1000, attrs.get("first_token_ms"))
+
+
+def generate_bot_reply(backend, message: str) -> str:
+    """Генерация ответа бота целиком (для HTTP /chat)."""
+    try:
+        print(f"\n=== ДЕБАГ: Начинаем генерацию ===")
+        print(f"Сообщение: '{message}'")
         
-        print(f"Длина полного промпта: {len(full_prompt)} символов")
-        print(f"Первые 500 символов: {full_prompt[:500]}...")
-        
-        # 2. Отправляем запрос как в документации Replicate
-        # Важно: возможно нужен streaming как в примере
-        output = replicate.run(
-            "meta/meta-llama-3-70b-instruct",
-            input={
-                "prompt": full_prompt,
-                "max_tokens": 1000,
-                "temperature": 0.8,
-                "top_p": 0.9
-            }
-        )
-        
-        print(f"Тип ответа: {type(output)}")
-        print(f"Ответ сырой: {output}")
-        
-        # 3. Обрабатываем ответ (GPT-5 может вернуть генератор)
-        result = ""
-        if hasattr(output, '__iter__') and not isinstance(output, str):
-            # Если это генератор/stream (как в документации)
-            for chunk in output:
-                if isinstance(chunk, str):
-                    result += chunk
-                else:
-                    result += str(chunk)
-        elif isinstance(output, str):
-            result = output
-        else:
-            result = str(output)
+        result = "".join(stream_bot_reply(backend, message))
         
         print(f"Итоговый ответ: {result[:200]}...")
         print(f"=== ДЕБАГ: Конец генерации ===\n")
         
-        return result.strip() if result.strip() else "Извините, не получилось сгенерировать ответ."
+        return result.strip() if result.strip() else FALLBACK_REPLY
             
     except Exception as e:
         print(f"ДЕБАГ: Ошибка: {str(e)}")
@@ -128,36 +140,210 @@ KEYWORDS = [
     "заявк", "оформ", "договор", "заказ"
 ]
 
+# Категория товара для письма менеджеру: первая найденная основа слова
+PRODUCT_CATEGORIES = [
+    ("Арматура", ("арматур",)),
+    ("Трубы", ("труб",)),
+    ("Профнастил", ("профнастил", "профлист")),
+    ("Штрипс и рулон", ("штрипс", "рулон")),
+    ("Фасонный прокат", ("швеллер", "балк", "уголок", "уголк")),
+    ("Листовой прокат", ("лист", "перфорированн", "оцинк")),
+]
+
+# Какое правило каскада сработало и насколько ему можно верить
+RULE_CONFIDENCE = {
+    "thousand": 0.9,            # "50 тыс", "полтора миллиона"
+    "million": 0.9,             # "2 млн"
+    "rubles": 0.95,             # "100000 руб"
+    "context": 0.8,             # "заказ на 60000", "цена 70000"
+    "quantity_price": 0.85,     # "10 тонн по 48000"
+    "quantity_estimate": 0.5,   # "3 тонны" × средняя цена
+    "any_number": 0.3,          # резервный поиск по любому числу
+}
+
+
+@dataclass(slots=True)
+class LeadScore:
+    """
+    Результат оценки сообщения: не только сумма, но и почему она такая —
+    чтобы менеджер видел это в письме и не перечитывал переписку.
+    """
+
+    is_interesting: bool = False
+    amount: int = 0
+    rule_id: str = None           # Сработавшее правило (ключ RULE_CONFIDENCE)
+    matched: list = field(default_factory=list)  # Фрагменты исходного сообщения, из которых взята сумма
+    spans: list = field(default_factory=list)    # [начало, конец] этих фрагментов в сообщении
+    confidence: float = 0.0
+    category: str = None          # Категория товара по ключевым словам
+    keywords: list = field(default_factory=list)  # Найденные ключевые слова
+
+    def to_dict(self) -> dict:
+        return {
+            "is_interesting": self.is_interesting,
+            "amount": self.amount,
+            "rule_id": self.rule_id,
+            "matched": self.matched,
+            "spans": self.spans,
+            "confidence": self.confidence,
+            "category": self.category,
+            "keywords": self.keywords,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LeadScore":
+        return cls(**data)
+
+    def form_fields(self) -> dict:
+        """Поля для письма Formspree."""
+        return {
+            "category": self.category or "не определена",
+            "confidence": f"{self.confidence:.0%}",
+            "rule": self.rule_id or "-",
+            "matched": "; ".join(self.matched) or "-",
+        }
+
+# Ограничения на разбор одного сообщения: длинный текст режем на куски
+# с перекрытием, а на весь разбор даём фиксированный бюджет времени
+SCAN_CHUNK_CHARS = 2000
+SCAN_CHUNK_OVERLAP = 100
+SCAN_TIME_BUDGET = 0.05  # секунд
+
+# Число не длиннее 12 цифр, начинающееся на границе цифр:
+# без (?<!\d) движок пробовал бы каждый суффикс длинной цепочки цифр.
+# Точка в границах — чтобы не выхватывать части дробей вроде "2.5"
+NUM = r'(?<![\d.])(\d{1,12})(?![.]\d)'
+# Число, которое может быть дробным ("2.5 тонны", "49.5 тыс" после нормализации)
+DEC = r'(?<![\d.])(\d{1,12}(?:\.\d{1,3})?)(?![.]?\d)'
+# Количество: число сразу после другого числа через пробел ("100 100 шт",
+# "3 500 шт") не берём — непонятно, одно это число или два
+QTY = r'(?<!\d[ \u00a0])' + DEC
+# Единица "т"/"м" только как отдельное слово, иначе "20 тыс" читалось как "20 т"
+NOT_LETTER = r'(?![а-яё])'
+
+# Шаблоны компилируем один раз при загрузке модуля.
+# Опережающая проверка первого символа телефона: без неё все три варианта
+# пробуются в каждой позиции текста, и вырезание телефонов было дороже всего разбора
+PHONE_RE = re.compile(
+    r'(?=[\d+(])(?:'
+    r'\b\d{11}\b'  # 11 цифр подряд (89161234567)
+    r'|\b\d{10}\b'  # 10 цифр подряд (9161234567)
+    r'|[\+7]?[-\s]?\(?\d{3}\)?[-\s]?\d{3}[-\s]?\d{2}[-\s]?\d{2}'  # Полные номера
+    r')'
+)
+# Тысячи бывают дробными: нормализатор пишет "49.5 тыс" вместо округления
+THOUSAND_RE = re.compile(DEC + r'\s{0,3}тыс')
+MILLION_RE = re.compile(NUM + r'\s{0,3}млн')
+RUB_PATTERNS = [
+    re.compile(NUM + r'[^\d]{0,20}руб'),
+    re.compile(NUM + r'[^\d]{0,20}р\.'),
+    re.compile(NUM + r'[^\d]{0,20}р\s'),
+]
+CONTEXT_PATTERNS = [re.compile(p) for p in (
+    r'(?:заказ|заявк[ау]|сумм[аой]|итого|на\s{1,3}сумму)\s{0,3}[вна]?\s{0,3}' + NUM,
+    r'по\s{1,3}' + NUM,
+    r'цена\s{0,3}' + NUM,  # "цена 50000"
+    r'стоимость\s{0,3}' + NUM,  # "стоимость 60000"
+)]
+QUANTITY_PRICE_PATTERNS = [re.compile(p) for p in (
+    QTY + r'\s{0,3}(?:тонн|тн?' + NOT_LETTER + r'|шт|штук|м' + NOT_LETTER + r'|метров?|м\s?\.|кг|килограмм|листов?|труб?|проф[ие]лей?)\s{0,3}(?:по\s{0,3})?(?:цена|стоимость|цене)?\s{0,3}(\d{1,12})',
+    NUM + r'\s{0,3}(?:по\s{0,3})?(\d{1,12})\s{0,3}(?:руб|р\.|р\s)',
+    r'цена\s{0,3}' + NUM + r'\s{0,3}(?:руб|р\.|р\s)\s{0,3}(?:за|на)\s{0,3}(\d{1,12})',
+)]
+# Количество без цены → оценка по средней цене единицы
+QUANTITY_PATTERNS = [
+    (re.compile(QTY + r'\s{0,3}(?:тонн|тн?' + NOT_LETTER + r')'), 'тонн'),
+    (re.compile(QTY + r'\s{0,3}(?:метр|м\s?\.)'), 'метр'),
+    (re.compile(QTY + r'\s{0,3}шт'), 'шт'),
+]
+ALL_NUMBERS_RE = re.compile(r'\d+')
+
 def check_interesting_application(text: str):
+    """Короткая форма score_application: (интересная ли заявка, сумма)."""
+    score = score_application(text)
+    return score.is_interesting, score.amount
+
+
+def score_application(text: str) -> LeadScore:
+    """
+    Оценка сообщения за один проход каскада: сумма, сработавшее правило,
+    фрагменты текста, уверенность и категория товара.
+    """
     t = text.lower()
     
-    print(f"\n🔍 ПРОВЕРКА ЗАЯВКИ: '{text}'")
-    print(f"📝 Текст в нижнем регистре: '{t}'")
+    print(f"\n🔍 ПРОВЕРКА ЗАЯВКИ: '{text[:200]}'" + ("..." if len(text) > 200 else ""))
     
     # Проверка ключевых слов
-    if not any(k in t for k in KEYWORDS):
+    keywords = [k for k in KEYWORDS if k in t]
+    if not keywords:
         print(f"❌ Нет ключевых слов в тексте")
-        return False, 0
+        return LeadScore()
     
-    print(f"✅ Есть ключевые слова в тексте")
+    category = next((name for name, stems in PRODUCT_CATEGORIES if any(stem in t for stem in stems)), None)
+    print(f"✅ Есть ключевые слова в тексте: {keywords}, категория: {category}")
+    score = LeadScore(category=category, keywords=keywords)
     
-    import re
+    deadline = time.perf_counter() + SCAN_TIME_BUDGET
+    step = SCAN_CHUNK_CHARS - SCAN_CHUNK_OVERLAP
+    for start in range(0, len(t), step):
+        hit = _scan_chunk(t[start:start + SCAN_CHUNK_CHARS], deadline)
+        if hit:
+            score.rule_id, score.amount, (begin, end) = hit
+            # Позиции относятся к t; lower() почти всегда сохраняет длину,
+            # и тогда фрагмент берём из сообщения как есть
+            source = text if len(text) == len(t) else t
+            fragment = source[start + begin:start + end]
+            begin = start + begin + len(fragment) - len(fragment.lstrip())
+            fragment = fragment.strip()
+            score.is_interesting = True
+            score.matched = [fragment]
+            score.spans = [[begin, begin + len(fragment)]]
+            score.confidence = RULE_CONFIDENCE[score.rule_id]
+            return score
+        if time.perf_counter() > deadline:
+            print(f"⏱️ Бюджет разбора ({SCAN_TIME_BUDGET} с) исчерпан на позиции {start}")
+            break
+        if start + SCAN_CHUNK_CHARS >= len(t):
+            break
     
-    # ====== ПРЕДВАРИТЕЛЬНО: ищем телефонные номера, чтобы исключить их ======
-    phone_patterns = [
-        r'[\+7]?[-\s]?\(?\d{3}\)?[-\s]?\d{3}[-\s]?\d{2}[-\s]?\d{2}',  # Полные номера
-        r'\b\d{10}\b',  # 10 цифр подряд (9161234567)
-        r'\b\d{11}\b',  # 11 цифр подряд (89161234567)
-    ]
+    print(f"❌ Не нашли суммы > 50000")
+    return score
+
+
+def _scan_chunk(t: str, deadline: float):
+    """
+    Каскад шаблонов для одного куска текста (уже в нижнем регистре).
+    Возвращает (rule_id, сумма, (начало, конец) фрагмента в куске) или None.
+    Шаблоны работают по тексту без телефонов и с нормализованными числами,
+    позиции совпадения переводим обратно через записанные замены.
+    """
+    def out_of_time():
+        return time.perf_counter() > deadline
     
+    # ====== ПРЕДВАРИТЕЛЬНО: ищем телефонные номера и вырезаем их из текста ======
     phone_numbers = []
-    for pattern in phone_patterns:
-        phones = re.findall(pattern, t)
-        if phones:
-            phone_numbers.extend(phones)
     
+    def cut_phone(match):
+        phone_numbers.append(match.group(0))
+        return " "
+    
+    phone_anchors = []
+    t = sub_tracked(PHONE_RE, cut_phone, t, phone_anchors)
     print(f"📞 Найденные телефоны для исключения: {phone_numbers}")
     
+    # Числа приводим к единому виду ("полтора миллиона", "1,5 млн",
+    # "100 000 руб") — дальше работают обычные шаблоны
+    number_anchors = []
+    t = normalize_numbers(t, number_anchors)
+    print(f"🔢 Нормализованный текст: '{t[:200]}'")
+    
+    def found(rule_id, amount, m):
+        """Результат с позициями совпадения в исходном куске."""
+        begin, end = m.span()
+        begin = original_position(phone_anchors, original_position(number_anchors, begin))
+        end = original_position(phone_anchors, original_position(number_anchors, end, True), True)
+        return rule_id, amount, (begin, end)
+    
     # ====== ФУНКЦИЯ ПРОВЕРКИ "НЕ ТЕЛЕФОН ЛИ" ======
     def is_not_phone(number_str):
         """Проверяет, что число НЕ является телефоном."""
@@ -179,22 +365,25 @@ def check_interesting_application(text: str):
                 
         return True
     
+    if out_of_time():
+        return None
+    
     # ШАБЛОН 1A: "50 тыс" → ×1000
-    matches_thousand = re.findall(r'(\d+)\s*тыс', t)
-    for match in matches_thousand:
+    for m in THOUSAND_RE.finditer(t):
+        match = m.group(1)
         if not is_not_phone(match):
             print(f"   Пропускаем '{match} тыс' - похоже на телефон")
             continue
             
-        num = int(match) * 1000
+        num = int(round(float(match) * 1000))
         print(f"🔎 Нашли '{match} тыс' → {num} руб.")
         if num >= 50000:
             print(f"   🎯 НАШЛИ БОЛЬШУЮ СУММУ: {num} руб.")
-            return True, num
+            return found("thousand", num, m)
     
     # ШАБЛОН 1B: "1 млн" → ×1000000
-    matches_million = re.findall(r'(\d+)\s*млн', t)
-    for match in matches_million:
+    for m in MILLION_RE.finditer(t):
+        match = m.group(1)
         if not is_not_phone(match):
             print(f"   Пропускаем '{match} млн' - похоже на телефон")
             continue
@@ -203,18 +392,22 @@ def check_interesting_application(text: str):
         print(f"🔎 Нашли '{match} млн' → {num} руб.")
         if num >= 50000:
             print(f"   🎯 НАШЛИ БОЛЬШУЮ СУММУ: {num} руб.")
-            return True, num
+            return found("million", num, m)
+    
+    if out_of_time():
+        return None
     
     # ШАБЛОН 1C: "100000 рублей" → ×1 (только если есть "руб")
     if 'руб' in t or 'р.' in t or 'р ' in t:
-        matches_rub = re.findall(r'(\d+)[^\d]*руб', t) + re.findall(r'(\d+)[^\d]*р\.', t) + re.findall(r'(\d+)[^\d]*р\s', t)
-        for match in matches_rub:
+        matches_rub = [m for pattern in RUB_PATTERNS for m in pattern.finditer(t)]
+        for m in matches_rub:
+            match = m.group(1)
             if not is_not_phone(match):
                 print(f"   Пропускаем '{match} руб' - похоже на телефон")
                 continue
                 
             # Дополнительная проверка: если число слишком длинное для суммы
-            if len(match) >= 7:  # 1,000,000 = 7 цифр, но это максимум для реальных сумм
+            if len(match) >= 10:  # 10+ цифр — телефон или артикул, а не сумма заявки
                 print(f"   Пропускаем '{match} руб' - слишком длинное для суммы ({len(match)} цифр)")
                 continue
                 
@@ -222,21 +415,18 @@ def check_interesting_application(text: str):
             print(f"🔎 Нашли '{match} руб' → {num} руб.")
             if num >= 50000:
                 print(f"   🎯 НАШЛИ БОЛЬШУЮ СУММУ: {num} руб.")
-                return True, num
+                return found("rubles", num, m)
     
-    # ШАБЛОН 2: Контекстные числа
-    context_patterns = [
-        r'(?:заказ|заявк[ау]|сумм[аой]|итого|на\s+сумму)\s*[вна]?\s*(\d+)',
-        r'по\s+(\d+)',
-        r'цена\s*(\d+)',  # "цена 50000"
-        r'стоимость\s*(\d+)',  # "стоимость 60000"
-    ]
+    if out_of_time():
+        return None
     
-    for pattern in context_patterns:
-        matches = re.findall(pattern, t)
+    # ШАБЛОН 2: Контекстные числа
+    for pattern in CONTEXT_PATTERNS:
+        matches = list(pattern.finditer(t))
         if matches:
-            print(f"🔎 Шаблон '{pattern}' → совпадения: {matches}")
-            for match in matches:
+            print(f"🔎 Шаблон '{pattern.pattern}' → совпадения: {[m.group(1) for m in matches]}")
+            for m in matches:
+                match = m.group(1)
                 if not is_not_phone(match):
                     print(f"   Пропускаем '{match}' - похоже на телефон")
                     continue
@@ -244,46 +434,41 @@ def check_interesting_application(text: str):
                 num = int(match)
                 if num >= 50000:
                     print(f"   🎯 НАШЛИ БОЛЬШУЮ СУММУ: {num} руб.")
-                    return True, num
+                    return found("context", num, m)
+    
+    if out_of_time():
+        return None
     
     # ====== УЛУЧШЕННЫЙ ШАБЛОН 3: Количества и цены (разные варианты) ======
     
     # Вариант 3A: "X тонн по Y рублей"
-    patterns_quantity_price = [
-        r'(\d+)\s*(?:тонн|тн?|шт|штук|м|метров?|м\s*\.|кг|килограмм|листов?|труб?|проф[ие]лей?)\s*(?:по\s*)?(?:цена|стоимость|цене)?\s*(\d+)',
-        r'(\d+)\s*(?:по\s*)?(\d+)\s*(?:руб|р\.|р\s)',
-        r'цена\s*(\d+)\s*(?:руб|р\.|р\s)\s*(?:за|на)\s*(\d+)',
-    ]
-    
-    for pattern in patterns_quantity_price:
-        matches = re.findall(pattern, t)
+    for pattern in QUANTITY_PRICE_PATTERNS:
+        matches = list(pattern.finditer(t))
         if matches:
-            print(f"🔎 Шаблон количества '{pattern}' → совпадения: {matches}")
-            for quantity_str, price_str in matches:
+            print(f"🔎 Шаблон количества '{pattern.pattern}' → совпадения: {[m.groups() for m in matches]}")
+            for m in matches:
+                quantity_str, price_str = m.groups()
                 # Проверяем, не телефоны ли
                 if not is_not_phone(quantity_str) or not is_not_phone(price_str):
                     print(f"   Пропускаем '{quantity_str} по {price_str}' - похоже на телефоны")
                     continue
                 
                 try:
-                    quantity = int(quantity_str)
+                    quantity = float(quantity_str)
                     price = int(price_str)
-                    total = quantity * price
+                    total = int(quantity * price)
                     print(f"🔎 Нашли '{quantity} по {price}' = {total} руб.")
                     if total >= 50000:
                         print(f"   🎯 НАШЛИ БОЛЬШУЮ СУММУ: {total} руб.")
-                        return True, total
+                        return found("quantity_price", total, m)
                 except ValueError:
                     continue
     
+    if out_of_time():
+        return None
+    
     # Вариант 3B: Поиск больших количеств (даже без цены)
     # Если количество очень большое, может быть и так дорого
-    quantity_patterns = [
-        r'(\d+)\s*(?:тонн|тн?)',  # Тонны
-        r'(\d+)\s*(?:метр|м\s*\.)',  # Метры
-        r'(\d+)\s*шт',  # Штуки
-    ]
-    
     # Средние рыночные цены для оценки (примерные)
     avg_prices = {
         'тонн': 50000,  # ~50,000 руб за тонну
@@ -291,44 +476,49 @@ def check_interesting_application(text: str):
         'шт': 1000,     # ~1000 руб за штуку
     }
     
-    for pattern in quantity_patterns:
-        matches = re.findall(pattern, t)
+    for pattern, unit in QUANTITY_PATTERNS:
+        matches = list(pattern.finditer(t))
         if matches:
-            print(f"🔎 Шаблон количества '{pattern}' → совпадения: {matches}")
-            for match in matches:
+            print(f"🔎 Шаблон количества '{pattern.pattern}' → совпадения: {[m.group(1) for m in matches]}")
+            for m in matches:
+                match = m.group(1)
                 if not is_not_phone(match):
                     print(f"   Пропускаем '{match}' - похоже на телефон")
                     continue
                 
-                quantity = int(match)
+                quantity = float(match)
                 
                 # Определяем тип и примерную цену
-                if 'тонн' in pattern or 'тн' in pattern:
-                    estimated_total = quantity * avg_prices['тонн']
+                if unit == 'тонн':
+                    estimated_total = int(quantity * avg_prices['тонн'])
                     print(f"🔎 {quantity} тонн → примерно {estimated_total} руб (оценка)")
                     if estimated_total >= 50000:
                         print(f"   🎯 БОЛЬШОЕ КОЛИЧЕСТВО: ~{estimated_total} руб")
-                        return True, estimated_total
+                        return found("quantity_estimate", estimated_total, m)
                 
-                elif 'метр' in pattern:
-                    estimated_total = quantity * avg_prices['метр']
+                elif unit == 'метр':
+                    estimated_total = int(quantity * avg_prices['метр'])
                     print(f"🔎 {quantity} метров → примерно {estimated_total} руб (оценка)")
                     if estimated_total >= 50000:
                         print(f"   🎯 БОЛЬШОЕ КОЛИЧЕСТВО: ~{estimated_total} руб")
-                        return True, estimated_total
+                        return found("quantity_estimate", estimated_total, m)
                 
-                elif 'шт' in pattern:
-                    estimated_total = quantity * avg_prices['шт']
+                elif unit == 'шт':
+                    estimated_total = int(quantity * avg_prices['шт'])
                     print(f"🔎 {quantity} шт → примерно {estimated_total} руб (оценка)")
                     if estimated_total >= 50000:
                         print(f"   🎯 БОЛЬШОЕ КОЛИЧЕСТВО: ~{estimated_total} руб")
-                        return True, estimated_total
+                        return found("quantity_estimate", estimated_total, m)
+    
+    if out_of_time():
+        return None
     
     # ШАБЛОН 4: Все числа (с интеллектуальной проверкой)
-    all_numbers = re.findall(r'\d+', t)
-    print(f"🔎 Все числа в тексте: {all_numbers}")
+    all_numbers = list(ALL_NUMBERS_RE.finditer(t))
+    print(f"🔎 Все числа в тексте: {[m.group(0) for m in all_numbers]}")
     
-    for num_str in all_numbers:
+    for m in all_numbers:
+        num_str = m.group(0)
         # Пропускаем если это телефон
         if not is_not_phone(num_str):
             print(f"   Пропускаем '{num_str}' - телефонный номер")
@@ -353,9 +543,8 @@ def check_interesting_application(text: str):
             
         if num >= 50000:
             print(f"   🎯 НАШЛИ БОЛЬШУЮ СУММУ (резервный поиск): {num} руб.")
-            return True, num
+            return found("any_number", num, m)
     
-    print(f"❌ Не нашли суммы > 50000")
-    return False, 0
+    return None
 
 
@@ -1,12 +1,193 @@
 import os
+import json
+import time
+import sqlite3
+import threading
 import requests
 from datetime import datetime
 
+from tracing import span
+
 # === НАСТРОЙКИ FORMSPREE ===
 FORMSPREE_URL = os.getenv("FORMSPREE_URL", "https://formspree.io/f/xgozobyn")
 EMAIL_TO = os.getenv("EMAIL_TO", "229@fortis-steel.ru")
 
-def send_application_email(full_text: str, amount: int, phone: str, email: str):
+# === НАСТРОЙКИ ДАЙДЖЕСТА ===
+# В режиме дайджеста заявки копятся и уходят одним письмом раз в окно,
+# а крупные (от порога) по-прежнему отправляются сразу.
+LEAD_DIGEST_ENABLED = os.getenv("LEAD_DIGEST_ENABLED", "false").lower() in ("1", "true", "yes")
+LEAD_DIGEST_WINDOW = float(os.getenv("LEAD_DIGEST_WINDOW", "900"))  # секунд
+LEAD_DIGEST_INCLUDE_FULL = os.getenv("LEAD_DIGEST_INCLUDE_FULL", "false").lower() in ("1", "true", "yes")
+LEAD_DIGEST_IMMEDIATE_AMOUNT = int(os.getenv("LEAD_DIGEST_IMMEDIATE_AMOUNT", "500000"))
+# Очередь дайджеста на диске (по умолчанию — в файле снимков сессий):
+# сессия помечается email_sent, как только заявка в очереди, поэтому очередь
+# должна пережить падение процесса. Пустое значение — только в памяти.
+LEAD_DIGEST_DB_PATH = os.getenv("LEAD_DIGEST_DB_PATH", os.getenv("SESSION_DB_PATH", "sessions.db"))
+
+
+def post_to_formspree(form_data: dict, url: str = None) -> bool:
+    """Отправляем одну форму в Formspree. True — если принята."""
+    with span("formspree_post", type=form_data.get("type")) as attrs:
+        response = requests.post(
+            url or FORMSPREE_URL,
+            data=form_data,
+            headers={
+                "Accept": "application/json",
+                "Content-Type": "application/x-www-form-urlencoded"
+            },
+            timeout=10
+        )
+        attrs["status"] = response.status_code
+    
+    print(f"   Статус ответа: {response.status_code}")
+    
+    if response.status_code == 200:
+        return True
+    print(f"❌ Ошибка Formspree: {response.text}")
+    return False
+
+
+class LeadDigest:
+    """
+    Накопитель заявок для дайджеста.
+    add() кладёт заявку в буфер, flush() отправляет всё одним письмом,
+    отсортировав по сумме (крупные сверху).
+
+    С path очередь дублируется в SQLite: add() возвращается только после
+    записи на диск, строки удаляются после успешной отправки, а при старте
+    неотправленные заявки поднимаются обратно.
+    """
+
+    def __init__(self, window: float, url: str = None, path: str = None):
+        self.window = window
+        self.url = url
+        self._leads = []  # (id строки на диске или None, заявка)
+        self._window_started = None
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS digest_leads ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " data TEXT NOT NULL)"
+            )
+            rows = self._conn.execute("SELECT id, data FROM digest_leads ORDER BY id").fetchall()
+            self._leads = [(row_id, json.loads(data)) for row_id, data in rows]
+            if self._leads:
+                # Окно отсчитываем заново: заявки уйдут не позже чем через window после рестарта
+                self._window_started = time.monotonic()
+                print(f"📋 Восстановлено заявок в очереди дайджеста: {len(self._leads)}")
+
+    def add(self, lead: dict):
+        with self._lock:
+            row_id = None
+            if self._conn:
+                row_id = self._conn.execute(
+                    "INSERT INTO digest_leads (data) VALUES (?)", (json.dumps(lead, ensure_ascii=False),)
+                ).lastrowid
+            if not self._leads:
+                self._window_started = time.monotonic()
+            self._leads.append((row_id, lead))
+            print(f"📋 Заявка на {lead['amount']:,} руб. добавлена в дайджест (в очереди: {len(self._leads)})")
+
+    def flush(self, force: bool = False) -> bool:
+        """Отправляем накопленное, если окно истекло (или force). True — если нечего слать или отправлено."""
+        with self._lock:
+            if not self._leads:
+                return True
+            if not force and time.monotonic() - self._window_started < self.window:
+                return True
+            queued, self._leads = self._leads, []
+            self._window_started = None
+
+        leads = [lead for _, lead in queued]
+        leads.sort(key=lambda lead: lead["amount"], reverse=True)
+        total = sum(lead["amount"] for lead in leads)
+        
+        lines = []
+        for i, lead in enumerate(leads, 1):
+            kind = "ПОЛНАЯ" if lead["type"] == "full_application" else f"НЕПОЛНАЯ (нет {lead.get('missing_data', '')})"
+            lines.append(
+                f"{i}. {lead['amount']:,} руб. | {kind} | тел: {lead['phone']} | email: {lead['client_email']} | {lead['timestamp']}\n"
+                f"   Категория: {lead.get('category', '-')} | уверенность: {lead.get('confidence', '-')} | "
+                f"правило: {lead.get('rule', '-')} | найдено: {lead.get('matched', '-')}\n"
+                f"{lead['text']}"
+            )
+
+        form_data = {
+            "_replyto": "bot@fortissteelbot.com",
+            "_subject": f"📋 ДАЙДЖЕСТ ЗАЯВОК Fortis: {len(leads)} шт. на {total:,} руб.",
+            "amount": f"{total:,} руб.",
+            "count": str(len(leads)),
+            "text": "\n\n".join(lines),
+            "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            "type": "digest"
+        }
+
+        print(f"\n📨 ОТПРАВКА ДАЙДЖЕСТА: {len(leads)} заявок на {total:,} руб.")
+        try:
+            success = post_to_formspree(form_data, self.url)
+        except Exception as e:
+            print(f"❌ Ошибка при отправке дайджеста: {str(e)}")
+            success = False
+
+        if not success:
+            # Возвращаем заявки в буфер, чтобы отправить в следующий раз (на диске они остались)
+            with self._lock:
+                self._leads = queued + self._leads
+                if self._window_started is None:
+                    self._window_started = time.monotonic()
+            return False
+
+        if self._conn:
+            with self._lock:
+                self._conn.executemany("DELETE FROM digest_leads WHERE id = ?",
+                                       [(row_id,) for row_id, _ in queued if row_id is not None])
+        print(f"✅ Дайджест отправлен на {EMAIL_TO}")
+        return True
+
+
+def create_lead_digest():
+    """Дайджест, если он включён; без доступного файла очередь живёт только в памяти."""
+    if not LEAD_DIGEST_ENABLED:
+        return None
+    try:
+        return LeadDigest(LEAD_DIGEST_WINDOW, path=LEAD_DIGEST_DB_PATH or None)
+    except (sqlite3.Error, ValueError) as e:
+        print(f"⚠️ Очередь дайджеста не сохраняется на диск ({LEAD_DIGEST_DB_PATH}): {e}")
+        return LeadDigest(LEAD_DIGEST_WINDOW)
+
+
+lead_digest = create_lead_digest()
+
+
+def queue_for_digest(form_data: dict, amount: int) -> bool:
+    """Кладём заявку в дайджест, если он включён и сумма ниже порога срочной отправки."""
+    if lead_digest is None or amount >= LEAD_DIGEST_IMMEDIATE_AMOUNT:
+        return False
+    lead_digest.add({**form_data, "amount": amount})
+    return True
+
+
+def flush_lead_digest(force: bool = False) -> bool:
+    """Вызывается периодически из main (и с force=True при остановке)."""
+    if lead_digest is None:
+        return True
+    return lead_digest.flush(force=force)
+
+def add_score_fields(form_data: dict, score) -> dict:
+    """Добавляем в письмо разбор суммы (LeadScore): категорию, правило, фрагменты, уверенность."""
+    if score is None:
+        return form_data
+    fields = score.form_fields()
+    form_data.update(fields)
+    form_data["_subject"] += f" | {fields['category']}"
+    return form_data
+
+
+def send_application_email(full_text: str, amount: int, phone: str, email: str, score=None):
     """
     Отправка ПОЛНОЙ заявки через Formspree API.
     Вызывается, когда у клиента есть И телефон, И email.
@@ -32,33 +213,24 @@ def send_application_email(full_text: str, amount: int, phone: str, email: str):
             "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
             "type": "full_application"
         }
+        add_score_fields(form_data, score)
         
-        # Отправляем через Formspree API
-        response = requests.post(
-            FORMSPREE_URL,
-            data=form_data,
-            headers={
-                "Accept": "application/json",
-                "Content-Type": "application/x-www-form-urlencoded"
-            },
-            timeout=10
-        )
-        
-        print(f"   Статус ответа: {response.status_code}")
+        # В режиме дайджеста полные заявки тоже можно копить
+        if LEAD_DIGEST_INCLUDE_FULL and queue_for_digest(form_data, amount):
+            return True
         
-        if response.status_code == 200:
+        # Отправляем через Formspree API
+        if post_to_formspree(form_data):
             print(f"✅ ПОЛНАЯ заявка отправлена на {EMAIL_TO}")
             return True
-        else:
-            print(f"❌ Ошибка Formspree: {response.text}")
-            return False
+        return False
             
     except Exception as e:
         print(f"❌ Ошибка при отправке через Formspree: {str(e)}")
         return False
 
 
-def send_incomplete_application_email(full_text: str, amount: int, phone: str = None, email: str = None):
+def send_incomplete_application_email(full_text: str, amount: int, phone: str = None, email: str = None, score=None):
     """
     Отправка НЕПОЛНОЙ заявки через Formspree API.
     Вызывается при таймауте (10 минут) или если клиент дал только один контакт.
@@ -94,26 +266,17 @@ def send_incomplete_application_email(full_text: str, amount: int, phone: str =
             "type": "incomplete_application",
             "reason": "Таймаут 10 минут"
         }
+        add_score_fields(form_data, score)
         
-        # Отправляем через Formspree API
-        response = requests.post(
-            FORMSPREE_URL,
-            data=form_data,
-            headers={
-                "Accept": "application/json",
-                "Content-Type": "application/x-www-form-urlencoded"
-            },
-            timeout=10
-        )
-        
-        print(f"   Статус ответа: {response.status_code}")
+        # В режиме дайджеста неполные заявки копятся и уходят одним письмом
+        if queue_for_digest(form_data, amount):
+            return True
         
-        if response.status_code == 200:
+        # Отправляем через Formspree API
+        if post_to_formspree(form_data):
             print(f"✅ НЕПОЛНАЯ заявка отправлена на {EMAIL_TO}")
             return True
-        else:
-            print(f"❌ Ошибка Formspree: {response.text}")
-            return False
+        return False
             
     except Exception as e:
         print(f"❌ Ошибка при отправке через Formspree: {str(e)}")
@@ -0,0 +1,109 @@
+import os
+import threading
+
+import replicate
+
+try:
+    from llama_cpp import Llama  # Необязательная зависимость: локальная модель на CPU
+except ImportError:
+    Llama = None
+
+# Параметры генерации, общие для всех backend'ов
+GENERATION_PARAMS = {
+    "max_tokens": 1000,
+    "temperature": 0.8,
+    "top_p": 0.9
+}
+
+
+class LLMBackend:
+    """
+    Общий интерфейс backend'а: stream(prompt) отдаёт куски текста по мере генерации.
+    Исключения пробрасываются вызывающему коду.
+    """
+
+    name = "base"
+
+    def stream(self, prompt: str):
+        raise NotImplementedError
+
+    def describe(self) -> str:
+        return self.name
+
+
+class ReplicateBackend(LLMBackend):
+    """Удалённая модель через Replicate API."""
+
+    name = "replicate"
+
+    def __init__(self, api_key: str, model: str = "meta/meta-llama-3-70b-instruct"):
+        self.model = model
+        self.client = replicate.Client(api_token=api_key)
+
+    def stream(self, prompt: str):
+        # client.run() для модели без версии ждёт конца генерации (prediction.wait()),
+        # поэтому читаем server-sent events: токены приходят по мере генерации.
+        # str(event) — текст для событий output и пустая строка для logs/done
+        for event in self.client.stream(self.model, input={"prompt": prompt, **GENERATION_PARAMS}):
+            text = str(event)
+            if text:
+                yield text
+
+    def describe(self) -> str:
+        return f"Replicate ({self.model})"
+
+
+class LlamaCppBackend(LLMBackend):
+    """
+    Локальная квантованная GGUF-модель через llama.cpp на CPU.
+    Нужна для разработки и нагрузочных тестов без сети.
+    """
+
+    name = "llamacpp"
+
+    def __init__(self, model_path: str, n_threads: int = None, n_ctx: int = 4096):
+        if Llama is None:
+            raise RuntimeError("Для LLM_BACKEND=llamacpp нужен пакет llama-cpp-python")
+        if not model_path or not os.path.exists(model_path):
+            raise RuntimeError(f"GGUF-модель не найдена: {model_path!r} (задайте LLM_MODEL_PATH)")
+        self.model_path = model_path
+        self.n_threads = n_threads or os.cpu_count()
+        self.llm = Llama(model_path=model_path, n_threads=self.n_threads, n_ctx=n_ctx, verbose=False)
+        # Один экземпляр модели не потокобезопасен — генерации идут по очереди
+        self._lock = threading.Lock()
+
+    def stream(self, prompt: str):
+        with self._lock:
+            for chunk in self.llm(prompt, stream=True, **GENERATION_PARAMS):
+                text = chunk["choices"][0]["text"]
+                if text:
+                    yield text
+
+    def describe(self) -> str:
+        return f"llama.cpp ({os.path.basename(self.model_path)}, потоков: {self.n_threads})"
+
+
+LLM_BACKENDS = ("replicate", "llamacpp")
+
+
+def create_llm_backend(replicate_api_token: str = None):
+    """
+    Выбираем backend по LLM_BACKEND (replicate | llamacpp).
+    Возвращает None, если backend не настроен — тогда AI-ответы недоступны.
+    Неизвестное имя — ошибка: опечатка не должна молча уводить на Replicate.
+    """
+    backend_name = os.getenv("LLM_BACKEND", "replicate").strip().lower()
+    if backend_name not in LLM_BACKENDS:
+        raise RuntimeError(f"Неизвестный LLM_BACKEND={backend_name!r}, допустимо: {', '.join(LLM_BACKENDS)}")
+
+    if backend_name == "llamacpp":
+        threads = os.getenv("LLM_THREADS")
+        return LlamaCppBackend(
+            model_path=os.getenv("LLM_MODEL_PATH"),
+            n_threads=int(threads) if threads else None,
+            n_ctx=int(os.getenv("LLM_CONTEXT_SIZE", "4096")),
+        )
+
+    if not replicate_api_token:
+        return None
+    return ReplicateBackend(replicate_api_token, model=os.getenv("REPLICATE_MODEL", "meta/meta-llama-3-70b-instruct"))
@@ -1,16 +1,41 @@
 import os
 import sys
-from fastapi import FastAPI, Request, Response
+from fastapi import FastAPI, Query, Request, Response, WebSocket, WebSocketDisconnect
+from starlette.requests import HTTPConnection
+from fastapi.responses import JSONResponse, PlainTextResponse
+from fastapi.exceptions import RequestValidationError
+from fastapi.exception_handlers import request_validation_exception_handler
+from pydantic import ValidationError
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from chatbot_logic import generate_bot_reply, check_interesting_application
-from email_utils import send_application_email, send_incomplete_application_email
+from llm_backends import create_llm_backend
+from chatbot_logic import generate_bot_reply, stream_bot_reply, score_application, LeadScore, FALLBACK_REPLY
+from email_utils import send_application_email, send_incomplete_application_email, flush_lead_digest
+from admission import AdmissionController, OVERLOADED_REPLY
+from schemas import (
+    ChatRequest, MAX_MESSAGE_CHARS, MAX_REQUEST_BYTES,
+    ChatResponse, RateLimitedResponse, HealthResponse, ServiceInfo, PingResponse, DebugSessionsResponse,
+    AdminStatsResponse, DebugTracesResponse, LoopLagResponse, EmailTestResponse,
+)
+from sessions import SessionRecord, SessionManager
+from session_store import SessionSnapshotStore
+from rate_limit import RateLimiter, create_bucket_store, parse_limit, client_ip
+from tracing import start_trace, span, current_request_id, recorder as trace_recorder
+from static_assets import WidgetAssets, IMMUTABLE_CACHE_CONTROL, LOADER_CACHE_CONTROL
+from stats import dashboard
+from replay_cache import ReplayCache, replay_key
+from profiling import sample_stacks, profile_event_loop, loop_monitor, ProfilerBusy, LOOP_LAG_MONITOR
 from dotenv import load_dotenv
 import re
 from datetime import datetime, timedelta
 import requests
 import threading
 import asyncio
+import uuid
+import math
+import hmac
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 
 # Загружаем переменные окружения ДО всего остального
 load_dotenv()
@@ -48,9 +73,17 @@ def validate_environment():
         "ENVIRONMENT": {
             "description": "Режим работы (development/production)",
             "default": "production"
+        },
+        "ADMIN_TOKEN": {
+            "description": "Токен для служебных эндпоинтов (/debug/traces)",
+            "default": "не задан, служебные эндпоинты закрыты"
         }
     }
     
+    # Для локального backend'а токен Replicate не нужен
+    if os.getenv("LLM_BACKEND", "replicate").lower() != "replicate":
+        required_vars.pop("REPLICATE_API_TOKEN")
+    
     missing = []
     
     # Проверяем обязательные переменные
@@ -75,7 +108,9 @@ def validate_environment():
     for var_name, var_info in optional_vars.items():
         value = os.getenv(var_name)
         if value:
-            if "URL" in var_name:
+            if "TOKEN" in var_name:
+                print(f"   🔑 {var_name}: ***")
+            elif "URL" in var_name:
                 print(f"   🌐 {var_name}: {value}")
             else:
                 print(f"   ⚙️  {var_name}: {value}")
@@ -160,17 +195,143 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Подключаем папку static, чтобы отдавать widget.js
+# Отсекаем слишком большие тела запросов ещё до разбора JSON
+@app.middleware("http")
+async def limit_request_size(request: Request, call_next):
+    content_length = request.headers.get("content-length")
+    if request.method == "POST" and content_length and content_length.isdigit() and int(content_length) > MAX_REQUEST_BYTES:
+        print(f"🚫 Слишком большой запрос: {content_length} байт")
+        return JSONResponse(status_code=413, content={"reply": MESSAGE_TOO_LONG_REPLY})
+    if request.method == "POST" and content_length is None:
+        # Chunked-тело без Content-Length: считаем байты по мере чтения
+        # и обрываем на лимите, не дочитывая остальное в память
+        received = bytearray()
+        async for chunk in request.stream():
+            received += chunk
+            if len(received) > MAX_REQUEST_BYTES:
+                print(f"🚫 Слишком большой запрос без Content-Length: больше {MAX_REQUEST_BYTES} байт")
+                return JSONResponse(status_code=413, content={"reply": MESSAGE_TOO_LONG_REPLY})
+        # Прочитанное тело отдаём обработчику так же, как это делает request.body()
+        request._body = bytes(received)
+    return await call_next(request)
+
+# Собранный виджет держим в памяти: загрузчик + хешированный файл
+widget_assets = WidgetAssets()
+
+@app.get("/static/widget.js")
+async def widget_loader(request: Request):
+    """
+    Маленький загрузчик виджета. Сайт подключает именно его,
+    а он подгружает хешированную версию, которая кешируется навсегда.
+    """
+    headers = {
+        "Cache-Control": LOADER_CACHE_CONTROL,
+        "ETag": widget_assets.loader_etag,
+    }
+    not_modified = widget_assets.not_modified(request.headers.get("if-none-match"), widget_assets.loader_etag)
+    dashboard.record_cache("widget_loader", not_modified)
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+    return Response(content=widget_assets.loader, media_type="application/javascript", headers=headers)
+
+@app.get("/static/dist/{filename}")
+async def widget_bundle(filename: str, request: Request):
+    """Хешированный виджет: immutable-кеш, ETag/304 и предсжатые gzip/brotli."""
+    if filename != widget_assets.filename:
+        return Response(status_code=404, content=f"Asset {filename} not found")
+
+    encoding = widget_assets.pick_encoding(request.headers.get("accept-encoding"))
+    etag = widget_assets.widget_etags[encoding]
+    headers = {
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+        "ETag": etag,
+        "Vary": "Accept-Encoding",
+    }
+    not_modified = widget_assets.not_modified(request.headers.get("if-none-match"), etag)
+    dashboard.record_cache("widget_bundle", not_modified)
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(content=widget_assets.variants[encoding], media_type="application/javascript", headers=headers)
+
+# Подключаем папку static для остальных файлов
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 # Получаем переменные окружения (теперь они точно есть)
 REPLICATE_API_TOKEN = os.getenv("REPLICATE_API_TOKEN")
+
+# LLM backend: Replicate по умолчанию или локальная модель (LLM_BACKEND=llamacpp)
+try:
+    llm_backend = create_llm_backend(REPLICATE_API_TOKEN)
+except Exception as e:
+    llm_backend = None
+    print(f"⚠️ LLM backend не инициализирован: {e}")
 FORMSPREE_URL = os.getenv("FORMSPREE_URL", "https://formspree.io/f/xgozobyn")
 EMAIL_TO = os.getenv("EMAIL_TO", "229@fortis-steel.ru")
 RENDER_EXTERNAL_URL = os.getenv("RENDER_EXTERNAL_URL", "https://fortis-steel-bot.onrender.com")
+# Номер воркера при запуске через serve.py с WEB_CONCURRENCY > 1
+WORKER_ID = os.getenv("WORKER_ID")
+# Токен для служебных эндпоинтов (/debug/traces и т.п.); без него они закрыты
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
 
-# Хранилище сессий пользователей (ключ: IP, значение: данные сессии)
-user_sessions = {}
+# Настройки WebSocket-канала виджета
+WS_HEARTBEAT_INTERVAL = int(os.getenv("WS_HEARTBEAT_INTERVAL", "25"))  # секунд между ping
+WS_MAX_MISSED_HEARTBEATS = 2     # после стольких ping без ответа закрываем соединение
+WS_STREAM_BUFFER = 64            # сколько токенов держим между генерацией и отправкой
+WS_SEND_TIMEOUT = 10             # секунд на отправку одного кадра медленному клиенту
+
+# Лимиты запросов в формате "количество/секунды", отдельно для LLM и для заявок
+bucket_store = create_bucket_store()
+llm_limiter = RateLimiter("llm", {
+    "session": parse_limit(os.getenv("RATE_LIMIT_LLM_SESSION"), "10/60"),
+    "ip": parse_limit(os.getenv("RATE_LIMIT_LLM_IP"), "30/60"),
+}, bucket_store)
+lead_limiter = RateLimiter("lead", {
+    "session": parse_limit(os.getenv("RATE_LIMIT_LEAD_SESSION"), "10/600"),
+    "ip": parse_limit(os.getenv("RATE_LIMIT_LEAD_IP"), "30/600"),
+}, bucket_store)
+
+# Контроль допуска к LLM: сколько генераций параллельно, сколько ждут и как долго
+LLM_MAX_CONCURRENT = int(os.getenv("LLM_MAX_CONCURRENT", "8"))
+llm_admission = AdmissionController(
+    max_concurrent=LLM_MAX_CONCURRENT,
+    max_queue=int(os.getenv("LLM_MAX_QUEUE", "32")),
+    queue_timeout=float(os.getenv("LLM_QUEUE_TIMEOUT", "5")),
+)
+
+# Последние ответы по id сообщения: повторная отправка не запускает обработку заново
+replay_cache = ReplayCache()
+MESSAGE_TOO_LONG_REPLY = f"Сообщение слишком длинное. Пожалуйста, сократите его до {MAX_MESSAGE_CHARS} символов или опишите заказ кратко."
+INVALID_MESSAGE_REPLY = "Не удалось разобрать сообщение. Пожалуйста, попробуйте ещё раз."
+RATE_LIMITED_REPLY = "Слишком много сообщений подряд. Пожалуйста, подождите немного и напишите снова."
+
+# Хранилище сессий пользователей (ключ: токен сессии виджета или IP, значение: данные сессии)
+session_manager = SessionManager()
+user_sessions = session_manager.sessions
+
+# Снимки сессий на диск (SQLite WAL), чтобы рестарт не терял заявки.
+# Пустой SESSION_DB_PATH отключает снимки.
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "sessions.db")
+SESSION_SNAPSHOT_INTERVAL = float(os.getenv("SESSION_SNAPSHOT_INTERVAL", "5"))
+session_store = None
+if SESSION_DB_PATH and os.getenv("RENDER") and not os.path.isabs(SESSION_DB_PATH):
+    # Render задаёт RENDER=true; каталог приложения там очищается при деплое и рестарте
+    print(f"⚠️ SESSION_DB_PATH={SESSION_DB_PATH} не на постоянном диске Render: "
+          f"снимки сессий пропадут при рестарте (см. disk в render.yaml)")
+if SESSION_DB_PATH:
+    try:
+        session_store = SessionSnapshotStore(SESSION_DB_PATH)
+        user_sessions.update(session_store.load_all())
+        print(f"💾 Восстановлено сессий из {SESSION_DB_PATH}: {len(user_sessions)}")
+    except Exception as e:
+        session_store = None
+        print(f"⚠️ Снимки сессий недоступны ({SESSION_DB_PATH}): {e}")
+
+def mark_session_dirty(session_id: str):
+    """Помечаем сессию для записи в следующий снимок."""
+    if session_store:
+        session_store.mark_dirty(session_id)
 
 # ====== ФУНКЦИИ ДЛЯ ПОДДЕРЖАНИЯ АКТИВНОСТИ ======
 
@@ -220,192 +381,342 @@ async def startup_event():
     print("="*60)
     
     print(f"📧 Email сервис: {'✅ Formspree' if FORMSPREE_URL else '❌ Не настроен'}")
-    print(f"🤖 AI сервис: {'✅ Replicate' if REPLICATE_API_TOKEN else '❌ Не настроен'}")
+    print(f"🤖 AI сервис: {'✅ ' + llm_backend.describe() if llm_backend else '❌ Не настроен'}")
     print(f"📨 Отправка писем на: {EMAIL_TO}")
     print(f"🌐 Внешний URL: {RENDER_EXTERNAL_URL}")
     
+    # Генерации идут в потоках: пул должен вмещать все допущенные LLM-запросы
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=LLM_MAX_CONCURRENT + 8))
+    
     # Запускаем keep-alive в фоне только если есть URL
-    if RENDER_EXTERNAL_URL and RENDER_EXTERNAL_URL.startswith("http"):
+    # При нескольких воркерах пингует только первый
+    if WORKER_ID not in (None, "0"):
+        print(f"👷 Воркер {WORKER_ID}: keep-alive выполняет воркер 0")
+    elif RENDER_EXTERNAL_URL and RENDER_EXTERNAL_URL.startswith("http"):
         print("🔔 Starting keep-alive service...")
         threading.Thread(target=start_keep_alive, daemon=True).start()
         print("✅ Keep-alive service started")
     else:
         print("⚠️ Keep-alive service disabled (no valid external URL)")
     
+    if LOOP_LAG_MONITOR:
+        loop_monitor.start()
+    
+    # Периодически проверяем таймауты сессий и пишем снимки,
+    # иначе после рестарта 10-минутные письма ждали бы следующего /chat
+    asyncio.create_task(session_maintenance_loop())
+    
     print("✅ Приложение успешно запущено")
     print("="*60 + "\n")
 
-def cleanup_old_sessions():
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Сохраняем последние изменения сессий и отправляем недособранный дайджест."""
+    flush_lead_digest(force=True)
+    trace_recorder.close()
+    if session_store:
+        written = session_store.flush(user_sessions)
+        print(f"💾 Снимок сессий при остановке: {written} изменений")
+        session_store.close()
+
+async def session_maintenance_loop():
+    """Фоновая задача: таймауты сессий, дайджест заявок и инкрементальные снимки на диск."""
+    while True:
+        await asyncio.sleep(SESSION_SNAPSHOT_INTERVAL)
+        try:
+            await cleanup_old_sessions()
+            await asyncio.to_thread(flush_lead_digest)
+            if session_store:
+                await asyncio.to_thread(session_store.flush, user_sessions)
+        except Exception as e:
+            print(f"❌ Ошибка обслуживания сессий: {e}")
+
+async def cleanup_old_sessions():
     """
     Очистка старых сессий:
     - После 10 минут отправляем неполную заявку (если есть хотя бы один контакт)
     - После 2 часов удаляем сессию полностью
+    Каждая сессия меняется только под своей блокировкой.
     """
     now = datetime.now()
-    to_delete = []
     
-    for session_id, session_data in user_sessions.items():
-        session_age = now - session_data['created_at']
+    # Итерируем по снимку: обработчики могут добавлять сессии, пока мы ждём блокировок
+    for session_id, session_data in list(user_sessions.items()):
+        session_age = now - session_data.created_at
         
         # Если сессии больше 10 минут И есть хотя бы один контакт И письмо еще не отправлено
         if (session_age > timedelta(minutes=10) and 
-            not session_data['email_sent'] and 
-            (session_data['phone'] or session_data['email'])):
+            not session_data.email_sent and 
+            (session_data.phone or session_data.email)):
             
-            print(f"⏰ ТАЙМАУТ 10 минут: отправляем неполную заявку для сессии {session_id}")
-            
-            # Отправляем неполную заявку
-            full_text = "\n".join(session_data['text_parts'])
-            send_incomplete_application_email(
-                full_text, 
-                session_data['amount'], 
-                session_data['phone'], 
-                session_data['email']
-            )
-            session_data['email_sent'] = True
-            session_data['incomplete_sent'] = True
-            session_data['timeout_reason'] = "10 минут без второго контакта"
+            async with session_manager.lock(session_id):
+                # Перепроверяем под блокировкой: пока ждали, письмо могло уйти
+                if session_data.email_sent or user_sessions.get(session_id) is not session_data:
+                    continue
+                
+                print(f"⏰ ТАЙМАУТ 10 минут: отправляем неполную заявку для сессии {session_id}")
+                
+                # Отправляем неполную заявку
+                await asyncio.to_thread(
+                    send_incomplete_application_email,
+                    session_data.full_text, 
+                    session_data.amount, 
+                    session_data.phone, 
+                    session_data.email,
+                    session_data.score
+                )
+                session_data.email_sent = True
+                session_data.incomplete_sent = True
+                dashboard.record_email("incomplete")
+                session_data.timeout_reason = "10 минут без второго контакта"
+                mark_session_dirty(session_id)
         
         # Удаляем очень старые сессии (больше 2 часов)
         if session_age > timedelta(hours=2):
-            to_delete.append(session_id)
-            print(f"🧹 Удаляем старую сессию {session_id} (больше 2 часов)")
+            async with session_manager.lock(session_id):
+                if user_sessions.get(session_id) is session_data:
+                    del user_sessions[session_id]
+                    if session_store:
+                        session_store.mark_deleted(session_id)
+                    print(f"🧹 Удаляем старую сессию {session_id} (больше 2 часов)")
+
+def handle_lead_message(session_id: str, user_message: str, score: LeadScore) -> str:
+    """
+    Обработка сообщения в рамках крупной заявки (>50,000 руб):
+    ведём сессию, собираем контакты, отправляем письмо.
+    Возвращает ответ бота.
+    """
+    amount = score.amount
+    
+    # Создаем новую сессию или получаем существующую
+    if session_id not in user_sessions:
+        user_sessions[session_id] = SessionRecord(amount=amount, score=score)
+        dashboard.record_lead(amount)
+        print(f"🆕 Создана новая сессия для {session_id}")
+    
+    session = user_sessions[session_id]
+    session.transcript.append(user_message)
+    session.message_count += 1
+    full_text = session.full_text
+    
+    # Ищем контакты в текущем сообщении
+    
+    # Телефон: ищем по паттерну (+7, 8, и т.д.)
+    phone_pattern = r'[\+7]?[-\s]?\(?\d{3}\)?[-\s]?\d{3}[-\s]?\d{2}[-\s]?\d{2}'
+    phone_matches = re.findall(phone_pattern, user_message)
+    
+    # Email: ищем стандартный email паттерн (с ограниченной длиной частей)
+    email_pattern = r'[a-zA-Z0-9._%+-]{1,64}@[a-zA-Z0-9.-]{1,255}\.[a-zA-Z]{2,24}'
+    email_matches = re.findall(email_pattern, user_message)
     
-    for session_id in to_delete:
-        del user_sessions[session_id]
+    # Обновляем найденные контакты
+    if phone_matches and not session.phone:
+        session.phone = phone_matches[0]
+        print(f"📞 Найден телефон в сообщении: {session.phone}")
+    
+    if email_matches and not session.email:
+        session.email = email_matches[0]
+        print(f"📧 Найден email в сообщении: {session.email}")
+    
+    # Дополнительная проверка по ключевым словам (если не нашли паттерном)
+    if not session.phone and any(word in user_message.lower() for word in ['тел', 'телефон', '+7', '8-9', '89', 'моб', 'сотов']):
+        session.phone = "Указан в тексте (не распознан автоматически)"
+        print(f"📞 Телефон указан в тексте")
+    
+    if not session.email and '@' in user_message:
+        session.email = "Указан в тексте (не распознан автоматически)"
+        print(f"📧 Email указан в тексте")
+    
+    # Логируем текущее состояние сессии
+    print(f"📊 СОСТОЯНИЕ СЕССИИ {session_id}:")
+    print(f"   📝 Сообщений: {session.message_count}")
+    print(f"   📞 Телефон: {'✅ ' + str(session.phone) if session.phone else '❌ Нет'}")
+    print(f"   📧 Email: {'✅ ' + str(session.email) if session.email else '❌ Нет'}")
+    print(f"   📨 Полное письмо отправлено: {'✅' if session.email_sent and not session.incomplete_sent else '❌'}")
+    print(f"   ⚠️ Неполное письмо отправлено: {'✅' if session.incomplete_sent else '❌'}")
+    print(f"   💡 Напоминание отправлено: {'✅' if session.reminder_sent else '❌'}")
+    
+    # ===== ЛОГИКА ОТВЕТА БОТА =====
+    
+    # Случай 1: Письмо уже отправлено (полное или неполное)
+    if session.email_sent:
+        if session.incomplete_sent:
+            bot_reply = "Заявка передана менеджеру. Мы свяжемся с вами по имеющимся контактам. Спасибо!"
+        else:
+            bot_reply = "Спасибо! Полная заявка передана менеджеру. С вами свяжутся в течение 30 минут."
+    
+    # Случай 2: Есть ОБА контакта - отправляем ПОЛНУЮ заявку
+    elif session.phone and session.email:
+        print(f"📨 ОТПРАВЛЯЕМ ПОЛНУЮ ЗАЯВКУ (есть и телефон, и email)")
+        success = send_application_email(full_text, amount, session.phone, session.email, session.score)
+        if success:
+            session.email_sent = True
+            dashboard.record_email("full")
+            bot_reply = "Спасибо! Полная заявка передана менеджеру. С вами свяжутся в течение 30 минут."
+        else:
+            bot_reply = "Произошла ошибка при отправке заявки. Пожалуйста, попробуйте еще раз или свяжитесь с нами напрямую."
+    
+    # Случай 3: Есть только ОДИН контакт
+    elif session.phone or session.email:
+        has_phone = bool(session.phone)
+        has_email = bool(session.email)
+        
+        # Если это уже не первое сообщение с контактом, отправляем напоминание
+        if not session.reminder_sent and session.message_count >= 2:
+            if has_phone and not has_email:
+                bot_reply = f"Спасибо за телефон! Для быстрого оформления заказа на {amount} руб. укажите также email. Это ускорит обработку заявки."
+            elif has_email and not has_phone:
+                bot_reply = f"Спасибо за email! Для быстрого оформления заказа на {amount} руб. укажите также телефон для связи. Это ускорит обработку заявки."
+            session.reminder_sent = True
+            print(f"💡 Отправлено напоминание о втором контакте")
+        
+        else:
+            # Просим недостающий контакт
+            if has_phone and not has_email:
+                bot_reply = f"Спасибо! Для оформления заказа на {amount} руб. мне также нужен ваш email. Напишите его, пожалуйста."
+            elif has_email and not has_phone:
+                bot_reply = f"Спасибо! Для оформления заказа на {amount} руб. мне также нужен ваш телефон для связи. Напишите его, пожалуйста."
+            else:
+                bot_reply = f"Это уже серьёзный заказ ({amount} руб.) — назовите, пожалуйста, телефон и email для связи?"
+    
+    # Случай 4: Нет контактов вообще
+    else:
+        bot_reply = f"Это уже серьёзный заказ ({amount} руб.) — давайте я передам его менеджеру для лучших условий. Назовите, пожалуйста, телефон и email для связи?"
+    
+    mark_session_dirty(session_id)
+    return bot_reply
+
+
+async def handle_lead_message_locked(session_id: str, user_message: str, score: LeadScore) -> str:
+    """
+    handle_lead_message под блокировкой сессии и в рабочем потоке:
+    два быстрых сообщения одного посетителя (двойной Enter) обрабатываются
+    по очереди, и полная заявка уходит ровно один раз.
+    """
+    async with session_manager.lock(session_id):
+        with span("lead_handling"):
+            return await asyncio.to_thread(handle_lead_message, session_id, user_message, score)
+
+
+def resolve_session_id(client_session_id, user_ip: str) -> str:
+    """
+    Сессия привязывается к токену от виджета (localStorage),
+    а если его нет — к IP, как раньше.
+    """
+    if isinstance(client_session_id, str) and 0 < len(client_session_id) <= 64:
+        return client_session_id
+    return user_ip
 
-@app.post("/chat")
-async def chat_endpoint(request: Request):
-    data = await request.json()
-    user_message = data.get("message", "")
-    user_ip = request.client.host  # Используем IP как идентификатор сессии
+
+def request_ip(connection: HTTPConnection) -> str:
+    """IP посетителя (за прокси Render — из X-Forwarded-For, см. rate_limit.client_ip)."""
+    peer = connection.client.host if connection.client else ""
+    return client_ip(connection.headers.get("x-forwarded-for"), peer)
+
+
+def is_replayable(reply: str) -> bool:
+    """Сохраняем только настоящие ответы: после перегрузки или ошибки повтор должен пробовать снова."""
+    return bool(reply) and reply != OVERLOADED_REPLY and not reply.startswith("Ошибка:")
+
+
+def is_admin_request(request: Request) -> bool:
+    """
+    Служебные эндпоинты доступны только с заголовком X-Admin-Token.
+    Токен в ?token= не принимаем: строка запроса попадает в логи Render и прокси.
+    """
+    if not ADMIN_TOKEN:
+        return False
+    token = request.headers.get("x-admin-token") or ""
+    return hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+
+async def check_and_limit(session_id: str, user_ip: str, user_message: str):
+    """
+    Общие первые этапы для /chat и /ws/chat: оценка заявки и лимиты.
+    Таймауты сессий обрабатывает фоновая задача session_maintenance_loop.
+    Возвращает (LeadScore, retry_after).
+    """
+    dashboard.record_message()
     
-    print(f"\n=== /chat endpoint вызван ===")
-    print(f"👤 Пользователь IP: {user_ip}")
-    print(f"💬 Сообщение: '{user_message}'")
+    # Проверяем, является ли это интересной заявкой (>50,000 руб)
+    with span("check_application") as attrs:
+        score = score_application(user_message)
+        attrs["interesting"] = score.is_interesting
+        attrs["amount"] = score.amount
+        attrs["rule"] = score.rule_id
+    print(f"🔍 Результат проверки заявки: интересная={score.is_interesting}, сумма={score.amount}, "
+          f"правило={score.rule_id}, категория={score.category}")
 
-    # Очищаем старые сессии перед обработкой нового сообщения
-    cleanup_old_sessions()
+    # Лимиты: заявки и LLM-ответы считаются отдельно
+    limiter = lead_limiter if score.is_interesting else llm_limiter
+    with span("rate_limit", limiter=limiter.name) as attrs:
+        if bucket_store.remote:
+            # Сетевой запрос к Redis не должен держать event loop
+            retry_after = await asyncio.to_thread(limiter.check, session=session_id, ip=user_ip)
+        else:
+            retry_after = limiter.check(session=session_id, ip=user_ip)
+        attrs["retry_after"] = retry_after
+
+    return score, retry_after
+
+
+@app.post("/chat", response_model=ChatResponse, responses={429: {"model": RateLimitedResponse}})
+async def chat_endpoint(payload: ChatRequest, request: Request):
+    user_message = payload.message
+    user_ip = request_ip(request)
+    session_id = resolve_session_id(payload.session_id, user_ip)
+    
+    # Повтор уже обработанного сообщения: отдаём тот же ответ, сессию и LLM не трогаем
+    key = replay_key(session_id, payload.message_id)
+    if key:
+        reply = await replay_cache.get_or_begin(key)
+        if reply is not None:
+            print(f"🔁 Повтор сообщения {payload.message_id} (сессия {session_id}): отдаём сохранённый ответ")
+            return {"reply": reply}
+    
+    response = None
+    try:
+        with start_trace("http.chat", session_id=session_id, ip=user_ip, message_length=len(user_message)):
+            response = await process_http_message(session_id, user_ip, user_message)
+        return response
+    finally:
+        if key:
+            reply = response.get("reply") if isinstance(response, dict) else None
+            replay_cache.finish(key, reply if is_replayable(reply) else None)
 
-    # 1. Проверяем, является ли это интересной заявкой (>50,000 руб)
-    is_interesting, amount = check_interesting_application(user_message)
-    print(f"🔍 Результат проверки заявки: интересная={is_interesting}, сумма={amount}")
+
+async def process_http_message(session_id: str, user_ip: str, user_message: str):
+    print(f"\n=== /chat endpoint вызван [{current_request_id()}] ===")
+    print(f"👤 Пользователь IP: {user_ip}, сессия: {session_id}")
+    print(f"💬 Сообщение: '{user_message}'")
+
+    # 1. Оценка заявки и лимиты
+    score, retry_after = await check_and_limit(session_id, user_ip, user_message)
+    if retry_after:
+        return JSONResponse(
+            status_code=429,
+            content={"reply": RATE_LIMITED_REPLY, "retry_after": math.ceil(retry_after)},
+            headers={"Retry-After": str(math.ceil(retry_after))}
+        )
 
     # 2. Если это большая заявка (>50,000 руб)
-    if is_interesting:
-        print(f"🚨 БОЛЬШАЯ ЗАЯВКА! Сумма: {amount} руб.")
-        
-        # Создаем новую сессию или получаем существующую
-        if user_ip not in user_sessions:
-            user_sessions[user_ip] = {
-                'created_at': datetime.now(),
-                'amount': amount,
-                'phone': None,           # Найденный телефон
-                'email': None,           # Найденный email
-                'text_parts': [],        # Все сообщения пользователя в этой сессии
-                'email_sent': False,     # Отправлено ли письмо
-                'incomplete_sent': False,# Отправлено ли неполное письмо (таймаут)
-                'reminder_sent': False,  # Отправлено ли напоминание о втором контакте
-                'message_count': 0       # Количество сообщений в сессии
-            }
-            print(f"🆕 Создана новая сессия для {user_ip}")
-        
-        session = user_sessions[user_ip]
-        session['text_parts'].append(user_message)
-        session['message_count'] += 1
-        full_text = "\n".join(session['text_parts'])
-        
-        # Ищем контакты в текущем сообщении
-        
-        # Телефон: ищем по паттерну (+7, 8, и т.д.)
-        phone_pattern = r'[\+7]?[-\s]?\(?\d{3}\)?[-\s]?\d{3}[-\s]?\d{2}[-\s]?\d{2}'
-        phone_matches = re.findall(phone_pattern, user_message)
-        
-        # Email: ищем стандартный email паттерн
-        email_pattern = r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}'
-        email_matches = re.findall(email_pattern, user_message)
-        
-        # Обновляем найденные контакты
-        if phone_matches and not session['phone']:
-            session['phone'] = phone_matches[0]
-            print(f"📞 Найден телефон в сообщении: {session['phone']}")
-        
-        if email_matches and not session['email']:
-            session['email'] = email_matches[0]
-            print(f"📧 Найден email в сообщении: {session['email']}")
-        
-        # Дополнительная проверка по ключевым словам (если не нашли паттерном)
-        if not session['phone'] and any(word in user_message.lower() for word in ['тел', 'телефон', '+7', '8-9', '89', 'моб', 'сотов']):
-            session['phone'] = "Указан в тексте (не распознан автоматически)"
-            print(f"📞 Телефон указан в тексте")
-        
-        if not session['email'] and '@' in user_message:
-            session['email'] = "Указан в тексте (не распознан автоматически)"
-            print(f"📧 Email указан в тексте")
-        
-        # Логируем текущее состояние сессии
-        print(f"📊 СОСТОЯНИЕ СЕССИИ {user_ip}:")
-        print(f"   📝 Сообщений: {session['message_count']}")
-        print(f"   📞 Телефон: {'✅ ' + str(session['phone']) if session['phone'] else '❌ Нет'}")
-        print(f"   📧 Email: {'✅ ' + str(session['email']) if session['email'] else '❌ Нет'}")
-        print(f"   📨 Полное письмо отправлено: {'✅' if session['email_sent'] and not session.get('incomplete_sent') else '❌'}")
-        print(f"   ⚠️ Неполное письмо отправлено: {'✅' if session.get('incomplete_sent') else '❌'}")
-        print(f"   💡 Напоминание отправлено: {'✅' if session['reminder_sent'] else '❌'}")
-        
-        # ===== ЛОГИКА ОТВЕТА БОТА =====
-        
-        # Случай 1: Письмо уже отправлено (полное или неполное)
-        if session['email_sent']:
-            if session.get('incomplete_sent'):
-                bot_reply = "Заявка передана менеджеру. Мы свяжемся с вами по имеющимся контактам. Спасибо!"
-            else:
-                bot_reply = "Спасибо! Полная заявка передана менеджеру. С вами свяжутся в течение 30 минут."
-        
-        # Случай 2: Есть ОБА контакта - отправляем ПОЛНУЮ заявку
-        elif session['phone'] and session['email']:
-            print(f"📨 ОТПРАВЛЯЕМ ПОЛНУЮ ЗАЯВКУ (есть и телефон, и email)")
-            success = send_application_email(full_text, amount, session['phone'], session['email'])
-            if success:
-                session['email_sent'] = True
-                bot_reply = "Спасибо! Полная заявка передана менеджеру. С вами свяжутся в течение 30 минут."
-            else:
-                bot_reply = "Произошла ошибка при отправке заявки. Пожалуйста, попробуйте еще раз или свяжитесь с нами напрямую."
-        
-        # Случай 3: Есть только ОДИН контакт
-        elif session['phone'] or session['email']:
-            has_phone = bool(session['phone'])
-            has_email = bool(session['email'])
-            
-            # Если это уже не первое сообщение с контактом, отправляем напоминание
-            if not session['reminder_sent'] and session['message_count'] >= 2:
-                if has_phone and not has_email:
-                    bot_reply = f"Спасибо за телефон! Для быстрого оформления заказа на {amount} руб. укажите также email. Это ускорит обработку заявки."
-                elif has_email and not has_phone:
-                    bot_reply = f"Спасибо за email! Для быстрого оформления заказа на {amount} руб. укажите также телефон для связи. Это ускорит обработку заявки."
-                session['reminder_sent'] = True
-                print(f"💡 Отправлено напоминание о втором контакте")
-            
-            else:
-                # Просим недостающий контакт
-                if has_phone and not has_email:
-                    bot_reply = f"Спасибо! Для оформления заказа на {amount} руб. мне также нужен ваш email. Напишите его, пожалуйста."
-                elif has_email and not has_phone:
-                    bot_reply = f"Спасибо! Для оформления заказа на {amount} руб. мне также нужен ваш телефон для связи. Напишите его, пожалуйста."
-                else:
-                    bot_reply = f"Это уже серьёзный заказ ({amount} руб.) — назовите, пожалуйста, телефон и email для связи?"
-        
-        # Случай 4: Нет контактов вообще
-        else:
-            bot_reply = f"Это уже серьёзный заказ ({amount} руб.) — давайте я передам его менеджеру для лучших условий. Назовите, пожалуйста, телефон и email для связи?"
+    if score.is_interesting:
+        print(f"🚨 БОЛЬШАЯ ЗАЯВКА! Сумма: {score.amount} руб.")
+        bot_reply = await handle_lead_message_locked(session_id, user_message, score)
     
     # 3. Если это обычный запрос (не заявка >50,000 руб)
     else:
         print(f"✓ Обычный запрос, сумма меньше 50,000 руб или не указана")
-        if REPLICATE_API_TOKEN:
-            bot_reply = generate_bot_reply(REPLICATE_API_TOKEN, user_message)
+        if llm_backend:
+            # Генерация в потоке, чтобы не блокировать event loop; лишние запросы отбрасываем
+            async with llm_admission.slot() as admitted:
+                if admitted:
+                    bot_reply = await asyncio.to_thread(generate_bot_reply, llm_backend, user_message)
+                else:
+                    bot_reply = OVERLOADED_REPLY
         else:
             bot_reply = "Извините, в данный момент AI-сервис недоступен. Пожалуйста, свяжитесь с нами по телефону."
-            print("⚠️ REPLICATE_API_TOKEN отсутствует, AI-ответы недоступны")
+            print("⚠️ LLM backend не настроен, AI-ответы недоступны")
 
     print(f"🤖 Ответ бота: '{bot_reply[:100]}...'" if len(bot_reply) > 100 else f"🤖 Ответ бота: '{bot_reply}'")
     print("="*40)
@@ -413,7 +724,173 @@ async def chat_endpoint(request: Request):
     return {"reply": bot_reply}
 
 
-@app.api_route("/health", methods=["GET", "HEAD"])
+async def stream_reply_to_websocket(websocket: WebSocket, message: str) -> str:
+    """
+    Стримим ответ модели в WebSocket токен за токеном.
+    Генерация идёт в отдельном потоке и пишет в ограниченную очередь:
+    если клиент читает медленно, очередь заполняется и генерация ждёт.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=WS_STREAM_BUFFER)
+    cancelled = threading.Event()
+    done = object()
+
+    def put(item):
+        # Ждём место в очереди, но не вечно — клиент мог уйти
+        future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+        try:
+            future.result(timeout=WS_SEND_TIMEOUT * 2)
+        except Exception:
+            future.cancel()
+            cancelled.set()
+
+    def produce():
+        try:
+            for chunk in stream_bot_reply(llm_backend, message):
+                if cancelled.is_set():
+                    break
+                put(chunk)
+        except Exception as e:
+            print(f"ДЕБАГ: Ошибка стриминга: {str(e)}")
+            if not cancelled.is_set():
+                put(e)
+        finally:
+            if not cancelled.is_set():
+                put(done)
+
+    # run_in_executor не переносит contextvars сам — копируем контекст для трассировки
+    producer = loop.run_in_executor(None, contextvars.copy_context().run, produce)
+    parts = []
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                return f"Ошибка: {str(item)}"
+            parts.append(item)
+            await asyncio.wait_for(websocket.send_json({"type": "token", "text": item}), WS_SEND_TIMEOUT)
+    finally:
+        cancelled.set()
+        # Освобождаем поток генерации, если он ждёт места в очереди
+        while not queue.empty():
+            queue.get_nowait()
+        await producer
+
+    result = "".join(parts).strip()
+    return result if result else FALLBACK_REPLY
+
+
+async def process_websocket_message(websocket: WebSocket, session_id: str, user_ip: str, user_message: str):
+    """
+    Один ход диалога по WebSocket: та же логика, что и в /chat, но со стримингом.
+    Возвращает итоговый ответ (кадр done отправляет вызывающий) или None при лимите.
+    """
+    print(f"\n=== /ws/chat сообщение [{current_request_id()}] ===")
+    print(f"👤 Сессия: {session_id}")
+    print(f"💬 Сообщение: '{user_message}'")
+
+    await websocket.send_json({"type": "typing"})
+
+    score, retry_after = await check_and_limit(session_id, user_ip, user_message)
+    if retry_after:
+        await websocket.send_json({"type": "error", "error": RATE_LIMITED_REPLY, "retry_after": math.ceil(retry_after)})
+        return None
+
+    if score.is_interesting:
+        print(f"🚨 БОЛЬШАЯ ЗАЯВКА! Сумма: {score.amount} руб.")
+        bot_reply = await handle_lead_message_locked(session_id, user_message, score)
+    elif llm_backend:
+        async with llm_admission.slot() as admitted:
+            if admitted:
+                bot_reply = await stream_reply_to_websocket(websocket, user_message)
+            else:
+                bot_reply = OVERLOADED_REPLY
+    else:
+        bot_reply = "Извините, в данный момент AI-сервис недоступен. Пожалуйста, свяжитесь с нами по телефону."
+        print("⚠️ LLM backend не настроен, AI-ответы недоступны")
+
+    print(f"🤖 Ответ бота: '{bot_reply[:100]}...'" if len(bot_reply) > 100 else f"🤖 Ответ бота: '{bot_reply}'")
+    return bot_reply
+
+
+@app.websocket("/ws/chat")
+async def websocket_chat(websocket: WebSocket):
+    """
+    Постоянный канал для виджета. Протокол (JSON):
+      клиент → {"type": "message", "text": ..., "id": ...} | {"type": "pong"}
+      сервер → session | typing | token | done | ping | error
+    """
+    await websocket.accept()
+    user_ip = request_ip(websocket)
+    session_id = resolve_session_id(websocket.query_params.get("session_id"), uuid.uuid4().hex)
+    await websocket.send_json({"type": "session", "session_id": session_id})
+    print(f"🔌 WebSocket подключен: {session_id}")
+
+    missed_heartbeats = 0
+    try:
+        while True:
+            try:
+                data = await asyncio.wait_for(websocket.receive_json(), WS_HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                if missed_heartbeats >= WS_MAX_MISSED_HEARTBEATS:
+                    print(f"💤 WebSocket {session_id}: нет ответа на ping, закрываем")
+                    await websocket.close(code=1001)
+                    return
+                missed_heartbeats += 1
+                await websocket.send_json({"type": "ping"})
+                continue
+
+            missed_heartbeats = 0
+            if not isinstance(data, dict) or data.get("type") != "message":
+                continue
+
+            try:
+                user_message = ChatRequest(message=str(data.get("text", ""))).message.strip()
+            except ValidationError:
+                await websocket.send_json({"type": "error", "error": MESSAGE_TOO_LONG_REPLY})
+                continue
+            if not user_message:
+                continue
+
+            key = replay_key(session_id, data.get("id"))
+            if key:
+                reply = await replay_cache.get_or_begin(key)
+                if reply is not None:
+                    print(f"🔁 Повтор сообщения {data.get('id')} (сессия {session_id}): отдаём сохранённый ответ")
+                    await asyncio.wait_for(websocket.send_json({"type": "done", "reply": reply}), WS_SEND_TIMEOUT)
+                    continue
+
+            # Сообщения одного соединения обрабатываем строго по очереди
+            bot_reply = None
+            try:
+                with start_trace("ws.chat", session_id=session_id, ip=user_ip, message_length=len(user_message)):
+                    bot_reply = await process_websocket_message(websocket, session_id, user_ip, user_message)
+            finally:
+                # Ответ сохраняем до отправки: если клиент отвалится, ретрай по HTTP получит его
+                if key:
+                    replay_cache.finish(key, bot_reply if is_replayable(bot_reply) else None)
+            if bot_reply is not None:
+                await asyncio.wait_for(websocket.send_json({"type": "done", "reply": bot_reply}), WS_SEND_TIMEOUT)
+
+    except WebSocketDisconnect:
+        print(f"🔌 WebSocket отключен: {session_id}")
+    except asyncio.TimeoutError:
+        print(f"🐢 WebSocket {session_id}: клиент не успевает читать, закрываем")
+        try:
+            await websocket.close(code=1013)
+        except Exception:
+            pass
+    except Exception as e:
+        print(f"❌ Ошибка WebSocket {session_id}: {e}")
+        try:
+            await websocket.send_json({"type": "error", "error": "Внутренняя ошибка. Попробуйте ещё раз."})
+            await websocket.close(code=1011)
+        except Exception:
+            pass
+
+
+@app.api_route("/health", methods=["GET", "HEAD"], response_model=HealthResponse)
 async def health_check(request: Request):
     """Эндпоинт для проверки здоровья, поддерживает GET и HEAD."""
     if request.method == "HEAD":
@@ -421,7 +898,7 @@ async def health_check(request: Request):
     
     # Проверяем доступность внешних сервисов
     services_status = {
-        "replicate_api": bool(REPLICATE_API_TOKEN),
+        "llm_backend": bool(llm_backend),
         "formspree_api": bool(FORMSPREE_URL),
         "email_to": bool(EMAIL_TO)
     }
@@ -434,88 +911,104 @@ async def health_check(request: Request):
         "service": "fortis-chatbot-api",
         "timestamp": datetime.now().isoformat(),
         "sessions_count": len(user_sessions),
+        "worker_id": WORKER_ID,
         "services": services_status,
+        "llm_admission": llm_admission.stats(),
         "environment": os.getenv("ENVIRONMENT", "production"),
         "version": "1.0.0"
     }
 
 
-@app.get("/")
-async def root():
-    """Корневой endpoint с информацией о сервисе."""
-    return {
-        "service": "Fortis Chatbot API",
-        "description": "Чат-бот для сайта Fortis Steel с отправкой заявок на email",
-        "status": "running",
-        "version": "1.0.0",
-        "timestamp": datetime.now().isoformat(),
-        "endpoints": {
-            "chat": {
-                "url": "/chat",
-                "method": "POST",
-                "description": "Основной endpoint для общения с ботом"
-            },
-            "health": {
-                "url": "/health",
-                "method": "GET, HEAD",
-                "description": "Проверка работоспособности сервиса"
-            },
-            "ping": {
-                "url": "/ping",
-                "method": "GET",
-                "description": "Простой пинг для keep-alive"
-            },
-            "debug_sessions": {
-                "url": "/debug/sessions",
-                "method": "GET",
-                "description": "Просмотр активных сессий (только для разработки)"
-            }
+# Ответы / и /ping не меняются, пока процесс жив: сериализуем их один раз при старте
+STARTED_AT = datetime.now().isoformat()
+
+ROOT_PAYLOAD = ServiceInfo(
+    service="Fortis Chatbot API",
+    description="Чат-бот для сайта Fortis Steel с отправкой заявок на email",
+    status="running",
+    version="1.0.0",
+    started_at=STARTED_AT,
+    endpoints={
+        "chat": {
+            "url": "/chat",
+            "method": "POST",
+            "description": "Основной endpoint для общения с ботом"
         },
-        "features": {
-            "ai_provider": "Replicate (Llama 3 70B)" if REPLICATE_API_TOKEN else "Не настроен",
-            "email_provider": "Formspree" if FORMSPREE_URL else "Не настроен",
-            "session_timeout": "10 minutes for incomplete applications",
-            "min_order_amount": "50,000 RUB",
-            "target_email": EMAIL_TO
+        "ws_chat": {
+            "url": "/ws/chat",
+            "method": "WebSocket",
+            "description": "Постоянный канал виджета со стримингом ответа"
         },
-        "environment": os.getenv("ENVIRONMENT", "production")
-    }
+        "health": {
+            "url": "/health",
+            "method": "GET, HEAD",
+            "description": "Проверка работоспособности сервиса"
+        },
+        "ping": {
+            "url": "/ping",
+            "method": "GET",
+            "description": "Простой пинг для keep-alive"
+        },
+        "debug_sessions": {
+            "url": "/debug/sessions",
+            "method": "GET",
+            "description": "Просмотр активных сессий (только для разработки)"
+        }
+    },
+    features={
+        "ai_provider": llm_backend.describe() if llm_backend else "Не настроен",
+        "email_provider": "Formspree" if FORMSPREE_URL else "Не настроен",
+        "session_timeout": "10 minutes for incomplete applications",
+        "min_order_amount": "50,000 RUB",
+        "target_email": EMAIL_TO
+    },
+    environment=os.getenv("ENVIRONMENT", "production")
+).model_dump_json().encode()
+
+PING_PAYLOAD = PingResponse(
+    status="pong",
+    service="fortis-chatbot",
+    message="Server is alive and responding",
+    started_at=STARTED_AT
+).model_dump_json().encode()
+
+
+@app.get("/", response_class=Response, responses={200: {"model": ServiceInfo}})
+async def root():
+    """Корневой endpoint с информацией о сервисе."""
+    return Response(content=ROOT_PAYLOAD, media_type="application/json")
 
 
-@app.get("/ping")
+@app.get("/ping", response_class=Response, responses={200: {"model": PingResponse}})
 async def ping():
     """Простой endpoint для пинга сервера (используется для keep-alive)."""
-    return {
-        "status": "pong",
-        "timestamp": datetime.now().isoformat(),
-        "service": "fortis-chatbot",
-        "message": "Server is alive and responding"
-    }
+    return Response(content=PING_PAYLOAD, media_type="application/json")
 
 
-@app.get("/debug/sessions")
+@app.get("/debug/sessions", response_model=DebugSessionsResponse)
 async def debug_sessions():
     """Отладочный эндпоинт для просмотра активных сессий (только для разработки)."""
     # Проверяем режим - только для разработки
     if os.getenv("ENVIRONMENT", "production").lower() == "production":
-        return {"error": "Доступ запрещен в production режиме"}
+        return JSONResponse(content={"error": "Доступ запрещен в production режиме"})
     
     now = datetime.now()
     active_sessions = {}
     
-    for session_id, session_data in user_sessions.items():
-        session_age = now - session_data['created_at']
+    for session_id, session_data in list(user_sessions.items()):
+        session_age = now - session_data.created_at
         active_sessions[session_id] = {
             "age_seconds": session_age.total_seconds(),
             "age_minutes": round(session_age.total_seconds() / 60, 1),
-            "amount": session_data['amount'],
-            "phone": session_data['phone'],
-            "email": session_data['email'],
-            "message_count": session_data['message_count'],
-            "email_sent": session_data['email_sent'],
-            "incomplete_sent": session_data.get('incomplete_sent', False),
-            "timeout_reason": session_data.get('timeout_reason'),
-            "text_parts": session_data['text_parts'][-3:]  # Последние 3 сообщения
+            "amount": session_data.amount,
+            "score": session_data.score.to_dict() if session_data.score else None,
+            "phone": session_data.phone,
+            "email": session_data.email,
+            "message_count": session_data.message_count,
+            "email_sent": session_data.email_sent,
+            "incomplete_sent": session_data.incomplete_sent,
+            "timeout_reason": session_data.timeout_reason,
+            "text_parts": session_data.transcript.last(3)  # Последние 3 сообщения
         }
     
     return {
@@ -526,19 +1019,99 @@ async def debug_sessions():
     }
 
 
-@app.get("/test/email")
+@app.get("/debug/traces", response_model=DebugTracesResponse)
+async def debug_traces(request: Request, limit: int = 50, session_id: str = None):
+    """
+    Последние трассы запросов из кольцевого буфера.
+    С session_id — таймлайн одного разговора. Требует ADMIN_TOKEN.
+    """
+    if not is_admin_request(request):
+        return JSONResponse(status_code=403, content={"error": "Доступ запрещен"})
+    
+    traces = trace_recorder.recent(limit=max(1, min(limit, 500)), session_id=session_id)
+    return {
+        "count": len(traces),
+        "traces": traces
+    }
+
+
+@app.get("/admin/stats", response_model=AdminStatsResponse)
+async def admin_stats(request: Request):
+    """
+    Сводка для менеджеров и дежурных: заявки по часам, распределение сумм,
+    квантили задержки LLM, попадания в кеш, сессии. Требует ADMIN_TOKEN.
+    Все агрегаты ведутся инкрементально, чтение не зависит от объёма трафика.
+    """
+    if not is_admin_request(request):
+        return JSONResponse(status_code=403, content={"error": "Доступ запрещен"})
+    
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "worker_id": WORKER_ID,
+        "sessions_active": len(user_sessions),
+        "llm_admission": llm_admission.stats(),
+        **dashboard.snapshot(),
+    }
+
+
+@app.get("/admin/profile")
+async def admin_profile(request: Request, seconds: float = Query(10, ge=1), mode: str = "sample",
+                        interval_ms: float = Query(5, gt=0)):
+    """
+    Профилирование работающего сервиса на seconds секунд (от 1 до 60). Требует ADMIN_TOKEN.
+    mode=sample — сэмплирование стеков всех потоков, файл collapsed stacks
+    для flamegraph.pl / speedscope; mode=cprofile — cProfile потока event loop (pstats).
+    Одновременно идёт только одна сессия профилирования.
+    """
+    if not is_admin_request(request):
+        return JSONResponse(status_code=403, content={"error": "Доступ запрещен"})
+    if mode not in ("sample", "cprofile"):
+        return JSONResponse(status_code=400, content={"error": "mode: sample или cprofile"})
+    
+    print(f"🔬 Профилирование ({mode}) на {seconds} с")
+    try:
+        if mode == "sample":
+            report = await asyncio.to_thread(sample_stacks, seconds, interval_ms / 1000)
+        else:
+            report = await profile_event_loop(seconds)
+    except ProfilerBusy as e:
+        return JSONResponse(status_code=409, content={"error": str(e)})
+    
+    filename = f"profile-{datetime.now():%Y%m%d-%H%M%S}.{'folded' if mode == 'sample' else 'txt'}"
+    return PlainTextResponse(report, headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+
+@app.get("/admin/loop-lag", response_model=LoopLagResponse)
+async def admin_loop_lag(request: Request, enabled: bool = None, threshold_ms: float = None):
+    """
+    Задержки event loop и последние зависания со стеком. Требует ADMIN_TOKEN.
+    ?enabled=true|false включает/выключает монитор, ?threshold_ms= меняет порог.
+    """
+    if not is_admin_request(request):
+        return JSONResponse(status_code=403, content={"error": "Доступ запрещен"})
+    
+    if threshold_ms is not None:
+        loop_monitor.threshold_ms = max(threshold_ms, 10)
+    if enabled is True:
+        loop_monitor.start()
+    elif enabled is False:
+        loop_monitor.stop()
+    return loop_monitor.report()
+
+
+@app.get("/test/email", response_model=EmailTestResponse)
 async def test_email():
     """Тестовый endpoint для проверки отправки email (только для разработки)."""
     # Проверяем режим - только для разработки
     if os.getenv("ENVIRONMENT", "production").lower() == "production":
-        return {"error": "Доступ запрещен в production режиме"}
+        return JSONResponse(content={"error": "Доступ запрещен в production режиме"})
     
     # Проверяем наличие API ключей
     if not FORMSPREE_URL:
-        return {
+        return JSONResponse(content={
             "status": "error",
             "error": "FORMSPREE_URL не настроен"
-        }
+        })
     
     test_amount = 75000
     test_phone = "+79161234567"
@@ -566,11 +1139,24 @@ async def test_email():
         }
         
     except Exception as e:
-        return {
+        return JSONResponse(content={
             "status": "error",
             "error": str(e),
             "formspree_url_set": bool(FORMSPREE_URL)
-        }
+        })
+
+
+# Невалидное тело /chat (например, слишком длинное сообщение) — ответ в формате чата,
+# чтобы виджет показал его как реплику бота. Остальные эндпоинты — стандартный 422 FastAPI.
+@app.exception_handler(RequestValidationError)
+async def validation_error_handler(request: Request, exc: RequestValidationError):
+    if request.url.path != "/chat":
+        return await request_validation_exception_handler(request, exc)
+    errors = exc.errors()
+    print(f"🚫 Невалидный запрос к {request.url.path}: {len(errors)} ошибок")
+    too_long = any("long" in str(e.get("type", "")) or "max_length" in str(e.get("type", "")) for e in errors)
+    reply = MESSAGE_TOO_LONG_REPLY if too_long else INVALID_MESSAGE_REPLY
+    return JSONResponse(status_code=422, content={"reply": reply, "error": "validation_error"})
 
 
 # Обработчик ошибок 404
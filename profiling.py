@@ -0,0 +1,167 @@
+import io
+import os
+import sys
+import time
+import pstats
+import asyncio
+import cProfile
+import threading
+from collections import Counter, deque
+from datetime import datetime
+
+from stats import LatencySketch
+
+PROFILE_MAX_SECONDS = 60
+PROFILE_MIN_INTERVAL = 0.001     # не чаще 1000 выборок в секунду
+MAX_STACK_DEPTH = 128
+
+LOOP_LAG_MONITOR = os.getenv("LOOP_LAG_MONITOR", "false").lower() in ("1", "true", "yes")
+LOOP_LAG_THRESHOLD_MS = float(os.getenv("LOOP_LAG_THRESHOLD_MS", "250"))
+
+
+class ProfilerBusy(RuntimeError):
+    """Профилирование уже идёт — одновременно допускается только одно."""
+
+
+# Одна сессия профилирования за раз, какого бы вида она ни была
+_profile_lock = threading.Lock()
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _stack(frame) -> list:
+    """Стек от корня к листу."""
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    names.reverse()
+    return names
+
+
+def sample_stacks(seconds: float, interval: float = 0.005) -> str:
+    """
+    Сэмплирующий профайлер: каждые interval секунд снимаем стеки всех потоков
+    (sys._current_frames), сам код не инструментируется — накладные расходы
+    только на снятие стеков, поэтому можно включать под нагрузкой.
+    Результат — collapsed stacks ("поток;f1;f2 N") для flamegraph.pl / speedscope.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusy("Профилирование уже идёт")
+    try:
+        seconds = min(seconds, PROFILE_MAX_SECONDS)
+        interval = max(interval, PROFILE_MIN_INTERVAL)
+        own = threading.get_ident()
+        stacks = Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    stacks[";".join([names.get(ident, str(ident)), *_stack(frame)])] += 1
+            time.sleep(interval)
+        return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()) + "\n"
+    finally:
+        _profile_lock.release()
+
+
+async def profile_event_loop(seconds: float, limit: int = 60) -> str:
+    """
+    cProfile потока event loop на seconds секунд: все обработчики запросов,
+    которые выполнятся за это время. Отчёт pstats по cumulative time.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusy("Профилирование уже идёт")
+    try:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            await asyncio.sleep(min(seconds, PROFILE_MAX_SECONDS))
+        finally:
+            profiler.disable()
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(limit)
+        return out.getvalue()
+    finally:
+        _profile_lock.release()
+
+
+class LoopLagMonitor:
+    """
+    Монитор задержек event loop.
+    В loop крутится короткий heartbeat (asyncio.sleep(interval)), его опоздание
+    и есть задержка цикла. Отдельный поток-сторож замечает, что heartbeat
+    давно не отмечался, и снимает стек потока loop прямо во время зависания —
+    видно, какой синхронный вызов (requests.post, client.run, тяжёлый regex) его держит.
+    """
+
+    def __init__(self, interval: float = 0.05, threshold_ms: float = LOOP_LAG_THRESHOLD_MS, keep: int = 50):
+        self.interval = interval
+        self.threshold_ms = threshold_ms
+        self.stalls = deque(maxlen=keep)
+        self.lag_ms = LatencySketch(min_value=0.1)
+        self.enabled = False
+        self._last_beat = time.monotonic()
+        self._loop_thread = None
+        self._task = None
+        self._generation = 0  # чтобы сторож от прошлого start() не работал вместе с новым
+
+    def start(self):
+        """Вызывается из event loop."""
+        if self.enabled:
+            return
+        self.enabled = True
+        self._generation += 1
+        self._loop_thread = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._task = asyncio.get_running_loop().create_task(self._beat())
+        threading.Thread(target=self._watch, args=(self._generation,), name="loop-lag-watchdog", daemon=True).start()
+        print(f"🩺 Монитор задержек event loop включён (порог {self.threshold_ms:.0f} мс)")
+
+    def stop(self):
+        self.enabled = False
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        print("🩺 Монитор задержек event loop выключен")
+
+    async def _beat(self):
+        while self.enabled:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._last_beat = now
+            self.lag_ms.add(max(now - expected, 0) * 1000)
+
+    def _watch(self, generation: int):
+        stall = None
+        while self.enabled and generation == self._generation:
+            time.sleep(self.interval)
+            behind_ms = (time.monotonic() - self._last_beat - self.interval) * 1000
+            if behind_ms < self.threshold_ms:
+                stall = None
+                continue
+            if stall is None:
+                # Снимаем стек один раз, в начале зависания
+                frame = sys._current_frames().get(self._loop_thread)
+                stall = {
+                    "started_at": datetime.now().isoformat(),
+                    "stack": _stack(frame) if frame else [],
+                }
+                self.stalls.append(stall)
+                print(f"🐌 Event loop завис (> {self.threshold_ms:.0f} мс): {stall['stack'][-1] if stall['stack'] else '?'}")
+            stall["lag_ms"] = round(behind_ms)
+
+    def report(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "threshold_ms": self.threshold_ms,
+            "lag_ms": self.lag_ms.summary(),
+            "stalls": list(reversed(self.stalls)),
+        }
+
+
+loop_monitor = LoopLagMonitor()
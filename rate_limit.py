@@ -0,0 +1,178 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+try:
+    import redis  # Необязательная зависимость: общий backend для нескольких инстансов
+except ImportError:
+    redis = None
+
+# Сколько прокси перед сервисом дописывают X-Forwarded-For (на Render — один).
+# 0 — заголовку не доверяем, IP берём из соединения.
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "1"))
+# Сколько ждём Redis, прежде чем пропустить запрос без проверки лимита
+RATE_LIMIT_REDIS_TIMEOUT = float(os.getenv("RATE_LIMIT_REDIS_TIMEOUT", "0.25"))
+
+
+def parse_limit(value: str, default: str):
+    """
+    Разбираем лимит вида "10/60" → (10 запросов, за 60 секунд).
+    При ошибке формата используем значение по умолчанию.
+    """
+    for candidate in (value, default):
+        try:
+            count, period = (candidate or "").split("/")
+            count, period = int(count), float(period)
+            if count > 0 and period > 0:
+                return count, period
+        except ValueError:
+            continue
+    raise ValueError(f"Неверный формат лимита: {value!r}")
+
+
+def client_ip(forwarded: str, peer: str, hops: int = TRUSTED_PROXY_HOPS) -> str:
+    """
+    IP посетителя для лимитов и маршрутизации.
+    Прокси дописывает адрес, с которого к нему пришли, в конец X-Forwarded-For,
+    а левые записи присылает сам клиент и может менять на каждый запрос.
+    Поэтому отсчитываем hops записей с конца, а не берём первую.
+    """
+    if forwarded and hops > 0:
+        entries = [entry.strip() for entry in forwarded.split(",") if entry.strip()]
+        if entries:
+            return entries[-min(hops, len(entries))]
+    return peer
+
+
+class InMemoryBucketStore:
+    """
+    Token bucket в памяти процесса.
+    Ведра хранятся в LRU (OrderedDict), поэтому память ограничена max_keys:
+    при переполнении вытесняются давно не использованные ключи.
+    Проверка — O(1): пополнение считается лениво по прошедшему времени.
+    """
+
+    remote = False  # проверка не ходит в сеть, можно звать прямо из event loop
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> [tokens, last_refill]
+        self._lock = threading.Lock()
+
+    def take(self, key: str, capacity: int, refill_rate: float, cost: float = 1.0) -> float:
+        """
+        Пытаемся забрать cost токенов из ведра key.
+        Возвращает 0, если можно, иначе сколько секунд ждать.
+        """
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = [float(capacity), now]
+                self._buckets[key] = bucket
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * refill_rate)
+                bucket[1] = now
+
+            if bucket[0] >= cost:
+                bucket[0] -= cost
+                return 0.0
+            return (cost - bucket[0]) / refill_rate
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class RedisBucketStore:
+    """
+    Token bucket в Redis для нескольких инстансов сервиса.
+    Атомарность обеспечивает Lua-скрипт; неактивные ключи истекают сами.
+    Каждая проверка — сетевой запрос, поэтому вызывается из рабочего потока.
+    """
+
+    remote = True
+
+    SCRIPT = """
+local tokens = tonumber(redis.call('HGET', KEYS[1], 't'))
+local last = tonumber(redis.call('HGET', KEYS[1], 'ts'))
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local now = tonumber(ARGV[4])
+if tokens == nil then
+  tokens = capacity
+else
+  tokens = math.min(capacity, tokens + (now - last) * rate)
+end
+local wait = 0
+if tokens >= cost then
+  tokens = tokens - cost
+else
+  wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 't', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+    def __init__(self, url: str, prefix: str = "fortis:rl:"):
+        if redis is None:
+            raise RuntimeError("Для RATE_LIMIT_REDIS_URL нужен пакет redis")
+        self.client = redis.Redis.from_url(
+            url, socket_timeout=RATE_LIMIT_REDIS_TIMEOUT, socket_connect_timeout=RATE_LIMIT_REDIS_TIMEOUT)
+        self.prefix = prefix
+        self._script = self.client.register_script(self.SCRIPT)
+
+    def take(self, key: str, capacity: int, refill_rate: float, cost: float = 1.0) -> float:
+        wait = self._script(keys=[self.prefix + key], args=[capacity, refill_rate, cost, time.time()])
+        return float(wait)
+
+
+class RateLimiter:
+    """
+    Именованный лимит (например, "llm" или "lead") поверх общего хранилища ведер.
+    limits: {"session": (10, 60), "ip": (30, 60)} — отдельное ведро на каждый вид ключа.
+    """
+
+    def __init__(self, name: str, limits: dict, store):
+        self.name = name
+        self.limits = {kind: (capacity, capacity / period) for kind, (capacity, period) in limits.items()}
+        self.store = store
+
+    def check(self, **keys) -> float:
+        """
+        Проверяем все ключи (session=..., ip=...).
+        Возвращает 0, если запрос разрешён, иначе Retry-After в секундах.
+        Если хранилище недоступно (Redis упал), запрос пропускаем:
+        лимит — защита от злоупотреблений, а не причина отвечать 500.
+        """
+        for kind, value in keys.items():
+            if not value or kind not in self.limits:
+                continue
+            capacity, refill_rate = self.limits[kind]
+            try:
+                wait = self.store.take(f"{self.name}:{kind}:{value}", capacity, refill_rate)
+            except Exception as e:
+                print(f"⚠️ Лимит '{self.name}' не проверен, хранилище недоступно: {e}")
+                return 0.0
+            if wait > 0:
+                print(f"🚦 Лимит '{self.name}' для {kind}={value}: ждать {wait:.1f} с")
+                return wait
+        return 0.0
+
+
+def create_bucket_store():
+    """Выбираем backend: Redis, если задан RATE_LIMIT_REDIS_URL, иначе память процесса."""
+    redis_url = os.getenv("RATE_LIMIT_REDIS_URL")
+    if redis_url:
+        try:
+            store = RedisBucketStore(redis_url)
+            print("🚦 Rate limit: Redis backend")
+            return store
+        except Exception as e:
+            print(f"⚠️ Rate limit: Redis недоступен ({e}), используем память процесса")
+    return InMemoryBucketStore(max_keys=int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000")))
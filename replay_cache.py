@@ -0,0 +1,85 @@
+import os
+import time
+import asyncio
+from collections import OrderedDict
+
+from stats import dashboard
+
+REPLAY_CACHE_SIZE = int(os.getenv("REPLAY_CACHE_SIZE", "10000"))
+REPLAY_CACHE_TTL = float(os.getenv("REPLAY_CACHE_TTL", "600"))  # секунд
+
+
+class ReplayCache:
+    """
+    Кеш последних ответов по ключу "сессия:id сообщения" (LRU + TTL).
+    Повтор того же сообщения (двойной Enter, ретрай с мобильного)
+    получает сохранённый ответ и не трогает ни LLM, ни сессию.
+    Если первый экземпляр ещё обрабатывается, дубль ждёт его ответа.
+    Работает в event loop, блокировки не нужны.
+    """
+
+    def __init__(self, max_entries: int = REPLAY_CACHE_SIZE, ttl: float = REPLAY_CACHE_TTL,
+                 clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock  # в тестах подменяем, чтобы проверять TTL без sleep
+        self._entries = OrderedDict()  # ключ → (ответ, когда истекает)
+        self._inflight = {}            # ключ → Future с ответом
+
+    def _get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        reply, expires_at = entry
+        if expires_at < self._clock():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return reply
+
+    def _put(self, key: str, reply: str):
+        self._entries[key] = (reply, self._clock() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_begin(self, key: str):
+        """
+        Готовый ответ (в том числе дождавшись дубля, который уже в работе)
+        или None — тогда сообщение обрабатывает вызывающий и потом вызывает finish().
+        """
+        while True:
+            reply = self._get(key)
+            if reply is not None:
+                dashboard.record_cache("chat_replay", True)
+                return reply
+
+            future = self._inflight.get(key)
+            if future is None:
+                self._inflight[key] = asyncio.get_running_loop().create_future()
+                dashboard.record_cache("chat_replay", False)
+                return None
+
+            reply = await asyncio.shield(future)
+            if reply is not None:
+                dashboard.record_cache("chat_replay", True)
+                return reply
+            # Первый экземпляр ответа не получил (лимит, ошибка) — пробуем сами
+
+    def finish(self, key: str, reply: str = None):
+        """Сохраняем ответ (None — не сохранять) и будим ждущие дубли."""
+        future = self._inflight.pop(key, None)
+        if reply is not None:
+            self._put(key, reply)
+        if future is not None and not future.done():
+            future.set_result(reply)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def replay_key(session_id: str, message_id) -> str:
+    """Ключ кеша или None, если клиент не прислал id сообщения."""
+    if isinstance(message_id, str) and 0 < len(message_id) <= 64:
+        return f"{session_id}:{message_id}"
+    return None
@@ -0,0 +1,247 @@
+import re
+from bisect import bisect_left, bisect_right
+from operator import itemgetter
+
+# Числительные прописью → (значение, разряд). Разряд нужен, чтобы понять,
+# где кончается одно число: "двести пятьдесят" — одно, "пять пять" — два.
+_SMALL_WORDS = {}
+for _value, _forms in {
+    0: ("ноль", "нуль"),
+    1: ("один", "одна", "одну", "одно"),
+    2: ("два", "две"),
+    3: ("три",),
+    4: ("четыре",),
+    5: ("пять",),
+    6: ("шесть",),
+    7: ("семь",),
+    8: ("восемь",),
+    9: ("девять",),
+}.items():
+    for _form in _forms:
+        _SMALL_WORDS[_form] = (_value, 1)
+for _value, _form in enumerate(("десять", "одиннадцать", "двенадцать", "тринадцать", "четырнадцать",
+                                "пятнадцать", "шестнадцать", "семнадцать", "восемнадцать", "девятнадцать"), 10):
+    _SMALL_WORDS[_form] = (_value, 2)
+for _value, _form in zip(range(20, 100, 10), ("двадцать", "тридцать", "сорок", "пятьдесят",
+                                              "шестьдесят", "семьдесят", "восемьдесят", "девяносто")):
+    _SMALL_WORDS[_form] = (_value, 2)
+for _value, _form in zip(range(100, 1000, 100), ("сто", "двести", "триста", "четыреста", "пятьсот",
+                                                 "шестьсот", "семьсот", "восемьсот", "девятьсот")):
+    _SMALL_WORDS[_form] = (_value, 3)
+_SMALL_WORDS["полтора"] = (1.5, 1)
+_SMALL_WORDS["полторы"] = (1.5, 1)
+
+# Множители: полные формы и сокращения
+_SCALE_WORDS = {}
+for _form in ("тыс", "тыщ", "тысяча", "тысячи", "тысяч", "тысячу", "тысячей"):
+    _SCALE_WORDS[_form] = 1_000
+for _form in ("млн", "миллион", "миллиона", "миллионов", "лям", "ляма", "лямов"):
+    _SCALE_WORDS[_form] = 1_000_000
+for _form in ("млрд", "миллиард", "миллиарда", "миллиардов"):
+    _SCALE_WORDS[_form] = 1_000_000_000
+
+# Сгруппированные цифры: разделитель тысяч — пробел, либо точка/запятая,
+# если групп хотя бы две ("1.000" без второй группы — это дробь).
+# После групп может идти копеечная часть: "150 000,50", "1.000.000,50".
+# Группы через пробел склеиваем только перед деньгами или множителем:
+# иначе "уголок 100 100 шт" и "3 500 шт" читались как 100100 и 3500 штук
+_MONEY_AFTER = r"(?=[ \u00a0]*(?:руб|р(?![а-яё])|₽|тыс|тыщ|млн|млрд|милли|лям))"
+_GROUPED = (
+    r"\d{1,3}(?:[ \u00a0]\d{3})+(?:[.,]\d{1,2})?" + _MONEY_AFTER +   # 100 000 руб, 150 000,50 руб
+    r"|\d{1,3}(?:\.\d{3}){2,}(?:,\d{1,2})?"          # 1.000.000
+    r"|\d{1,3}(?:\.\d{3}){2,}(?:,\d{1,2})?"          # 1.000.000
+    r"|\d{1,3}(?:,\d{3}){2,}(?:\.\d{1,2})?"          # 1,000,000
+)
+def _word_pattern(words) -> str:
+    """
+    Слова одной регуляркой в виде префиксного дерева: "д(?:в(?:а|е)|...)".
+    Плоский список "два|две|двести|..." движок перебирает целиком в каждой
+    позиции текста, дерево отсекает неподходящие ветки по первой букве.
+    """
+    branches = {}
+    has_end = False
+    for word in words:
+        if word:
+            branches.setdefault(word[0], []).append(word[1:])
+        else:
+            has_end = True
+    if not branches:
+        return ""
+    alternatives = [re.escape(char) + _word_pattern(rest) for char, rest in sorted(branches.items())]
+    pattern = alternatives[0] if len(alternatives) == 1 else "(?:" + "|".join(alternatives) + ")"
+    return "(?:" + pattern + ")?" if has_end else pattern
+
+
+_WORD_ALTERNATION = _word_pattern(list(_SMALL_WORDS) + list(_SCALE_WORDS))
+# Один токен числа: сгруппированные цифры, десятичная дробь,
+# целое или слово из таблиц выше
+_TOKEN = (
+    r"(?:(?:" + _GROUPED + r")(?![\d.,]\d)"
+    r"|\d{1,12}[.,]\d{1,3}(?![\d.,]\d)"           # 1,5 / 2.5
+    r"|\d{1,12}(?![\d.,]\d)"                       # 50000
+    r"|(?:" + _WORD_ALTERNATION + r")\b)"          # сто, полтора, тыс, млн
+)
+# Цепочка токенов через пробелы: "двести пятьдесят тысяч", "1,5 млн", "50 тыс"
+_RUN_RE = re.compile(r"(?<![\w.,])" + _TOKEN + r"(?:[ \u00a0]+" + _TOKEN + r")*")
+# Токены цепочки разбираем тем же шаблоном по исходному тексту: проверка
+# "дальше идут деньги" для групп через пробел смотрит за конец цепочки
+_NEXT_TOKEN_RE = re.compile(r"[ \u00a0]*(" + _TOKEN + r")")
+
+
+def _format(value: float, kind: str) -> str:
+    """
+    Каноническая запись числа для каскада шаблонов:
+    - с множителем → "N тыс" (шаблон ×1000), неровные тысячи — с дробью:
+      "49.5 тыс", "1.2 тыс" (без округления, иначе 49 500 превращалось
+      в 50 000 и проходило порог заявки);
+    - сгруппированные цифры ("1 000 000") → целое "1000000": сумму в рублях
+      разбирает шаблон рублей, а не тысяч;
+    - дробные количества → "2.5";
+    - деньги с копейками (целая часть от 4 цифр) → только целая часть.
+    """
+    if kind == "scaled":
+        thousands, rest = divmod(int(round(value)), 1000)
+        if rest:
+            return f"{thousands}.{rest:03d}".rstrip("0") + " тыс"
+        return f"{thousands} тыс"
+    if value != int(value):
+        if value >= 1000:
+            return str(int(value))
+        return f"{value:g}"
+    return str(int(value))
+
+
+def _group_separator(token: str):
+    """Разделитель тысяч в цифровом токене или None, если токен не сгруппирован."""
+    if " " in token or "\u00a0" in token:
+        return " "
+    if token.count(".") > 1:
+        return "."
+    if token.count(",") > 1:
+        return ","
+    return None
+
+
+def _parse_run(tokens: list) -> str:
+    """Разбираем цепочку токенов на одно или несколько чисел."""
+    numbers = []
+    total = 0          # уже набранное с множителями
+    current = 0        # текущая группа до множителя
+    last_rank = 99     # разряд последнего слова (для проверки порядка)
+    kind = None        # raw | grouped | decimal | words | scaled
+    raw_text = None
+
+    def flush():
+        nonlocal total, current, last_rank, kind, raw_text
+        if kind is not None:
+            if kind == "raw":
+                numbers.append(raw_text)
+            else:
+                numbers.append(_format(total + current, kind))
+        total, current, last_rank, kind, raw_text = 0, 0, 99, None, None
+
+    for token in tokens:
+        scale = _SCALE_WORDS.get(token)
+        if scale is not None:
+            if kind is None:
+                # "тысяча" без числа перед ней
+                current, kind = 1, "words"
+            if total and scale * max(current, 1) >= total:
+                # "тысяча миллион" — не составное число
+                flush()
+                current, kind = 1, "words"
+            total += (current or 1) * scale
+            current, last_rank, kind = 0, 4, "scaled"
+            continue
+
+        small = _SMALL_WORDS.get(token)
+        if small is not None:
+            value, rank = small
+            if kind in ("raw", "grouped", "decimal") or (kind is not None and rank >= last_rank):
+                flush()
+            current += value
+            last_rank = rank
+            if kind != "scaled":
+                kind = "words"
+            continue
+
+        # Цифровой токен всегда начинает новое число
+        flush()
+        separator = _group_separator(token)
+        if separator:
+            digits = token.replace("\u00a0", " ").replace(separator, "")
+            current = float(digits.replace(",", ".")) if not digits.isdigit() else int(digits)
+            kind = "grouped"
+        elif "." in token or "," in token:
+            current, kind = float(token.replace(",", ".")), "decimal"
+        else:
+            current, kind, raw_text = int(token), "raw", token
+        last_rank = 0
+
+    flush()
+    return " ".join(numbers)
+
+
+def _replace(match) -> str:
+    run = match.group(0)
+    # Быстрый путь: одиночное целое оставляем как есть
+    if run.isdigit():
+        return run
+    text, position, end = match.string, match.start(), match.end()
+    tokens = []
+    while position < end:
+        token = _NEXT_TOKEN_RE.match(text, position)
+        tokens.append(token.group(1))
+        position = token.end()
+    return _parse_run(tokens)
+
+
+def sub_tracked(pattern, replace, text: str, anchors: list) -> str:
+    """
+    pattern.sub(replace, text) с записью каждой замены в anchors:
+    (начало, конец) в результате и (начало, конец) в исходном тексте.
+    По ним original_position() переводит позиции обратно.
+    """
+    shift = 0
+
+    def tracked(match):
+        nonlocal shift
+        out = replace(match)
+        start, end = match.span()
+        if out != match.group(0):
+            anchors.append((start + shift, start + shift + len(out), start, end))
+            shift += len(out) - (end - start)
+        return out
+
+    return pattern.sub(tracked, text)
+
+
+def original_position(anchors: list, position: int, is_end: bool = False) -> int:
+    """
+    Позиция в тексте до замен по позиции после них. Граница внутри замены
+    растягивается до всей заменённой части: начало — к её началу, конец — к концу.
+    """
+    if is_end:
+        index = bisect_left(anchors, position, key=itemgetter(0)) - 1
+    else:
+        index = bisect_right(anchors, position, key=itemgetter(0)) - 1
+    if index < 0:
+        return position
+    out_start, out_end, in_start, in_end = anchors[index]
+    if position < out_end or (is_end and position == out_end):
+        return in_end if is_end else in_start
+    return position + in_end - out_end
+
+
+def normalize_numbers(text: str, anchors: list = None) -> str:
+    """
+    Приводим числа в тексте (в нижнем регистре) к виду, понятному каскаду шаблонов:
+    "полтора миллиона" → "1500 тыс", "сто тысяч" → "100 тыс", "1,5 млн" → "1500 тыс",
+    "100 000 руб" → "100000 руб", "150 000,50 руб" → "150000 руб",
+    "1.000.000 руб" → "1000 тыс руб", "2,5 тонны" → "2.5 тонны".
+    Один проход регулярного выражения по тексту с разбором по готовым таблицам.
+    Если передан anchors, туда записываются замены (см. sub_tracked).
+    """
+    if anchors is None:
+        return _RUN_RE.sub(_replace, text)
+    return sub_tracked(_RUN_RE, _replace, text, anchors)
@@ -0,0 +1,208 @@
+import os
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+# Максимальная длина одного сообщения посетителя (символов)
+MAX_MESSAGE_CHARS = int(os.getenv("MAX_MESSAGE_CHARS", "2000"))
+# Верхняя граница тела запроса: UTF-8 до 4 байт на символ + служебные поля
+MAX_REQUEST_BYTES = MAX_MESSAGE_CHARS * 4 + 1024
+
+
+class ChatRequest(BaseModel):
+    """Тело запроса /chat (и сообщения /ws/chat)."""
+
+    message: str = Field("", max_length=MAX_MESSAGE_CHARS)
+    session_id: Optional[str] = Field(None, max_length=64)
+    # id сообщения от виджета: повтор с тем же id получает сохранённый ответ
+    message_id: Optional[str] = Field(None, max_length=64)
+
+
+# ===== Модели ответов =====
+
+class ChatResponse(BaseModel):
+    """Ответ /chat."""
+
+    reply: str
+
+
+class RateLimitedResponse(BaseModel):
+    """Ответ /chat с кодом 429."""
+
+    reply: str
+    retry_after: int
+
+
+class AdmissionStats(BaseModel):
+    active: int
+    queued: int
+    max_concurrent: int
+    max_queue: int
+    queue_timeout_seconds: float
+    admitted: int
+    shed_queue_full: int
+    shed_timeout: int
+    max_queued_seen: int
+
+
+class HealthResponse(BaseModel):
+    status: str
+    service: str
+    timestamp: str
+    sessions_count: int
+    worker_id: Optional[str] = None
+    services: Dict[str, bool]
+    llm_admission: AdmissionStats
+    environment: str
+    version: str
+
+
+class EndpointInfo(BaseModel):
+    url: str
+    method: str
+    description: str
+
+
+class ServiceInfo(BaseModel):
+    """Ответ / — собирается один раз при старте."""
+
+    service: str
+    description: str
+    status: str
+    version: str
+    started_at: str
+    endpoints: Dict[str, EndpointInfo]
+    features: Dict[str, str]
+    environment: str
+
+
+class PingResponse(BaseModel):
+    status: str
+    service: str
+    message: str
+    started_at: str
+
+
+class SessionInfo(BaseModel):
+    age_seconds: float
+    age_minutes: float
+    amount: int
+    score: Optional[Dict[str, Any]] = None
+    phone: Optional[str] = None
+    email: Optional[str] = None
+    message_count: int
+    email_sent: bool
+    incomplete_sent: bool
+    timeout_reason: Optional[str] = None
+    text_parts: List[str]
+
+
+class DebugSessionsResponse(BaseModel):
+    active_sessions_count: int
+    current_time: str
+    environment: str
+    sessions: Dict[str, SessionInfo]
+
+
+class LatencySummary(BaseModel):
+    """Сводка LatencySketch (мс); без наблюдений всё, кроме count, — null."""
+
+    count: int
+    avg: Optional[float] = None
+    p50: Optional[float] = None
+    p90: Optional[float] = None
+    p99: Optional[float] = None
+    max: Optional[float] = None
+
+
+class LeadStats(BaseModel):
+    last_hour: int
+    last_hour_amount: int
+    last_24h: int
+    last_24h_amount: int
+    total: int
+    amount_bands: Dict[str, int]
+    emails_sent: Dict[str, int]
+
+
+class LLMStats(BaseModel):
+    latency_ms: LatencySummary
+    first_token_ms: LatencySummary
+    errors: int
+
+
+class CacheStats(BaseModel):
+    hits: int
+    misses: int
+    hit_ratio: Optional[float] = None
+
+
+class AdminStatsResponse(BaseModel):
+    """Ответ /admin/stats."""
+
+    timestamp: str
+    worker_id: Optional[str] = None
+    sessions_active: int
+    llm_admission: AdmissionStats
+    uptime_seconds: int
+    messages_last_hour: int
+    leads: LeadStats
+    llm: LLMStats
+    cache: Dict[str, CacheStats]
+
+
+class TraceSpan(BaseModel):
+    name: str
+    start_ms: float
+    duration_ms: float
+    attributes: Dict[str, Any]
+
+
+class TraceInfo(BaseModel):
+    request_id: str
+    name: str
+    session_id: Optional[str] = None
+    started_at: str
+    duration_ms: Optional[float] = None
+    attributes: Dict[str, Any]
+    spans: List[TraceSpan]
+
+
+class DebugTracesResponse(BaseModel):
+    """Ответ /debug/traces."""
+
+    count: int
+    traces: List[TraceInfo]
+
+
+class LoopStall(BaseModel):
+    started_at: str
+    stack: List[str]
+    # Сторож дописывает задержку сразу после снятия стека
+    lag_ms: Optional[int] = None
+
+
+class LoopLagResponse(BaseModel):
+    """Ответ /admin/loop-lag."""
+
+    enabled: bool
+    threshold_ms: float
+    lag_ms: LatencySummary
+    stalls: List[LoopStall]
+
+
+class EmailTestData(BaseModel):
+    amount: int
+    phone: str
+    email: str
+
+
+class EmailTestResponse(BaseModel):
+    """Ответ /test/email после отправки; ошибки — отдельным JSON {"status", "error"}."""
+
+    status: str
+    full_email_sent: bool
+    incomplete_email_sent: bool
+    test_data: EmailTestData
+    email_to: Optional[str] = None
+    formspree_url: str
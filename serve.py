@@ -0,0 +1,242 @@
+"""
+Запуск сервиса: один процесс uvicorn или несколько независимых воркеров.
+
+WEB_CONCURRENCY=1 (по умолчанию) — как раньше, один uvicorn на $PORT.
+WEB_CONCURRENCY=N — N процессов uvicorn на внутренних портах и маршрутизатор
+на $PORT. Маршрутизатор читает только заголовки запроса и по консистентному
+хешу токена сессии (X-Session-Id или ?session_id=, иначе IP клиента) выбирает
+воркер, так что сессия посетителя всегда живёт в одном процессе
+и общее хранилище не нужно.
+
+    python serve.py
+"""
+import os
+import sys
+import signal
+import bisect
+import hashlib
+import asyncio
+import subprocess
+from urllib.parse import urlsplit, parse_qs
+
+from rate_limit import client_ip
+
+PORT = int(os.getenv("PORT", "8000"))
+WEB_CONCURRENCY = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+WORKER_BASE_PORT = int(os.getenv("WORKER_BASE_PORT", str(PORT + 1)))
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "sessions.db")
+LEAD_DIGEST_DB_PATH = os.getenv("LEAD_DIGEST_DB_PATH")
+
+HASH_RING_REPLICAS = 100         # виртуальных узлов на воркер: ровнее распределение
+MAX_HEADER_BYTES = 64 * 1024     # заголовки запроса больше этого не принимаем
+HEADER_TIMEOUT = 30              # секунд на получение заголовков
+PIPE_CHUNK = 64 * 1024
+RESTART_DELAY = 1                # секунд перед перезапуском упавшего воркера
+
+# X-Forwarded-For разбирает приложение (rate_limit.client_ip): uvicorn с
+# --forwarded-allow-ips "*" взял бы левую запись, а её подставляет сам клиент
+UVICORN_OPTIONS = ["--no-proxy-headers", "--ws-max-size", "65536"]
+
+BAD_GATEWAY = b"HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+BAD_REQUEST = b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+
+
+def _hash(key: str) -> int:
+    # hash() в Python солится на процесс, а разбиение должно быть стабильным
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Консистентное хеширование: ключ → воркер. При смене числа воркеров
+    переезжает только ~1/N сессий, а не все.
+    """
+
+    def __init__(self, nodes: list, replicas: int = HASH_RING_REPLICAS):
+        self._ring = sorted((_hash(f"{node}#{i}"), node) for node in nodes for i in range(replicas))
+        self._keys = [h for h, _ in self._ring]
+
+    def node_for(self, key: str):
+        index = bisect.bisect(self._keys, _hash(key)) % len(self._keys)
+        return self._ring[index][1]
+
+
+def parse_head(head: bytes):
+    """Строка запроса и заголовки (имена в нижнем регистре)."""
+    request_line, _, header_block = head[:-4].partition(b"\r\n")
+    headers = []
+    for line in header_block.split(b"\r\n"):
+        name, sep, value = line.partition(b":")
+        if sep:
+            headers.append((name.strip().lower(), value.strip()))
+    return request_line, headers
+
+
+def routing_key(request_line: bytes, headers: list, peer_ip: str) -> str:
+    """
+    Ключ маршрутизации — тот же, по которому main.resolve_session_id
+    находит сессию: токен виджета, а без него — IP клиента.
+    """
+    values = dict(headers)
+    session_id = values.get(b"x-session-id", b"").decode("latin-1")
+    if not session_id:
+        parts = request_line.split(b" ")
+        if len(parts) == 3:
+            query = parse_qs(urlsplit(parts[1].decode("latin-1")).query)
+            session_id = query.get("session_id", [""])[0]
+    if 0 < len(session_id) <= 64:
+        return session_id
+
+    return client_ip(values.get(b"x-forwarded-for", b"").decode("latin-1"), peer_ip)
+
+
+def rewrite_head(request_line: bytes, headers: list) -> bytes:
+    """
+    Обычные запросы отправляем с Connection: close — соединение живёт один запрос,
+    и следующий запрос (возможно, другого посетителя через общий прокси Render)
+    снова пройдёт маршрутизацию. WebSocket (Upgrade) передаём как есть.
+    """
+    is_upgrade = any(name == b"upgrade" for name, _ in headers)
+    lines = [request_line]
+    for name, value in headers:
+        if not is_upgrade and name in (b"connection", b"keep-alive"):
+            continue
+        lines.append(name + b": " + value)
+    if not is_upgrade:
+        lines.append(b"connection: close")
+    return b"\r\n".join(lines) + b"\r\n\r\n"
+
+
+async def _pipe(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        while True:
+            data = await reader.read(PIPE_CHUNK)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+        if writer.can_write_eof():
+            writer.write_eof()
+    except (ConnectionError, OSError):
+        writer.close()
+
+
+class Router:
+    """Маршрутизатор на $PORT: заголовки → воркер → дальше просто копируем байты."""
+
+    def __init__(self, ports: list):
+        self.ports = ports
+        self.ring = HashRing(list(range(len(ports))))
+        self.routed = [0] * len(ports)
+
+    async def handle(self, client_reader: asyncio.StreamReader, client_writer: asyncio.StreamWriter):
+        try:
+            try:
+                head = await asyncio.wait_for(client_reader.readuntil(b"\r\n\r\n"), HEADER_TIMEOUT)
+            except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                return
+            except asyncio.LimitOverrunError:
+                client_writer.write(BAD_REQUEST)
+                return
+
+            peer = client_writer.get_extra_info("peername")
+            request_line, headers = parse_head(head)
+            worker = self.ring.node_for(routing_key(request_line, headers, peer[0] if peer else ""))
+            self.routed[worker] += 1
+
+            try:
+                worker_reader, worker_writer = await asyncio.open_connection("127.0.0.1", self.ports[worker])
+            except OSError as e:
+                print(f"⚠️ Воркер {worker} недоступен: {e}")
+                client_writer.write(BAD_GATEWAY)
+                return
+
+            worker_writer.write(rewrite_head(request_line, headers))
+            to_worker = asyncio.create_task(_pipe(client_reader, worker_writer))
+            try:
+                # Ответ закончен, когда воркер закрыл соединение
+                await _pipe(worker_reader, client_writer)
+            finally:
+                to_worker.cancel()
+                worker_writer.close()
+        finally:
+            client_writer.close()
+
+
+def worker_path(path: str, index: int) -> str:
+    """
+    Файл SQLite воркера: sessions.db → sessions-0.db. Пустой путь
+    (снимки отключены) так и остаётся пустым, а не превращается в "-0".
+    """
+    if not path:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}-{index}{ext}"
+
+
+def worker_env(index: int) -> dict:
+    env = {
+        **os.environ,
+        "WORKER_ID": str(index),
+        # Каждому воркеру свой файл снимков — никакого общего состояния
+        "SESSION_DB_PATH": worker_path(SESSION_DB_PATH, index),
+    }
+    # Очередь дайджеста по умолчанию лежит в файле снимков; заданная отдельно —
+    # тоже своя у каждого воркера, иначе процессы делили бы одну очередь
+    if LEAD_DIGEST_DB_PATH is not None:
+        env["LEAD_DIGEST_DB_PATH"] = worker_path(LEAD_DIGEST_DB_PATH, index)
+    return env
+
+
+def _start_worker(index: int, port: int) -> subprocess.Popen:
+    env = worker_env(index)
+    command = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), *UVICORN_OPTIONS]
+    print(f"👷 Воркер {index}: порт {port}")
+    return subprocess.Popen(command, env=env)
+
+
+async def run_cluster(workers: int):
+    ports = [WORKER_BASE_PORT + i for i in range(workers)]
+    processes = [_start_worker(i, port) for i, port in enumerate(ports)]
+    router = Router(ports)
+    server = await asyncio.start_server(router.handle, "0.0.0.0", PORT, limit=MAX_HEADER_BYTES)
+    print(f"🔀 Маршрутизатор на порту {PORT}, воркеров: {workers}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    # Следим за воркерами: упавший перезапускаем на том же порту,
+    # чтобы его сессии вернулись туда же (из его файла снимков)
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), RESTART_DELAY)
+        except asyncio.TimeoutError:
+            pass
+        for i, process in enumerate(processes):
+            if process.poll() is not None and not stop.is_set():
+                print(f"❌ Воркер {i} завершился с кодом {process.returncode}, перезапускаем")
+                processes[i] = _start_worker(i, ports[i])
+
+    print("🛑 Останавливаем воркеры...")
+    server.close()
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    print(f"📊 Запросов по воркерам: {router.routed}")
+
+
+def main():
+    if WEB_CONCURRENCY == 1:
+        os.execvp(sys.executable, [sys.executable, "-m", "uvicorn", "main:app",
+                                   "--host", "0.0.0.0", "--port", str(PORT), *UVICORN_OPTIONS])
+    asyncio.run(run_cluster(WEB_CONCURRENCY))
+
+
+if __name__ == "__main__":
+    main()
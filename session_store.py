@@ -0,0 +1,98 @@
+import json
+import time
+import sqlite3
+import threading
+
+from sessions import SessionRecord
+
+
+class SessionSnapshotStore:
+    """
+    Снимки сессий в SQLite (режим WAL), чтобы рестарт или деплой
+    не терял наполовину собранные заявки.
+
+    Запись инкрементальная: main помечает изменённые и удалённые сессии,
+    а flush() раз в несколько секунд пишет только их одной транзакцией.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " session_id TEXT PRIMARY KEY,"
+            " data TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._lock = threading.Lock()
+        self._dirty = set()
+        self._deleted = set()
+
+    def mark_dirty(self, session_id: str):
+        with self._lock:
+            self._dirty.add(session_id)
+            self._deleted.discard(session_id)
+
+    def mark_deleted(self, session_id: str):
+        with self._lock:
+            self._deleted.add(session_id)
+            self._dirty.discard(session_id)
+
+    def flush(self, sessions: dict) -> int:
+        """Пишем накопленные изменения. Возвращает число затронутых сессий."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            deleted, self._deleted = self._deleted, set()
+        if not dirty and not deleted:
+            return 0
+
+        now = time.time()
+        rows = []
+        for session_id in dirty:
+            record = sessions.get(session_id)
+            if record is None:
+                deleted.add(session_id)
+            else:
+                rows.append((session_id, json.dumps(record.to_dict(), ensure_ascii=False), now))
+
+        try:
+            with self._lock:
+                self._conn.execute("BEGIN")
+                try:
+                    if rows:
+                        self._conn.executemany(
+                            "INSERT INTO sessions (session_id, data, updated_at) VALUES (?, ?, ?) "
+                            "ON CONFLICT(session_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+                            rows
+                        )
+                    if deleted:
+                        self._conn.executemany("DELETE FROM sessions WHERE session_id = ?", [(sid,) for sid in deleted])
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+        except Exception:
+            # Не теряем изменения: вернём их в очередь на следующий flush
+            with self._lock:
+                self._deleted |= deleted - self._dirty
+                self._dirty |= {row[0] for row in rows} - self._deleted
+            raise
+        return len(rows) + len(deleted)
+
+    def load_all(self) -> dict:
+        """Восстанавливаем все сессии при старте."""
+        sessions = {}
+        with self._lock:
+            rows = self._conn.execute("SELECT session_id, data FROM sessions").fetchall()
+        for session_id, data in rows:
+            try:
+                sessions[session_id] = SessionRecord.from_dict(json.loads(data))
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"⚠️ Пропускаем повреждённый снимок сессии {session_id}: {e}")
+        return sessions
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
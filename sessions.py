@@ -0,0 +1,130 @@
+import os
+import asyncio
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from chatbot_logic import LeadScore
+
+# Ограничения на текст одной сессии: сколько сообщений и символов храним
+SESSION_MAX_TURNS = int(os.getenv("SESSION_MAX_TURNS", "50"))
+SESSION_MAX_CHARS = int(os.getenv("SESSION_MAX_CHARS", "8000"))
+# Число полос (stripes) блокировок: память постоянна при любом числе сессий
+SESSION_LOCK_STRIPES = int(os.getenv("SESSION_LOCK_STRIPES", "1024"))
+
+
+class TranscriptBuffer:
+    """
+    Ограниченный буфер сообщений пользователя.
+    Храним только склеенный текст ("\\n".join) и длины сообщений:
+    при добавлении дописываем хвост, при вытеснении старых сообщений
+    отрезаем голову — без полного пересбора на каждом сообщении
+    и без второй копии каждого сообщения в памяти.
+    """
+
+    __slots__ = ("text", "lengths", "max_turns", "max_chars")
+
+    def __init__(self, max_turns: int = SESSION_MAX_TURNS, max_chars: int = SESSION_MAX_CHARS):
+        self.text = ""
+        self.lengths = []  # длины сообщений по порядку; сообщения могут содержать "\n"
+        self.max_turns = max_turns
+        self.max_chars = max_chars
+
+    def append(self, message: str):
+        # Одно сообщение не может занять больше всего буфера
+        message = message[:self.max_chars]
+        self.text = f"{self.text}\n{message}" if self.lengths else message
+        self.lengths.append(len(message))
+
+        # Сообщений не больше max_turns (50), поэтому pop(0) у списка дешевле deque
+        while len(self.lengths) > self.max_turns or (len(self.text) > self.max_chars and len(self.lengths) > 1):
+            evicted = self.lengths.pop(0)
+            self.text = self.text[evicted + 1:]
+
+    @property
+    def parts(self) -> list:
+        parts = []
+        start = 0
+        for length in self.lengths:
+            parts.append(self.text[start:start + length])
+            start += length + 1
+        return parts
+
+    def last(self, n: int) -> list:
+        return self.parts[-n:] if n > 0 else []
+
+    def __len__(self):
+        return len(self.lengths)
+
+
+@dataclass(slots=True)
+class SessionRecord:
+    """Данные одной сессии посетителя с крупной заявкой."""
+
+    amount: int
+    created_at: datetime = field(default_factory=datetime.now)
+    phone: str = None             # Найденный телефон
+    email: str = None             # Найденный email
+    transcript: TranscriptBuffer = field(default_factory=TranscriptBuffer)  # Сообщения пользователя
+    email_sent: bool = False      # Отправлено ли письмо
+    incomplete_sent: bool = False # Отправлено ли неполное письмо (таймаут)
+    reminder_sent: bool = False   # Отправлено ли напоминание о втором контакте
+    message_count: int = 0        # Количество сообщений в сессии
+    timeout_reason: str = None    # Почему письмо ушло по таймауту
+    score: LeadScore = None       # Оценка сообщения, открывшего заявку
+
+    @property
+    def full_text(self) -> str:
+        return self.transcript.text
+
+    def to_dict(self) -> dict:
+        """Сериализация для снимка на диск."""
+        return {
+            "amount": self.amount,
+            "created_at": self.created_at.isoformat(),
+            "phone": self.phone,
+            "email": self.email,
+            "text_parts": self.transcript.parts,
+            "email_sent": self.email_sent,
+            "incomplete_sent": self.incomplete_sent,
+            "reminder_sent": self.reminder_sent,
+            "message_count": self.message_count,
+            "timeout_reason": self.timeout_reason,
+            "score": self.score.to_dict() if self.score else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SessionRecord":
+        transcript = TranscriptBuffer()
+        for part in data.get("text_parts", []):
+            transcript.append(part)
+        return cls(
+            amount=data["amount"],
+            created_at=datetime.fromisoformat(data["created_at"]),
+            phone=data.get("phone"),
+            email=data.get("email"),
+            transcript=transcript,
+            email_sent=data.get("email_sent", False),
+            incomplete_sent=data.get("incomplete_sent", False),
+            reminder_sent=data.get("reminder_sent", False),
+            message_count=data.get("message_count", 0),
+            timeout_reason=data.get("timeout_reason"),
+            score=LeadScore.from_dict(data["score"]) if data.get("score") else None,
+        )
+
+
+class SessionManager:
+    """
+    Хранилище сессий с блокировками на уровне сессии.
+    Блокировки полосатые (striped): сессия попадает в одну из stripes
+    фиксированных asyncio.Lock по хешу идентификатора, поэтому память
+    не растёт с числом посетителей. Все изменения сессии и отправка
+    заявки по ней выполняются под её блокировкой — это исключает
+    двойную отправку письма и потерянные обновления.
+    """
+
+    def __init__(self, stripes: int = SESSION_LOCK_STRIPES):
+        self.sessions = {}
+        self._locks = [asyncio.Lock() for _ in range(stripes)]
+
+    def lock(self, session_id: str) -> asyncio.Lock:
+        return self._locks[hash(session_id) % len(self._locks)]
@@ -38,6 +38,7 @@
 
     const input = document.createElement("input");
     input.placeholder = "Ваш вопрос...";
+    input.maxLength = 2000; // Совпадает с MAX_MESSAGE_CHARS на сервере
     input.style.border = "none";
     input.style.borderTop = "1px solid #ccc";
     input.style.padding = "10px";
@@ -48,23 +49,246 @@
         box.style.display = box.style.display === "none" ? "flex" : "none";
     };
 
+    const API_BASE = "https://fortis-chatbot.onrender.com";
+    const API_URL = API_BASE + "/chat";
+    const WS_URL = API_BASE.replace(/^http/, "ws") + "/ws/chat";
+    const WS_CONNECT_TIMEOUT = 3000;
+    const WS_MAX_FAILURES = 3;
+    const HTTP_RETRIES = 2;
+    const HTTP_RETRY_DELAY = 1000;
+    // В DOM держим только последние сообщения, остальные — в памяти
+    const MAX_RENDERED = 100;
+    const MAX_HISTORY = 1000;
+    const LOAD_EARLIER_BATCH = 50;
+
+    // Токен сессии живёт в localStorage, чтобы сервер узнавал посетителя
+    let sessionId = null;
+    try {
+        sessionId = localStorage.getItem("fortis_session_id");
+    } catch (err) {}
+    function randomId() {
+        return (window.crypto && crypto.randomUUID)
+            ? crypto.randomUUID().replace(/-/g, "")
+            : Math.random().toString(36).slice(2) + Date.now().toString(36);
+    }
+    if (!sessionId) {
+        sessionId = randomId();
+        try {
+            localStorage.setItem("fortis_session_id", sessionId);
+        } catch (err) {}
+    }
+
+    // ===== Отрисовка: каждое сообщение — строка с текстовым узлом =====
+    // Новое сообщение — один appendChild, токен стрима — appendData в тот же узел,
+    // так что стоимость не зависит от длины истории. Старые строки уходят из DOM.
+    const history = [];     // { author, text, row, textNode }
+    let firstRendered = 0;  // индекс первого сообщения, которое есть в DOM
+
+    const loadEarlier = document.createElement("div");
+    loadEarlier.textContent = "Показать ранние сообщения";
+    loadEarlier.style.display = "none";
+    loadEarlier.style.textAlign = "center";
+    loadEarlier.style.color = "#0084ff";
+    loadEarlier.style.cursor = "pointer";
+    loadEarlier.style.marginBottom = "6px";
+    chat.appendChild(loadEarlier);
+
+    let scrollScheduled = false;
+    function scheduleScroll() {
+        // Одна прокрутка (и один пересчёт раскладки) на кадр, а не на каждый токен
+        if (scrollScheduled) return;
+        scrollScheduled = true;
+        (window.requestAnimationFrame || setTimeout)(() => {
+            scrollScheduled = false;
+            chat.scrollTop = chat.scrollHeight;
+        });
+    }
+
+    function renderRow(entry, parent, before) {
+        const row = document.createElement("div");
+        const name = document.createElement("b");
+        name.appendChild(document.createTextNode(entry.author + ":"));
+        entry.textNode = document.createTextNode(" " + entry.text);
+        row.appendChild(name);
+        row.appendChild(entry.textNode);
+        parent.insertBefore(row, before);
+        entry.row = row;
+    }
+
+    function unrender(entry) {
+        if (entry.row) entry.row.remove();
+        entry.row = null;
+        entry.textNode = null;
+    }
+
+    function trimWindow() {
+        while (history.length - firstRendered > MAX_RENDERED) {
+            unrender(history[firstRendered]);
+            firstRendered += 1;
+        }
+        if (history.length > MAX_HISTORY) {
+            const dropped = history.length - MAX_HISTORY;
+            history.splice(0, dropped);
+            firstRendered = Math.max(0, firstRendered - dropped);
+        }
+        loadEarlier.style.display = firstRendered > 0 ? "block" : "none";
+    }
+
+    loadEarlier.onclick = () => {
+        const heightBefore = chat.scrollHeight;
+        const start = Math.max(0, firstRendered - LOAD_EARLIER_BATCH);
+        const before = loadEarlier.nextSibling;
+        const fragment = document.createDocumentFragment();
+        for (let i = start; i < firstRendered; i++) {
+            renderRow(history[i], fragment, null);
+        }
+        chat.insertBefore(fragment, before);
+        firstRendered = start;
+        loadEarlier.style.display = firstRendered > 0 ? "block" : "none";
+        // Остаёмся на том же сообщении, что и до подгрузки
+        chat.scrollTop += chat.scrollHeight - heightBefore;
+    };
+
+    function addMessage(author, text) {
+        const entry = { author, text, row: null, textNode: null };
+        history.push(entry);
+        renderRow(entry, chat, null);
+        trimWindow();
+        scheduleScroll();
+        return entry;
+    }
+
+    function setText(entry, text) {
+        entry.text = text;
+        if (entry.textNode) entry.textNode.data = " " + text;
+        scheduleScroll();
+    }
+
+    function appendText(entry, chunk) {
+        entry.text += chunk;
+        if (entry.textNode) entry.textNode.appendData(chunk);
+        scheduleScroll();
+    }
+
+    // ===== WebSocket: одно соединение на весь разговор =====
+    let ws = null;
+    let wsFailures = 0;
+    let pending = null; // { entry, text, done, message, id } — ответ, который сейчас стримится
+
+    function connect() {
+        if (!("WebSocket" in window) || wsFailures >= WS_MAX_FAILURES) {
+            return Promise.resolve(null);
+        }
+        if (ws && ws.readyState === WebSocket.OPEN) {
+            return Promise.resolve(ws);
+        }
+        return new Promise((resolve) => {
+            const socket = new WebSocket(WS_URL + "?session_id=" + encodeURIComponent(sessionId));
+            const timer = setTimeout(() => {
+                wsFailures += 1;
+                socket.close();
+                resolve(null);
+            }, WS_CONNECT_TIMEOUT);
+
+            socket.onopen = () => {
+                clearTimeout(timer);
+                wsFailures = 0;
+                ws = socket;
+                resolve(socket);
+            };
+            socket.onerror = () => {
+                clearTimeout(timer);
+                wsFailures += 1;
+                resolve(null);
+            };
+            socket.onclose = () => {
+                if (ws === socket) ws = null;
+                // Ответ оборвался — переспрашиваем по HTTP с тем же id:
+                // сервер отдаст уже готовый ответ, а не обработает сообщение заново
+                if (pending && !pending.done) {
+                    const lost = pending;
+                    pending = null;
+                    sendHttp(lost.message, lost.entry, lost.id).catch(() => {
+                        setText(lost.entry, lost.text || "Соединение прервано. Попробуйте ещё раз.");
+                    });
+                }
+            };
+            socket.onmessage = (event) => handleFrame(socket, JSON.parse(event.data));
+        });
+    }
+
+    function handleFrame(socket, frame) {
+        if (frame.type === "ping") {
+            socket.send(JSON.stringify({ type: "pong" }));
+        } else if (frame.type === "session") {
+            sessionId = frame.session_id;
+        } else if (frame.type === "typing" && pending) {
+            setText(pending.entry, "печатает...");
+        } else if (frame.type === "token" && pending) {
+            // Первый токен заменяет "печатает...", остальные дописываются в тот же узел
+            if (pending.text) {
+                appendText(pending.entry, frame.text);
+            } else {
+                setText(pending.entry, frame.text);
+            }
+            pending.text += frame.text;
+        } else if (frame.type === "done") {
+            finish(frame.reply);
+        } else if (frame.type === "error") {
+            finish(frame.error);
+        }
+    }
+
+    function finish(reply) {
+        if (!pending) return;
+        if (pending.entry.text !== reply) setText(pending.entry, reply);
+        pending.done = true;
+        pending = null;
+    }
+
+    // Повторы безопасны: у всех попыток один id, дубль получит сохранённый ответ
+    async function sendHttp(message, entry, id) {
+        for (let attempt = 0; ; attempt++) {
+            try {
+                const res = await fetch(API_URL, {
+                    method: "POST",
+                    // Токен и в заголовке: по нему serve.py выбирает воркер, не разбирая тело
+                    headers: { "Content-Type": "application/json", "X-Session-Id": sessionId },
+                    body: JSON.stringify({ message, session_id: sessionId, message_id: id })
+                });
+                if (res.status >= 500 && attempt < HTTP_RETRIES) {
+                    throw new Error("HTTP " + res.status);
+                }
+                const data = await res.json();
+                setText(entry, data.reply);
+                return;
+            } catch (err) {
+                if (attempt >= HTTP_RETRIES) throw err;
+                await new Promise((resolve) => setTimeout(resolve, HTTP_RETRY_DELAY * (attempt + 1)));
+            }
+        }
+    }
+
     input.addEventListener("keypress", async (e) => {
         if (e.key === "Enter" && input.value.trim()) {
             const message = input.value.trim();
-            chat.innerHTML += `<div><b>Вы:</b> ${message}</div>`;
+            addMessage("Вы", message);
             input.value = "";
 
-            const API_URL = "https://fortis-chatbot.onrender.com/chat";
-            const res = await fetch(API_URL, {
-                method: "POST",
-                headers: { "Content-Type": "application/json" },
-                body: JSON.stringify({ message })
-            });
-
-            const data = await res.json();
-            chat.innerHTML += `<div><b>Бот:</b> ${data.reply}</div>`;
-            chat.scrollTop = chat.scrollHeight;
+            const entry = addMessage("Бот", "...");
+            const id = randomId();
+            const socket = await connect();
+            if (socket && !pending) {
+                pending = { entry, text: "", done: false, message, id };
+                socket.send(JSON.stringify({ type: "message", text: message, id }));
+            } else {
+                // Запасной путь: обычный HTTP-запрос
+                try {
+                    await sendHttp(message, entry, id);
+                } catch (err) {
+                    setText(entry, "Ошибка соединения. Попробуйте ещё раз.");
+                }
+            }
         }
     });
 })();
-
@@ -0,0 +1,264 @@
+import os
+import re
+import json
+import gzip
+import hashlib
+
+try:
+    import brotli  # Необязательная зависимость: без неё отдаём только gzip
+except ImportError:
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+WIDGET_SOURCE = os.path.join(STATIC_DIR, "widget.js")
+MANIFEST_PATH = os.path.join(DIST_DIR, "manifest.json")
+ENCODING_SUFFIXES = {"identity": "", "gzip": ".gz", "br": ".br"}
+
+# Хешированный файл никогда не меняется — кешируем навсегда
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Загрузчик маленький и должен подхватывать новую версию сразу (через ETag/304)
+LOADER_CACHE_CONTROL = "public, no-cache"
+
+LOADER_TEMPLATE = """(function(){var c=document.currentScript,b=c&&c.src?c.src.replace(/\\/static\\/widget\\.js.*$/,""):"";\
+var s=document.createElement("script");s.src=b+"/static/dist/%s";s.async=true;\
+(document.head||document.body).appendChild(s);})();
+"""
+
+
+# Перед "/" в этих позициях начинается регулярное выражение, а не деление
+_REGEX_PREFIX_CHARS = set("(,=:[!&|?{};+-*%<>~^")
+_REGEX_PREFIX_WORDS = {"return", "typeof", "instanceof", "in", "of", "new", "delete", "void", "throw", "case", "do", "else"}
+
+
+class _JsScanner:
+    """
+    Построчный разбор JS ровно настолько, чтобы знать, где мы в конце строки:
+    в коде, в строке '...'/"..." (продолжение через \\), в шаблоне `...`
+    (с вложенными ${...}) или в блочном комментарии. Внутри литералов
+    минификатор строки не трогает.
+    """
+
+    def __init__(self):
+        self.state = None    # None (код) | "'" | '"' | "`" | "/*"
+        self.braces = []     # глубина {} в каждом открытом ${ шаблона
+        self.prev = ""       # последний значимый символ кода
+        self.word = ""       # последнее слово кода
+
+    def scan(self, line: str):
+        i, n = 0, len(line)
+        while i < n:
+            c = line[i]
+            if self.state in ("'", '"', "`"):
+                if c == "\\":
+                    i += 2
+                    continue
+                if c == self.state:
+                    self.state = None
+                    self.prev, self.word = c, ""
+                elif self.state == "`" and line.startswith("${", i):
+                    self.state = None
+                    self.braces.append(0)
+                    self.prev, self.word = "{", ""
+                    i += 1
+                i += 1
+                continue
+            if self.state == "/*":
+                end = line.find("*/", i)
+                if end < 0:
+                    return
+                self.state = None
+                i = end + 2
+                continue
+
+            if line.startswith("//", i):
+                return
+            if line.startswith("/*", i):
+                self.state = "/*"
+                i += 2
+                continue
+            if c in ("'", '"', "`"):
+                self.state = c
+            elif c == "/" and (self.prev in _REGEX_PREFIX_CHARS or not self.prev or self.word in _REGEX_PREFIX_WORDS):
+                i = self._skip_regex(line, i)
+                self.prev, self.word = "/", ""
+                continue
+            elif c == "{" and self.braces:
+                self.braces[-1] += 1
+            elif c == "}" and self.braces:
+                if self.braces[-1] == 0:
+                    self.braces.pop()
+                    self.state = "`"
+                    i += 1
+                    continue
+                self.braces[-1] -= 1
+            if c.isalnum() or c in "_$":
+                self.word = self.word + c if self.prev.isalnum() or self.prev in "_$" else c
+                self.prev = c
+            elif not c.isspace():
+                self.prev, self.word = c, ""
+            i += 1
+        # Строка в кавычках без \\ в конце не переносится на следующую строку
+        if self.state in ("'", '"') and not line.endswith("\\"):
+            self.state = None
+
+    @staticmethod
+    def _skip_regex(line: str, start: int) -> int:
+        """Позиция после /.../флаги; [...] внутри регулярки может содержать /."""
+        i, in_class = start + 1, False
+        while i < len(line):
+            c = line[i]
+            if c == "\\":
+                i += 2
+                continue
+            if c == "[":
+                in_class = True
+            elif c == "]":
+                in_class = False
+            elif c == "/" and not in_class:
+                i += 1
+                while i < len(line) and line[i].isalpha():
+                    i += 1
+                return i
+            i += 1
+        return i
+
+
+def minify_js(source: str) -> str:
+    """
+    Консервативная минификация: убираем отступы, пустые строки
+    и строки, целиком состоящие из // комментария.
+    Строки, начинающиеся внутри шаблона `...` или строки с продолжением через \\,
+    остаются как есть: пробелы и "//" там — часть значения.
+    """
+    scanner = _JsScanner()
+    lines = []
+    for line in source.splitlines():
+        if scanner.state in ("'", '"', "`"):
+            scanner.scan(line)
+            lines.append(line if scanner.state else line.rstrip())
+            continue
+        stripped = line.strip()
+        if not stripped or (stripped.startswith("//") and scanner.state is None):
+            continue
+        scanner.scan(stripped)
+        # Хвостовые пробелы внутри незакрытого шаблона — тоже часть значения
+        lines.append(stripped if scanner.state != "`" else line.lstrip())
+    return "\n".join(lines) + "\n"
+
+
+def _source_hash(source: str) -> str:
+    """Хеш исходника widget.js: по нему видно, что сборка в dist устарела."""
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()[:12]
+
+
+def _etag(data: bytes) -> str:
+    return '"' + hashlib.sha256(data).hexdigest()[:32] + '"'
+
+
+def build_widget(write: bool = True) -> dict:
+    """
+    Собирает widget.js: минифицирует, считает хеш содержимого,
+    сжимает gzip (и brotli, если установлен).
+    При write=True пишет файлы в static/dist и manifest.json.
+    """
+    with open(WIDGET_SOURCE, "r", encoding="utf-8") as f:
+        source = f.read()
+    minified = minify_js(source).encode("utf-8")
+
+    content_hash = hashlib.sha256(minified).hexdigest()[:12]
+    filename = f"widget.{content_hash}.js"
+
+    variants = {"identity": minified, "gzip": gzip.compress(minified, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(minified, quality=11)
+
+    loader = (LOADER_TEMPLATE % filename).encode("utf-8")
+
+    if write:
+        os.makedirs(DIST_DIR, exist_ok=True)
+        # Удаляем устаревшие версии, чтобы dist не разрастался
+        for old in os.listdir(DIST_DIR):
+            if re.match(r"widget\.[0-9a-f]+\.js", old) and not old.startswith(filename):
+                os.remove(os.path.join(DIST_DIR, old))
+        for encoding, data in variants.items():
+            with open(os.path.join(DIST_DIR, filename + ENCODING_SUFFIXES[encoding]), "wb") as f:
+                f.write(data)
+        with open(MANIFEST_PATH, "w", encoding="utf-8") as f:
+            json.dump({"widget": filename, "encodings": sorted(variants), "source": _source_hash(source)}, f)
+
+    return {"filename": filename, "variants": variants, "loader": loader}
+
+
+class WidgetAssets:
+    """
+    Держит в памяти собранный виджет и загрузчик и отвечает на запросы
+    с учётом Accept-Encoding и If-None-Match.
+    """
+
+    def __init__(self):
+        bundle = self._load_from_dist() or build_widget(write=False)
+        self.filename = bundle["filename"]
+        self.variants = bundle["variants"]
+        self.loader = bundle["loader"]
+        self.widget_etags = {encoding: _etag(data) for encoding, data in self.variants.items()}
+        self.loader_etag = _etag(self.loader)
+        print(f"📦 Виджет: /static/dist/{self.filename} (кодировки: {', '.join(sorted(self.variants))})")
+
+    @staticmethod
+    def _load_from_dist():
+        """
+        Читаем результат build_widget.py, если сборка есть и собрана
+        из текущего static/widget.js; иначе None — соберём в памяти.
+        """
+        try:
+            with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            with open(WIDGET_SOURCE, "r", encoding="utf-8") as f:
+                source = f.read()
+            if manifest.get("source") != _source_hash(source):
+                print("⚠️ static/dist собран из другой версии widget.js — собираем заново в памяти "
+                      "(запустите python build_widget.py)")
+                return None
+            filename = manifest["widget"]
+            variants = {}
+            for encoding in manifest["encodings"]:
+                with open(os.path.join(DIST_DIR, filename + ENCODING_SUFFIXES[encoding]), "rb") as f:
+                    variants[encoding] = f.read()
+            return {"filename": filename, "variants": variants, "loader": (LOADER_TEMPLATE % filename).encode("utf-8")}
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def pick_encoding(self, accept_encoding: str) -> str:
+        """
+        Кодировка по Accept-Encoding с учётом q: "gzip;q=0" — отказ от gzip,
+        "*" распространяется на не перечисленные. Из разрешённых берём
+        с наибольшим q, при равенстве br лучше gzip.
+        """
+        weights = {}
+        for part in (accept_encoding or "").lower().split(","):
+            name, _, params = part.partition(";")
+            quality = 1.0
+            for param in params.split(";"):
+                key, _, value = param.strip().partition("=")
+                if key == "q":
+                    try:
+                        quality = float(value)
+                    except ValueError:
+                        quality = 0.0
+            if name.strip():
+                weights[name.strip()] = quality
+        default = weights.get("*", 0.0)
+        best, best_quality = "identity", 0.0
+        for encoding in ("br", "gzip"):
+            quality = weights.get(encoding, default)
+            if encoding in self.variants and quality > best_quality:
+                best, best_quality = encoding, quality
+        return best
+
+    @staticmethod
+    def not_modified(if_none_match: str, etag: str) -> bool:
+        if not if_none_match:
+            return False
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
@@ -0,0 +1,224 @@
+import math
+import time
+import threading
+
+# Границы корзин распределения сумм заявок (руб.)
+AMOUNT_BANDS = [
+    ("50-100 тыс", 100_000),
+    ("100-500 тыс", 500_000),
+    ("0.5-1 млн", 1_000_000),
+    ("1-5 млн", 5_000_000),
+    ("от 5 млн", math.inf),
+]
+
+
+class SlidingWindowCounter:
+    """
+    Число событий и сумма значений за последние window секунд.
+    Окно — кольцо из buckets корзин; итоги поддерживаются инкрементально:
+    при сдвиге окна вычитаем только устаревшие корзины, поэтому чтение
+    не зависит от объёма трафика. clock подменяется в тестах.
+    """
+
+    def __init__(self, window: float, buckets: int = 60, clock=time.monotonic):
+        self.window = window
+        self.bucket_seconds = window / buckets
+        self._clock = clock
+        self._counts = [0] * buckets
+        self._sums = [0] * buckets
+        self._bucket = int(clock() // self.bucket_seconds)
+        self.count = 0
+        self.total = 0
+
+    def _advance(self, now: float):
+        bucket = int(now // self.bucket_seconds)
+        steps = bucket - self._bucket
+        if steps <= 0:
+            return
+        size = len(self._counts)
+        if steps >= size:
+            self._counts = [0] * size
+            self._sums = [0] * size
+            self.count = 0
+            self.total = 0
+        else:
+            for i in range(1, steps + 1):
+                index = (self._bucket + i) % size
+                self.count -= self._counts[index]
+                self.total -= self._sums[index]
+                self._counts[index] = 0
+                self._sums[index] = 0
+        self._bucket = bucket
+
+    def add(self, value: float = 0, now: float = None):
+        self._advance(self._clock() if now is None else now)
+        index = self._bucket % len(self._counts)
+        self._counts[index] += 1
+        self._sums[index] += value
+        self.count += 1
+        self.total += value
+
+    def read(self, now: float = None) -> tuple:
+        """(число событий, сумма значений) за окно."""
+        self._advance(self._clock() if now is None else now)
+        return self.count, self.total
+
+
+class LatencySketch:
+    """
+    Потоковый скетч квантилей с логарифмическими корзинами (как в DDSketch/HDR):
+    значение попадает в корзину с относительной ошибкой не больше relative_error.
+    Память и время чтения фиксированы и не зависят от числа наблюдений.
+    Значения не больше min_value собираются в нулевую корзину, и квантиль,
+    попавший в неё, — среднее этих значений: без гарантии относительной
+    ошибки, но и без подмены 0.3 мс на min_value. Значения выше max_value
+    попадают в последнюю корзину, и квантиль в ней — наблюдённый максимум.
+    """
+
+    def __init__(self, min_value: float = 1.0, max_value: float = 600_000.0, relative_error: float = 0.02):
+        self.min_value = min_value
+        self.gamma = (1 + relative_error) / (1 - relative_error)
+        self._log_gamma = math.log(self.gamma)
+        self._buckets = [0] * (self._index(max_value) + 1)
+        self._low_total = 0.0  # сумма значений в нулевой корзине
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def _index(self, value: float) -> int:
+        if value <= self.min_value:
+            return 0
+        return math.ceil(math.log(value / self.min_value) / self._log_gamma)
+
+    def add(self, value: float):
+        index = min(self._index(value), len(self._buckets) - 1)
+        self._buckets[index] += 1
+        if index == 0:
+            self._low_total += value
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for index, count in enumerate(self._buckets):
+            seen += count
+            if seen > rank:
+                if index == 0:
+                    return self._low_total / count
+                if index == len(self._buckets) - 1:
+                    return self.max
+                # Середина корзины (gamma^(i-1), gamma^i] в относительном смысле
+                return min(self.min_value * 2 * self.gamma ** index / (self.gamma + 1), self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "avg": round(self.total / self.count, 1) if self.count else None,
+            "p50": self._rounded(0.5),
+            "p90": self._rounded(0.9),
+            "p99": self._rounded(0.99),
+            "max": round(self.max, 1) if self.count else None,
+        }
+
+    def _rounded(self, q: float):
+        value = self.quantile(q)
+        return round(value, 1) if value is not None else None
+
+
+class DashboardStats:
+    """
+    Агрегаты для /admin/stats. Всё считается в момент события
+    (заявка, ответ LLM, попадание в кеш), а чтение — только сборка
+    готовых чисел. События приходят и из рабочих потоков, поэтому под блокировкой.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+
+        self.messages_hour = SlidingWindowCounter(3600, clock=clock)
+        self.leads_hour = SlidingWindowCounter(3600, clock=clock)
+        self.leads_day = SlidingWindowCounter(86400, buckets=96, clock=clock)
+        self.leads_total = 0
+        self.amount_bands = {name: 0 for name, _ in AMOUNT_BANDS}
+        self.emails_sent = {"full": 0, "incomplete": 0}
+
+        self.llm_latency_ms = LatencySketch()
+        self.llm_first_token_ms = LatencySketch()
+        self.llm_errors = 0
+
+        self.cache = {}  # имя кеша → [попадания, промахи]
+
+    def record_message(self):
+        with self._lock:
+            self.messages_hour.add()
+
+    def record_lead(self, amount: int):
+        """Новая сессия с крупной заявкой."""
+        with self._lock:
+            self.leads_hour.add(amount)
+            self.leads_day.add(amount)
+            self.leads_total += 1
+            for name, upper in AMOUNT_BANDS:
+                if amount < upper:
+                    self.amount_bands[name] += 1
+                    break
+
+    def record_email(self, kind: str):
+        with self._lock:
+            self.emails_sent[kind] += 1
+
+    def record_llm(self, latency_ms: float, first_token_ms: float = None):
+        with self._lock:
+            self.llm_latency_ms.add(latency_ms)
+            if first_token_ms is not None:
+                self.llm_first_token_ms.add(first_token_ms)
+
+    def record_llm_error(self):
+        with self._lock:
+            self.llm_errors += 1
+
+    def record_cache(self, name: str, hit: bool):
+        with self._lock:
+            counters = self.cache.setdefault(name, [0, 0])
+            counters[0 if hit else 1] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            messages_hour, _ = self.messages_hour.read()
+            leads_hour, amount_hour = self.leads_hour.read()
+            leads_day, amount_day = self.leads_day.read()
+            return {
+                "uptime_seconds": round(time.time() - self.started_at),
+                "messages_last_hour": messages_hour,
+                "leads": {
+                    "last_hour": leads_hour,
+                    "last_hour_amount": amount_hour,
+                    "last_24h": leads_day,
+                    "last_24h_amount": amount_day,
+                    "total": self.leads_total,
+                    "amount_bands": dict(self.amount_bands),
+                    "emails_sent": dict(self.emails_sent),
+                },
+                "llm": {
+                    "latency_ms": self.llm_latency_ms.summary(),
+                    "first_token_ms": self.llm_first_token_ms.summary(),
+                    "errors": self.llm_errors,
+                },
+                "cache": {
+                    name: {
+                        "hits": hits,
+                        "misses": misses,
+                        "hit_ratio": round(hits / (hits + misses), 3) if hits + misses else None,
+                    }
+                    for name, (hits, misses) in self.cache.items()
+                },
+            }
+
+
+dashboard = DashboardStats()
@@ -0,0 +1,15 @@
+import os
+import sys
+
+# Модули сервиса лежат в корне репозитория
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+# main.py читает окружение при импорте: без внешних сервисов, снимков и keep-alive
+os.environ.setdefault("ENVIRONMENT", "development")
+os.environ.setdefault("SESSION_DB_PATH", "")
+os.environ.setdefault("RENDER_EXTERNAL_URL", "")
+os.environ.setdefault("CATALOG_PATH", "catalog.example.csv")
+os.environ.pop("REPLICATE_API_TOKEN", None)
+os.environ.pop("RATE_LIMIT_REDIS_URL", None)
@@ -0,0 +1,61 @@
+import asyncio
+import time
+
+from admission import AdmissionController
+
+
+async def generate(controller: AdmissionController, seconds: float) -> tuple:
+    """Один запрос: (допущен ли, сколько секунд до ответа)."""
+    started = time.monotonic()
+    async with controller.slot() as admitted:
+        if admitted:
+            await asyncio.sleep(seconds)
+    return admitted, time.monotonic() - started
+
+
+def p99(values: list) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * 0.99))]
+
+
+def test_burst_in_one_tick_is_bounded_by_queue():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=2, max_queue=3, queue_timeout=5)
+        results = await asyncio.gather(*(generate(controller, 0.01) for _ in range(30)))
+        return controller, results
+
+    controller, results = asyncio.run(scenario())
+    stats = controller.stats()
+    assert sum(admitted for admitted, _ in results) == 5
+    assert stats["shed_queue_full"] == 25
+    assert stats["max_queued_seen"] <= 3
+    assert stats["active"] == 0 and stats["queued"] == 0
+
+
+def test_overload_keeps_p99_bounded():
+    """
+    Нагрузочный сценарий: запросы приходят вчетверо быстрее, чем LLM их обслуживает.
+    Допущенные ждут не дольше queue_timeout, остальные получают отказ сразу,
+    поэтому p99 ограничен queue_timeout + время генерации, а не длиной перегрузки.
+    """
+    generation, timeout = 0.05, 0.2
+
+    async def scenario():
+        controller = AdmissionController(max_concurrent=4, max_queue=8, queue_timeout=timeout)
+        tasks = []
+        for _ in range(40):
+            # 16 запросов за "время одной генерации" при 4 слотах
+            tasks.extend(asyncio.create_task(generate(controller, generation)) for _ in range(16))
+            await asyncio.sleep(generation)
+        return controller, await asyncio.gather(*tasks)
+
+    controller, results = asyncio.run(scenario())
+    latencies = [latency for _, latency in results]
+    shed = [latency for admitted, latency in results if not admitted]
+    stats = controller.stats()
+
+    assert stats["admitted"] > 0 and stats["shed_queue_full"] > 0
+    assert stats["max_queued_seen"] <= 8
+    assert p99(latencies) < timeout + generation + 0.1
+    # Отказ по полной очереди — без ожидания
+    assert min(shed) < 0.01
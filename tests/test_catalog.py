@@ -0,0 +1,30 @@
+"""Поиск по каталогу на catalog.example.csv."""
+import pytest
+
+from catalog import Catalog, tokenize
+
+
+@pytest.fixture(scope="module")
+def catalog():
+    return Catalog.from_file("catalog.example.csv")
+
+
+@pytest.mark.parametrize("query, sku", [
+    ("лист 2 мм", "L-2-1250-2500"),
+    ("Сколько стоит лист 2 мм?", "L-2-1250-2500"),
+    ("лист оцинкованный 0,7 мм", "L-07-OC"),
+    ("труба 57х3.5", "T-57-35"),
+    ("арматура 12 мм цена", "A-12-A500C"),
+    ("нужна арматура а500с, 5 тонн", "A-12-A500C"),
+])
+def test_search_finds_item(catalog, query, sku):
+    assert [item.sku for item in catalog.search(query)][:1] == [sku]
+
+
+def test_units_and_common_words_are_not_tokens():
+    assert tokenize("Сколько стоит лист 2 мм, цена за т?") == ["лист", "2"]
+
+
+def test_no_words_no_results(catalog):
+    assert catalog.search("2 мм") == []
+    assert catalog.search("здравствуйте") == []
@@ -0,0 +1,91 @@
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs
+
+import pytest
+
+from email_utils import LeadDigest
+
+
+class FormspreeStandIn(BaseHTTPRequestHandler):
+    """Локальная замена Formspree: запоминает формы и отвечает заданным статусом."""
+
+    status = 200
+    received = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"])).decode()
+        type(self).received.append({key: values[0] for key, values in parse_qs(body).items()})
+        self.send_response(type(self).status)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(b'{"ok": true}')
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def formspree():
+    FormspreeStandIn.status = 200
+    FormspreeStandIn.received = []
+    server = HTTPServer(("127.0.0.1", 0), FormspreeStandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield FormspreeStandIn, f"http://127.0.0.1:{server.server_port}/f/test"
+    server.shutdown()
+
+
+def lead(amount: int, phone: str) -> dict:
+    return {
+        "amount": amount, "type": "incomplete_application", "missing_data": "email",
+        "phone": phone, "client_email": "ОТСУТСТВУЕТ", "timestamp": "2026-10-19 12:00:00",
+        "text": f"заявка на {amount} руб",
+    }
+
+
+def test_digest_sends_one_submission_sorted_by_amount(formspree):
+    stand_in, url = formspree
+    digest = LeadDigest(window=3600, url=url)
+    digest.add(lead(80_000, "+79160000001"))
+    digest.add(lead(300_000, "+79160000002"))
+
+    assert digest.flush() is True
+    assert stand_in.received == []  # окно ещё не истекло
+
+    assert digest.flush(force=True) is True
+    assert len(stand_in.received) == 1
+    form = stand_in.received[0]
+    assert form["type"] == "digest" and form["count"] == "2"
+    assert form["text"].index("+79160000002") < form["text"].index("+79160000001")
+
+
+def test_queued_leads_survive_a_crash(formspree, tmp_path):
+    stand_in, url = formspree
+    path = str(tmp_path / "sessions.db")
+
+    digest = LeadDigest(window=3600, url=url, path=path)
+    digest.add(lead(120_000, "+79160000003"))
+    digest.add(lead(90_000, "+79160000004"))
+    del digest  # процесс упал до отправки дайджеста
+
+    restarted = LeadDigest(window=3600, url=url, path=path)
+    assert restarted.flush(force=True) is True
+    assert stand_in.received[0]["count"] == "2"
+
+    # Отправленные заявки с диска удалены
+    assert LeadDigest(window=3600, url=url, path=path).flush(force=True) is True
+    assert len(stand_in.received) == 1
+
+
+def test_failed_delivery_keeps_leads(formspree, tmp_path):
+    stand_in, url = formspree
+    path = str(tmp_path / "sessions.db")
+    digest = LeadDigest(window=3600, url=url, path=path)
+    digest.add(lead(150_000, "+79160000005"))
+
+    stand_in.status = 500
+    assert digest.flush(force=True) is False
+
+    stand_in.status = 200
+    assert LeadDigest(window=3600, url=url, path=path).flush(force=True) is True
+    assert "+79160000005" in stand_in.received[-1]["text"]
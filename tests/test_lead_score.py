@@ -0,0 +1,59 @@
+"""Разбор суммы для менеджера: фрагменты и позиции в исходном сообщении."""
+import contextlib
+
+import pytest
+
+with contextlib.redirect_stdout(None):
+    from chatbot_logic import LeadScore, SCAN_CHUNK_CHARS, score_application
+
+
+def score(text: str) -> LeadScore:
+    with contextlib.redirect_stdout(None):
+        return score_application(text)
+
+
+@pytest.mark.parametrize("text, fragment, rule_id", [
+    ("Бюджет Полтора Миллиона, нужна арматура", "Полтора Миллиона", "thousand"),
+    ("Итого 150 000,50 руб по счёту, арматура", "150 000,50 руб", "rubles"),
+    ("Сумма 1 000 000 руб, балка", "1 000 000 руб", "rubles"),
+    ("заказ 1.000.000 руб", "1.000.000 руб", "rubles"),
+    ("Оплатим 2500000 рублей, арматура", "2500000 руб", "rubles"),
+    ("Хотим заказать профнастил на 150000 рублей, мой телефон +7 916 123-45-67", "150000 руб", "rubles"),
+    ("звоните +7 916 123-45-67, лист 2,5 тонны", "2,5 тонн", "quantity_estimate"),
+    ("арматура 2.5 т по 48000", "2.5 т по 48000", "quantity_price"),
+])
+def test_matched_is_original_substring(text, fragment, rule_id):
+    result = score(text)
+    assert result.rule_id == rule_id
+    assert result.matched == [fragment]
+    assert [text[begin:end] for begin, end in result.spans] == [fragment]
+
+
+def test_spans_point_into_later_chunks():
+    text = "Добрый день. " + "Интересует металлопрокат. " * (SCAN_CHUNK_CHARS // 20) + "Ориентировочно на 300 тыс."
+    result = score(text)
+    assert result.amount == 300000
+    (begin, end), = result.spans
+    assert begin > SCAN_CHUNK_CHARS
+    assert text[begin:end] == "300 тыс"
+
+
+def test_round_trip_keeps_spans_and_reads_old_snapshots():
+    result = score("Бюджет полтора миллиона, нужна арматура")
+    assert LeadScore.from_dict(result.to_dict()) == result
+
+    old = result.to_dict()
+    del old["spans"]
+    assert LeadScore.from_dict(old).spans == []
+    assert result.form_fields()["matched"] == "полтора миллиона"
+
+
+@pytest.mark.parametrize("text, amount", [
+    ("Сумма 1 000 000 руб, балка", 1_000_000),
+    ("Оплатим 2500000 рублей, арматура", 2_500_000),
+    ("Бюджет 1 500 000 руб, арматура", 1_500_000),
+])
+def test_grouped_ruble_amounts_use_rubles_rule(text, amount):
+    result = score(text)
+    assert (result.rule_id, result.amount) == ("rubles", amount)
+    assert result.confidence == 0.95
@@ -0,0 +1,86 @@
+import threading
+
+import pytest
+from replicate.stream import ServerSentEvent
+
+from llm_backends import ReplicateBackend, create_llm_backend
+
+
+def event(kind, data=""):
+    return ServerSentEvent(event=ServerSentEvent.EventType(kind), data=data, id="1")
+
+
+class FakeClient:
+    """Отдаёт события SSE по одному; следующее — только после разрешения теста."""
+
+    def __init__(self, events):
+        self.events = events
+        self.calls = []
+        self.step = threading.Semaphore(0)
+
+    def stream(self, model, input):
+        self.calls.append((model, input))
+        for item in self.events:
+            self.step.acquire()
+            yield item
+
+    def run(self, *args, **kwargs):
+        raise AssertionError("run() ждёт конца генерации, нужен stream()")
+
+
+def make_backend(events):
+    backend = ReplicateBackend("r8_test", model="meta/meta-llama-3-70b-instruct")
+    backend.client = FakeClient(events)
+    return backend
+
+
+def test_tokens_are_yielded_as_they_arrive():
+    backend = make_backend([event("output", "Здравст"), event("output", "вуйте"), event("done", "{}")])
+    chunks = backend.stream("промпт")
+
+    # Первый токен доступен, пока остальные ещё не сгенерированы
+    backend.client.step.release()
+    assert next(chunks) == "Здравст"
+    backend.client.step.release()
+    assert next(chunks) == "вуйте"
+    backend.client.step.release()
+    assert list(chunks) == []
+
+
+def test_logs_and_done_events_are_skipped():
+    backend = make_backend([event("logs", "loading"), event("output", "Да"), event("done", "{}")])
+    for _ in range(3):
+        backend.client.step.release()
+
+    assert list(backend.stream("промпт")) == ["Да"]
+    model, payload = backend.client.calls[0]
+    assert model == "meta/meta-llama-3-70b-instruct"
+    assert payload["prompt"] == "промпт"
+
+
+def test_backend_defaults_to_replicate(monkeypatch):
+    monkeypatch.delenv("LLM_BACKEND", raising=False)
+    monkeypatch.setenv("REPLICATE_MODEL", "meta/meta-llama-3-8b-instruct")
+
+    backend = create_llm_backend("r8_test")
+    assert isinstance(backend, ReplicateBackend)
+    assert backend.model == "meta/meta-llama-3-8b-instruct"
+
+
+def test_replicate_without_token_is_disabled(monkeypatch):
+    monkeypatch.setenv("LLM_BACKEND", "Replicate")
+    assert create_llm_backend(None) is None
+
+
+def test_llamacpp_without_model_fails(monkeypatch):
+    monkeypatch.setenv("LLM_BACKEND", "llamacpp")
+    monkeypatch.setenv("LLM_MODEL_PATH", "/nonexistent/model.gguf")
+    with pytest.raises(RuntimeError):
+        create_llm_backend("r8_test")
+
+
+@pytest.mark.parametrize("name", ["llama", "llama.cpp", "openai"])
+def test_unknown_backend_is_an_error(monkeypatch, name):
+    monkeypatch.setenv("LLM_BACKEND", name)
+    with pytest.raises(RuntimeError, match="LLM_BACKEND"):
+        create_llm_backend("r8_test")
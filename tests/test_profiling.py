@@ -0,0 +1,141 @@
+import re
+import time
+import asyncio
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+import profiling
+from profiling import sample_stacks, profile_event_loop, LoopLagMonitor, ProfilerBusy
+
+# Строка collapsed stacks: "поток;кадр;кадр N"
+FOLDED_LINE = re.compile(r"^[^;\n]+(;[^;\n]+ \([^():]+:\d+\))+ \d+$")
+
+
+def spin_until(stop: threading.Event):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+@pytest.fixture
+def busy_thread():
+    stop = threading.Event()
+    thread = threading.Thread(target=spin_until, args=(stop,), name="busy-worker")
+    thread.start()
+    yield thread
+    stop.set()
+    thread.join()
+
+
+def test_sample_stacks_output_is_collapsed_stacks(busy_thread):
+    report = sample_stacks(0.3, interval=0.005)
+
+    lines = report.splitlines()
+    assert report.endswith("\n")
+    assert all(FOLDED_LINE.match(line) for line in lines), lines[:3]
+    busy = [line for line in lines if line.startswith("busy-worker;")]
+    assert busy and any("spin_until (test_profiling.py:" in line for line in busy)
+    # Собственный поток профайлера в отчёт не попадает
+    assert not any("sample_stacks (profiling.py:" in line for line in lines)
+    # Строки отсортированы по числу выборок
+    counts = [int(line.rsplit(" ", 1)[1]) for line in lines]
+    assert counts == sorted(counts, reverse=True)
+
+
+def test_only_one_profile_at_a_time():
+    with profiling._profile_lock:
+        with pytest.raises(ProfilerBusy):
+            sample_stacks(0.1)
+        with pytest.raises(ProfilerBusy):
+            asyncio.run(profile_event_loop(0.1))
+
+
+def test_profile_event_loop_reports_handlers_run_meanwhile():
+    async def handler():
+        for _ in range(20):
+            sorted(range(2000), reverse=True)
+            await asyncio.sleep(0.005)
+
+    async def scenario():
+        profile = asyncio.create_task(profile_event_loop(0.3))
+        await handler()
+        return await profile
+
+    report = asyncio.run(scenario())
+    assert "function calls" in report
+    assert "Ordered by: cumulative time" in report
+    assert "handler" in report
+
+
+def block_loop(seconds: float):
+    time.sleep(seconds)
+
+
+def test_loop_lag_monitor_captures_stack_of_blocking_call():
+    async def scenario():
+        monitor = LoopLagMonitor(interval=0.02, threshold_ms=100)
+        monitor.start()
+        await asyncio.sleep(0.1)
+        block_loop(0.4)
+        await asyncio.sleep(0.1)
+        monitor.stop()
+        return monitor.report()
+
+    report = asyncio.run(scenario())
+    assert report["enabled"] is False
+    assert report["threshold_ms"] == 100
+    assert report["lag_ms"]["count"] > 0
+    assert report["lag_ms"]["max"] >= 300
+    stall = report["stalls"][0]
+    assert stall["lag_ms"] >= 100
+    assert any(frame.startswith("block_loop (test_profiling.py:") for frame in stall["stack"])
+
+
+@pytest.fixture
+def client(monkeypatch):
+    import main
+    monkeypatch.setattr(main, "ADMIN_TOKEN", "test-admin-token")
+    return TestClient(main.app)
+
+
+ADMIN = {"X-Admin-Token": "test-admin-token"}
+
+
+def test_admin_profile_requires_token(client):
+    assert client.get("/admin/profile", params={"seconds": 1}).status_code == 403
+
+
+@pytest.mark.parametrize("seconds", [0, 0.5, -1])
+def test_admin_profile_rejects_too_short_duration(client, seconds):
+    response = client.get("/admin/profile", params={"seconds": seconds}, headers=ADMIN)
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"] == ["query", "seconds"]
+
+
+def test_admin_profile_rejects_unknown_mode(client):
+    assert client.get("/admin/profile", params={"seconds": 1, "mode": "perf"}, headers=ADMIN).status_code == 400
+
+
+def test_admin_profile_sample_returns_folded_file(client, busy_thread):
+    response = client.get("/admin/profile", params={"seconds": 1, "interval_ms": 10}, headers=ADMIN)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert re.fullmatch(r'attachment; filename="profile-\d{8}-\d{6}\.folded"', response.headers["content-disposition"])
+    lines = response.text.splitlines()
+    assert lines and all(FOLDED_LINE.match(line) for line in lines)
+    assert any(line.startswith("busy-worker;") for line in lines)
+
+
+def test_admin_profile_cprofile_returns_pstats_report(client):
+    response = client.get("/admin/profile", params={"seconds": 1, "mode": "cprofile"}, headers=ADMIN)
+    assert response.status_code == 200
+    assert response.headers["content-disposition"].endswith('.txt"')
+    assert "function calls" in response.text
+
+
+def test_admin_profile_busy_returns_conflict(client):
+    with profiling._profile_lock:
+        response = client.get("/admin/profile", params={"seconds": 1}, headers=ADMIN)
+    assert response.status_code == 409
+    assert response.json() == {"error": "Профилирование уже идёт"}
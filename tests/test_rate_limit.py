@@ -0,0 +1,62 @@
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+from rate_limit import RateLimiter, InMemoryBucketStore, client_ip
+
+
+def test_client_ip_takes_entry_added_by_proxy():
+    # Левые записи присылает клиент, последнюю дописал прокси Render
+    assert client_ip("1.1.1.1, 2.2.2.2, 203.0.113.7", "10.0.0.5") == "203.0.113.7"
+    assert client_ip("203.0.113.7", "10.0.0.5") == "203.0.113.7"
+    assert client_ip("1.1.1.1, 198.51.100.1, 203.0.113.7", "10.0.0.5", hops=2) == "198.51.100.1"
+
+
+def test_client_ip_without_header_or_trusted_proxy():
+    assert client_ip(None, "10.0.0.5") == "10.0.0.5"
+    assert client_ip("", "10.0.0.5") == "10.0.0.5"
+    assert client_ip("1.1.1.1", "10.0.0.5", hops=0) == "10.0.0.5"
+
+
+class BrokenStore:
+    remote = True
+
+    def take(self, *args, **kwargs):
+        raise ConnectionError("redis down")
+
+
+def test_limiter_fails_open_when_store_is_unavailable():
+    limiter = RateLimiter("llm", {"session": (1, 60), "ip": (1, 60)}, BrokenStore())
+    assert limiter.check(session="s1", ip="203.0.113.7") == 0.0
+
+
+def test_limiter_counts_each_key_kind():
+    limiter = RateLimiter("llm", {"session": (2, 60), "ip": (3, 60)}, InMemoryBucketStore())
+    results = [limiter.check(session=f"s{i}", ip="203.0.113.7") for i in range(4)]
+    assert results[:3] == [0.0, 0.0, 0.0]
+    assert results[3] > 0
+
+
+@pytest.fixture(scope="module")
+def client():
+    import main
+    return TestClient(main.app)
+
+
+def test_spoofed_forwarded_for_does_not_bypass_ip_limit(client):
+    import main
+    capacity, _ = main.llm_limiter.limits["ip"]
+    real_ip = f"203.0.113.{uuid.uuid4().int % 250}"
+
+    statuses = []
+    for i in range(int(capacity) + 1):
+        response = client.post(
+            "/chat",
+            json={"message": "Какие есть трубы?", "session_id": uuid.uuid4().hex},
+            headers={"X-Forwarded-For": f"10.66.{i // 250}.{i % 250}, {real_ip}"},
+        )
+        statuses.append(response.status_code)
+
+    assert statuses[:-1] == [200] * int(capacity)
+    assert statuses[-1] == 429
@@ -0,0 +1,213 @@
+import uuid
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from replay_cache import ReplayCache, replay_key
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_first_call_begins_and_finish_stores_reply():
+    async def scenario():
+        cache = ReplayCache()
+        assert await cache.get_or_begin("s:1") is None
+        cache.finish("s:1", "Ответ")
+        return await cache.get_or_begin("s:1"), len(cache)
+
+    assert asyncio.run(scenario()) == ("Ответ", 1)
+
+
+def test_duplicate_waits_for_reply_in_progress():
+    async def scenario():
+        cache = ReplayCache()
+        assert await cache.get_or_begin("s:1") is None
+        waiters = [asyncio.create_task(cache.get_or_begin("s:1")) for _ in range(3)]
+        await asyncio.sleep(0)
+        assert not any(waiter.done() for waiter in waiters)
+        cache.finish("s:1", "Ответ")
+        return await asyncio.gather(*waiters)
+
+    assert asyncio.run(scenario()) == ["Ответ"] * 3
+
+
+def test_duplicate_retries_when_first_gets_no_reply():
+    async def scenario():
+        cache = ReplayCache()
+        assert await cache.get_or_begin("s:1") is None
+        waiter = asyncio.create_task(cache.get_or_begin("s:1"))
+        await asyncio.sleep(0)
+        cache.finish("s:1", None)
+        # Первый экземпляр упал в лимит — дубль обрабатывает сообщение сам
+        assert await waiter is None
+        cache.finish("s:1", "Ответ")
+        return await cache.get_or_begin("s:1"), len(cache)
+
+    assert asyncio.run(scenario()) == ("Ответ", 1)
+
+
+def test_entries_expire_after_ttl():
+    async def scenario():
+        clock = FakeClock()
+        cache = ReplayCache(ttl=600, clock=clock)
+        await cache.get_or_begin("s:1")
+        cache.finish("s:1", "Ответ")
+        clock.now += 600
+        assert await cache.get_or_begin("s:1") == "Ответ"
+        clock.now += 1
+        return await cache.get_or_begin("s:1"), len(cache)
+
+    assert asyncio.run(scenario()) == (None, 0)
+
+
+def test_least_recently_used_entry_is_evicted():
+    async def scenario():
+        cache = ReplayCache(max_entries=2)
+        for key in ("s:1", "s:2"):
+            await cache.get_or_begin(key)
+            cache.finish(key, f"Ответ {key}")
+        assert await cache.get_or_begin("s:1") == "Ответ s:1"  # s:1 свежее, чем s:2
+        await cache.get_or_begin("s:3")
+        cache.finish("s:3", "Ответ s:3")
+        return len(cache), await cache.get_or_begin("s:2"), await cache.get_or_begin("s:1")
+
+    assert asyncio.run(scenario()) == (2, None, "Ответ s:1")
+
+
+def test_replay_key_requires_message_id():
+    assert replay_key("s", "m-1") == "s:m-1"
+    assert replay_key("s", None) is None
+    assert replay_key("s", "") is None
+    assert replay_key("s", 42) is None
+    assert replay_key("s", "x" * 65) is None
+
+
+class CountingBackend:
+    """LLM без сети: считает генерации."""
+
+    name = "fake"
+
+    def __init__(self):
+        self.calls = 0
+
+    def stream(self, prompt: str):
+        self.calls += 1
+        yield "Лист 2 мм "
+        yield f"есть, ответ №{self.calls}"
+
+    def describe(self) -> str:
+        return "fake"
+
+
+@pytest.fixture(scope="module")
+def client():
+    import main
+    return TestClient(main.app)
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    import main
+    backend = CountingBackend()
+    monkeypatch.setattr(main, "llm_backend", backend)
+    return backend
+
+
+def chat(client, session_id: str, message_id: str, ip: str):
+    return client.post(
+        "/chat",
+        json={"message": "Какие есть листы?", "session_id": session_id, "message_id": message_id},
+        headers={"X-Forwarded-For": ip},
+    )
+
+
+def fresh_ids() -> tuple:
+    return uuid.uuid4().hex, f"203.0.113.{uuid.uuid4().int % 250}"
+
+
+def test_http_duplicate_gets_same_reply_without_llm(client, backend):
+    session_id, ip = fresh_ids()
+    first = chat(client, session_id, "m-1", ip)
+    second = chat(client, session_id, "m-1", ip)
+
+    assert first.status_code == second.status_code == 200
+    assert second.json() == first.json() == {"reply": "Лист 2 мм есть, ответ №1"}
+    assert backend.calls == 1
+    # Другой id — новое сообщение
+    assert chat(client, session_id, "m-2", ip).json() == {"reply": "Лист 2 мм есть, ответ №2"}
+
+
+def test_rate_limited_reply_is_not_cached(client, backend, monkeypatch):
+    import main
+    session_id, ip = fresh_ids()
+    with monkeypatch.context() as patch:
+        patch.setattr(main.llm_limiter, "check", lambda **kwargs: 5.0)
+        assert chat(client, session_id, "m-1", ip).status_code == 429
+
+    response = chat(client, session_id, "m-1", ip)
+    assert response.status_code == 200
+    assert response.json() == {"reply": "Лист 2 мм есть, ответ №1"}
+
+
+def test_overloaded_reply_is_not_cached(client, backend, monkeypatch):
+    import main
+
+    async def rejected():
+        return False
+
+    session_id, ip = fresh_ids()
+    with monkeypatch.context() as patch:
+        patch.setattr(main.llm_admission, "acquire", rejected)
+        assert chat(client, session_id, "m-1", ip).json() == {"reply": main.OVERLOADED_REPLY}
+
+    assert chat(client, session_id, "m-1", ip).json() == {"reply": "Лист 2 мм есть, ответ №1"}
+    assert backend.calls == 1
+
+
+def test_error_reply_is_not_cached(client, backend, monkeypatch):
+    def broken(prompt):
+        raise ConnectionError("replicate down")
+        yield
+
+    session_id, ip = fresh_ids()
+    with monkeypatch.context() as patch:
+        patch.setattr(backend, "stream", broken)
+        assert chat(client, session_id, "m-1", ip).json()["reply"].startswith("Ошибка:")
+
+    assert chat(client, session_id, "m-1", ip).json() == {"reply": "Лист 2 мм есть, ответ №1"}
+
+
+def receive_until_done(websocket) -> list:
+    frames = []
+    while not frames or frames[-1]["type"] not in ("done", "error"):
+        frames.append(websocket.receive_json())
+    return frames
+
+
+def test_websocket_duplicate_gets_same_reply_without_llm(client, backend):
+    session_id, ip = fresh_ids()
+    with client.websocket_connect(f"/ws/chat?session_id={session_id}", headers={"X-Forwarded-For": ip}) as websocket:
+        assert websocket.receive_json() == {"type": "session", "session_id": session_id}
+        message = {"type": "message", "text": "Какие есть листы?", "id": "m-1"}
+
+        websocket.send_json(message)
+        first = receive_until_done(websocket)
+        websocket.send_json(message)
+        second = receive_until_done(websocket)
+
+    assert [frame["type"] for frame in first] == ["typing", "token", "token", "done"]
+    assert first[-1]["reply"] == "Лист 2 мм есть, ответ №1"
+    # Дубль получает только готовый ответ: без typing и токенов
+    assert second == [{"type": "done", "reply": "Лист 2 мм есть, ответ №1"}]
+    assert backend.calls == 1
+
+    # Ретрай того же сообщения по HTTP получает ответ, сохранённый для WebSocket
+    assert chat(client, session_id, "m-1", ip).json() == {"reply": "Лист 2 мм есть, ответ №1"}
+    assert backend.calls == 1
@@ -0,0 +1,87 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from tracing import start_trace, span
+
+ADMIN = {"X-Admin-Token": "test-admin-token"}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    import main
+    monkeypatch.setattr(main, "ADMIN_TOKEN", "test-admin-token")
+    return TestClient(main.app)
+
+
+@pytest.mark.parametrize("path, model", [
+    ("/admin/stats", "AdminStatsResponse"),
+    ("/debug/traces", "DebugTracesResponse"),
+    ("/admin/loop-lag", "LoopLagResponse"),
+    ("/test/email", "EmailTestResponse"),
+])
+def test_endpoints_declare_response_models(client, path, model):
+    schema = client.get("/openapi.json").json()
+    response = schema["paths"][path]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+    assert response == {"$ref": f"#/components/schemas/{model}"}
+
+
+def test_debug_traces_payload(client, monkeypatch):
+    import main
+    import tracing
+    recorder = tracing.TraceRecorder(capacity=10)
+    monkeypatch.setattr(tracing, "recorder", recorder)
+    monkeypatch.setattr(main, "trace_recorder", recorder)
+    with start_trace("http.chat", session_id="s1", ip="203.0.113.7"):
+        with span("rate_limit", limiter="llm") as attrs:
+            attrs["retry_after"] = 0.0
+    with start_trace("http.chat", session_id="s2"):
+        pass
+
+    body = client.get("/debug/traces", params={"session_id": "s1"}, headers=ADMIN).json()
+    assert body["count"] == 1
+    trace, = body["traces"]
+    assert trace["session_id"] == "s1"
+    assert trace["attributes"] == {"ip": "203.0.113.7"}
+    assert [s["name"] for s in trace["spans"]] == ["rate_limit"]
+    assert trace["spans"][0]["attributes"] == {"limiter": "llm", "retry_after": 0.0}
+    assert client.get("/debug/traces").status_code == 403
+
+
+def test_loop_lag_payload(client, monkeypatch):
+    import main
+    monkeypatch.setattr(main.loop_monitor, "stalls", type(main.loop_monitor.stalls)(
+        [{"started_at": "2026-01-01T00:00:00", "stack": ["run (main.py:1)"], "lag_ms": 420}], maxlen=50))
+
+    body = client.get("/admin/loop-lag", headers=ADMIN).json()
+    assert body["enabled"] is False
+    assert set(body["lag_ms"]) == {"count", "avg", "p50", "p90", "p99", "max"}
+    assert body["stalls"] == [{"started_at": "2026-01-01T00:00:00", "stack": ["run (main.py:1)"], "lag_ms": 420}]
+    assert client.get("/admin/loop-lag").status_code == 403
+
+
+def test_email_endpoint_payload(client, monkeypatch):
+    import main
+    sent = []
+    monkeypatch.setattr(main, "send_application_email", lambda *args: sent.append("full") or True)
+    monkeypatch.setattr(main, "send_incomplete_application_email", lambda *args: sent.append("incomplete") or False)
+
+    body = client.get("/test/email").json()
+    assert sent == ["full", "incomplete"]
+    assert body["status"] == "test_completed"
+    assert (body["full_email_sent"], body["incomplete_email_sent"]) == (True, False)
+    assert body["test_data"] == {"amount": 75000, "phone": "+79161234567", "email": "test@example.com"}
+
+
+def test_email_endpoint_errors_keep_their_shape(client, monkeypatch):
+    import main
+
+    def broken(*args):
+        raise ConnectionError("formspree down")
+
+    monkeypatch.setattr(main, "send_application_email", broken)
+    assert client.get("/test/email").json() == {
+        "status": "error", "error": "formspree down", "formspree_url_set": True,
+    }
+
+    monkeypatch.setenv("ENVIRONMENT", "production")
+    assert client.get("/test/email").json() == {"error": "Доступ запрещен в production режиме"}
@@ -0,0 +1,81 @@
+"""Корпус для нормализации чисел и извлечения суммы заявки."""
+import contextlib
+
+import pytest
+
+from ru_numbers import normalize_numbers
+
+with contextlib.redirect_stdout(None):
+    from chatbot_logic import check_interesting_application
+
+NORMALIZED = [
+    ("полтора миллиона", "1500 тыс"),
+    ("сто тысяч", "100 тыс"),
+    ("двести пятьдесят тысяч", "250 тыс"),
+    ("1,5 млн", "1500 тыс"),
+    ("100 000 руб", "100000 руб"),
+    ("1 500 000 руб", "1500000 руб"),
+    ("150 000,50 руб", "150000 руб"),
+    ("1.000.000 руб", "1000000 руб"),
+    ("1,000,000 руб", "1000000 руб"),
+    ("1.000.000,50 руб", "1000000 руб"),
+    ("2,5 тонны", "2.5 тонны"),
+    ("2.5 тонны", "2.5 тонны"),
+    ("50000 руб", "50000 руб"),
+    ("20 тыс", "20 тыс"),
+    ("труба 57х3.5 ст20", "труба 57х3.5 ст20"),
+    ("пять пять", "5 5"),
+    # Неровные тысячи — без округления
+    ("заказ на 49,5 тыс руб", "заказ на 49.5 тыс руб"),
+    ("сорок девять тысяч девятьсот рублей", "49.9 тыс рублей"),
+    ("1,5 тыс", "1.5 тыс"),
+    ("тысяча двести", "1.2 тыс"),
+    # Группы через пробел без денег рядом — отдельные числа
+    ("купить уголок 100 100 шт", "купить уголок 100 100 шт"),
+    ("заказ 3 500 шт", "заказ 3 500 шт"),
+    ("труба 20 100 штук", "труба 20 100 штук"),
+]
+
+# (сообщение, заявка интересная, сумма; None — сумму не проверяем)
+MESSAGES = [
+    ("Хотим заказать профнастил на 150000 рублей, мой телефон +7 916 123-45-67", True, 150000),
+    ("Заказ на сумму 75000, швеллер 10П 30 шт", True, 75000),
+    ("Купить уголок 50х50х5, 2 тонны по 65000", True, None),
+    ("Бюджет полтора миллиона, нужна металлоконструкция, оформим договор", True, 1500000),
+    ("Цена 1,5 млн за партию", True, 1500000),
+    ("Оплатим 100 000 руб сразу, нужен лист", True, 100000),
+    ("Итого 150 000,50 руб по счёту, арматура", True, 150000),
+    ("Сумма заказа 1.000.000 руб, балка", True, 1000000),
+    ("заказ 1,000,000 руб", True, 1000000),
+    ("арматура, сто тысяч бюджет", True, 100000),
+    ("заказ двести пятьдесят тысяч", True, 250000),
+    ("лист 2,5 тонны", True, 125000),
+    ("арматура 2.5 т по 48000", True, 120000),
+    ("заказ на 75,5 тыс", True, 75500),
+    ("купить арматуру 20 тыс", False, 0),
+    ("заказ на 49,5 тыс руб", False, 0),
+    ("сорок девять тысяч девятьсот рублей за арматуру", False, 0),
+    ("купить арматуру 1,5 тыс", False, 0),
+    ("арматура тысяча двести", False, 0),
+    ("купить уголок 100 100 шт", False, 0),
+    ("заказ 3 500 шт", False, 0),
+    ("труба 20 100 штук", False, 0),
+    ("лист на 49 999 руб", False, 0),
+    ("арматура, звоните 89161234567", False, 0),
+    ("купить трубу, телефон 8 (916) 123-45-67", False, 0),
+    ("Здравствуйте! Есть ли в наличии труба 57х3.5 ст20?", False, 0),
+]
+
+
+@pytest.mark.parametrize("text, expected", NORMALIZED)
+def test_normalize_numbers(text, expected):
+    assert normalize_numbers(text) == expected
+
+
+@pytest.mark.parametrize("text, interesting, amount", MESSAGES)
+def test_amount_extractor(text, interesting, amount):
+    with contextlib.redirect_stdout(None):
+        result, found = check_interesting_application(text)
+    assert result is interesting
+    if amount is not None:
+        assert found == amount
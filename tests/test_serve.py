@@ -0,0 +1,28 @@
+"""Файлы воркеров в режиме WEB_CONCURRENCY > 1."""
+import serve
+
+
+def test_worker_path_suffixes_file_name():
+    assert serve.worker_path("/var/data/sessions.db", 2) == "/var/data/sessions-2.db"
+    assert serve.worker_path("sessions", 0) == "sessions-0"
+
+
+def test_empty_path_stays_disabled(monkeypatch):
+    monkeypatch.setattr(serve, "SESSION_DB_PATH", "")
+    monkeypatch.setattr(serve, "LEAD_DIGEST_DB_PATH", None)
+    monkeypatch.delenv("LEAD_DIGEST_DB_PATH", raising=False)
+    env = serve.worker_env(1)
+    assert env["SESSION_DB_PATH"] == ""
+    assert env["WORKER_ID"] == "1"
+    assert "LEAD_DIGEST_DB_PATH" not in env
+
+
+def test_explicit_digest_path_is_per_worker(monkeypatch):
+    monkeypatch.setattr(serve, "SESSION_DB_PATH", "/var/data/sessions.db")
+    monkeypatch.setattr(serve, "LEAD_DIGEST_DB_PATH", "/var/data/digest.db")
+    env = serve.worker_env(3)
+    assert env["SESSION_DB_PATH"] == "/var/data/sessions-3.db"
+    assert env["LEAD_DIGEST_DB_PATH"] == "/var/data/digest-3.db"
+
+    monkeypatch.setattr(serve, "LEAD_DIGEST_DB_PATH", "")
+    assert serve.worker_env(3)["LEAD_DIGEST_DB_PATH"] == ""
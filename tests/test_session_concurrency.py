@@ -0,0 +1,88 @@
+"""
+Стресс-тест блокировок сессий: параллельные сообщения одних и тех же
+посетителей не отправляют заявку дважды и не теряют обновления сессии.
+"""
+import time
+import uuid
+import asyncio
+import threading
+
+import httpx
+import pytest
+
+import main
+from sessions import SessionManager
+
+SESSIONS = 20
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    """Подменяем отправку письма: считаем вызовы и держим окно гонки открытым."""
+    calls = []
+    lock = threading.Lock()
+
+    def send_application_email(full_text, amount, phone, email, score=None):
+        time.sleep(0.02)  # как медленный Formspree: второй запрос успел бы проскочить
+        with lock:
+            calls.append((phone, email))
+        return True
+
+    monkeypatch.setattr(main, "send_application_email", send_application_email)
+    # asyncio.Lock привязывается к циклу при первом ожидании, а у каждого теста свой цикл
+    monkeypatch.setattr(main, "session_manager", SessionManager())
+    for limiter in (main.lead_limiter, main.llm_limiter):
+        monkeypatch.setattr(limiter, "limits", {kind: (10**6, 10**6) for kind in limiter.limits})
+    return calls
+
+
+async def post_all(requests: list) -> list:
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await asyncio.gather(*(client.post("/chat", json=body) for body in requests))
+
+
+def test_double_submit_sends_each_lead_once(sent):
+    prefix = uuid.uuid4().hex[:8]
+    requests = []
+    for i in range(SESSIONS):
+        body = {
+            "session_id": f"{prefix}-{i}",
+            "message": f"Нужна арматура на 300 тыс руб, тел +7916{i:07d}, почта buyer{i}@example.com",
+        }
+        requests += [body, dict(body)]  # двойной Enter: одно и то же сообщение дважды
+
+    responses = asyncio.run(post_all(requests))
+
+    assert all(response.status_code == 200 for response in responses)
+    assert len(sent) == SESSIONS
+    assert len(set(sent)) == SESSIONS
+    for i in range(SESSIONS):
+        session = main.user_sessions[f"{prefix}-{i}"]
+        assert session.email_sent and session.message_count == 2
+
+
+def test_concurrent_messages_do_not_lose_updates(sent):
+    prefix = uuid.uuid4().hex[:8]
+    per_session = 10
+    requests = [
+        {"session_id": f"{prefix}-{i}", "message": f"Позиция {n}: заказ на 200 тыс руб"}
+        for n in range(per_session)
+        for i in range(SESSIONS)
+    ]
+    # Контакты приходят одновременно с остальными сообщениями
+    for i in range(SESSIONS):
+        requests.append({"session_id": f"{prefix}-{i}", "message": f"По заказу на 200 тыс руб телефон +7916{i:07d}"})
+        requests.append({"session_id": f"{prefix}-{i}", "message": f"По заказу на 200 тыс руб почта buyer{i}@example.com"})
+
+    responses = asyncio.run(post_all(requests))
+
+    assert all(response.status_code == 200 for response in responses)
+    assert len(sent) == SESSIONS
+    for i in range(SESSIONS):
+        session = main.user_sessions[f"{prefix}-{i}"]
+        assert session.message_count == per_session + 2
+        assert len(session.transcript) == per_session + 2
+        assert session.phone and f"{i:07d}"[:-1] in session.phone
+        assert session.email == f"buyer{i}@example.com"
+        assert session.email_sent
@@ -0,0 +1,58 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from sessions import SessionRecord
+from session_store import SessionSnapshotStore
+
+
+def make_record(minutes_ago: float, phone: str = "+79161234567") -> SessionRecord:
+    record = SessionRecord(amount=1_500_000, created_at=datetime.now() - timedelta(minutes=minutes_ago))
+    record.transcript.append("Нужно арматуры на 1,5 млн руб")
+    record.transcript.append(f"телефон {phone}")
+    record.phone = phone
+    record.message_count = 2
+    return record
+
+
+def test_incremental_flush_and_reload(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    sessions = {"a": make_record(1), "b": make_record(2)}
+
+    store = SessionSnapshotStore(path)
+    store.mark_dirty("a")
+    store.mark_dirty("b")
+    assert store.flush(sessions) == 2
+    assert store.flush(sessions) == 0  # без изменений ничего не пишем
+
+    sessions["a"].email = "buyer@example.com"
+    store.mark_dirty("a")
+    store.mark_deleted("b")
+    assert store.flush(sessions) == 2
+    store.close()
+
+    restored = SessionSnapshotStore(path).load_all()
+    assert list(restored) == ["a"]
+    assert restored["a"].email == "buyer@example.com"
+    assert restored["a"].full_text == sessions["a"].full_text
+
+
+def test_restart_still_sends_incomplete_lead(tmp_path, monkeypatch):
+    """Посетитель оставил телефон, процесс перезапустился — письмо через 10 минут всё равно уходит."""
+    import main
+
+    path = str(tmp_path / "sessions.db")
+    store = SessionSnapshotStore(path)
+    store.mark_dirty("visitor")
+    store.flush({"visitor": make_record(11)})
+    store.close()
+
+    sent = []
+    monkeypatch.setattr(main, "send_incomplete_application_email", lambda *args: sent.append(args) or True)
+    monkeypatch.setattr(main, "user_sessions", SessionSnapshotStore(path).load_all())
+
+    asyncio.run(main.cleanup_old_sessions())
+
+    assert len(sent) == 1
+    text, amount, phone, email, score = sent[0]
+    assert amount == 1_500_000 and phone == "+79161234567" and email is None
+    assert main.user_sessions["visitor"].email_sent
@@ -0,0 +1,39 @@
+from sessions import TranscriptBuffer, SessionRecord
+
+
+def test_transcript_keeps_joined_text_and_parts():
+    transcript = TranscriptBuffer(max_turns=5, max_chars=100)
+    for message in ["труба 57х3.5", "строка\nс переносом", "телефон +79161234567"]:
+        transcript.append(message)
+
+    assert transcript.text == "труба 57х3.5\nстрока\nс переносом\nтелефон +79161234567"
+    assert transcript.parts == ["труба 57х3.5", "строка\nс переносом", "телефон +79161234567"]
+    assert transcript.last(2) == ["строка\nс переносом", "телефон +79161234567"]
+    assert len(transcript) == 3
+
+
+def test_transcript_evicts_oldest_by_turns_and_chars():
+    transcript = TranscriptBuffer(max_turns=3, max_chars=20)
+    for message in ["aaaa", "bbbb", "cccc", "dddd"]:
+        transcript.append(message)
+    assert transcript.parts == ["bbbb", "cccc", "dddd"]
+
+    transcript.append("x" * 15)
+    assert transcript.parts == ["dddd", "x" * 15]
+    assert transcript.text == "dddd\n" + "x" * 15
+
+    # Слишком длинное сообщение обрезается и остаётся единственным
+    transcript.append("y" * 50)
+    assert transcript.parts == ["y" * 20]
+
+
+def test_record_roundtrip_keeps_transcript():
+    record = SessionRecord(amount=1_500_000)
+    record.transcript.append("нужно 20 тонн арматуры")
+    record.transcript.append("почта\na@b.ru")
+    record.phone = "+79161234567"
+
+    restored = SessionRecord.from_dict(record.to_dict())
+    assert restored.transcript.parts == record.transcript.parts
+    assert restored.full_text == record.full_text
+    assert restored.phone == record.phone
@@ -0,0 +1,194 @@
+import gzip
+import json
+import shutil
+import subprocess
+
+import pytest
+from fastapi.testclient import TestClient
+
+import static_assets
+from static_assets import WidgetAssets, build_widget, minify_js
+
+
+def test_minify_strips_indentation_and_comment_lines():
+    source = "(function () {\n    // комментарий\n\n    const a = 1;   \n    return a / 2;\n})();\n"
+    assert minify_js(source) == "(function () {\nconst a = 1;\nreturn a / 2;\n})();\n"
+
+
+def test_minify_keeps_template_literals_intact():
+    source = (
+        "    const html = `<div>\n"
+        "        // не комментарий\n"
+        "\n"
+        "        ${name ? `<b>${name}</b>` : \"}\"} \n"
+        "    </div>`;\n"
+        "    // комментарий\n"
+        "    done();\n"
+    )
+    assert minify_js(source) == (
+        "const html = `<div>\n"
+        "        // не комментарий\n"
+        "\n"
+        "        ${name ? `<b>${name}</b>` : \"}\"} \n"
+        "    </div>`;\n"
+        "done();\n"
+    )
+
+
+def test_minify_keeps_continued_strings_and_regex_literals():
+    source = (
+        '    const text = "первая \\\n'
+        '    // вторая";\n'
+        "    const quotes = /[`'\"]/g;\n"
+        "    // комментарий\n"
+        "    const half = total / 2 / count;\n"
+    )
+    assert minify_js(source) == (
+        'const text = "первая \\\n'
+        '    // вторая";\n'
+        "const quotes = /[`'\"]/g;\n"
+        "const half = total / 2 / count;\n"
+    )
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="нужен node")
+def test_minified_widget_is_valid_javascript(tmp_path):
+    path = tmp_path / "widget.min.js"
+    path.write_bytes(build_widget(write=False)["variants"]["identity"])
+    result = subprocess.run(["node", "--check", str(path)], capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+
+@pytest.fixture
+def widget_tree(tmp_path, monkeypatch):
+    """Копия static/widget.js и пустой dist во временной папке."""
+    source = tmp_path / "widget.js"
+    shutil.copy(static_assets.WIDGET_SOURCE, source)
+    dist = tmp_path / "dist"
+    monkeypatch.setattr(static_assets, "WIDGET_SOURCE", str(source))
+    monkeypatch.setattr(static_assets, "DIST_DIR", str(dist))
+    monkeypatch.setattr(static_assets, "MANIFEST_PATH", str(dist / "manifest.json"))
+    return source, dist
+
+
+def test_fresh_dist_build_is_served(widget_tree):
+    _, dist = widget_tree
+    built = build_widget(write=True)
+    (dist / built["filename"]).write_bytes(b"// prebuilt")
+
+    assets = WidgetAssets()
+    assert assets.filename == built["filename"]
+    assert assets.variants["identity"] == b"// prebuilt"
+
+
+def test_stale_dist_build_is_not_served(widget_tree):
+    source, dist = widget_tree
+    old = build_widget(write=True)
+    source.write_text(source.read_text(encoding="utf-8") + "\nconsole.log('новая версия');\n", encoding="utf-8")
+
+    assets = WidgetAssets()
+    assert assets.filename != old["filename"]
+    assert assets.filename == build_widget(write=False)["filename"]
+    assert "console.log('новая версия');".encode() in assets.variants["identity"]
+
+
+def test_manifest_without_source_hash_is_rebuilt(widget_tree):
+    _, dist = widget_tree
+    built = build_widget(write=True)
+    manifest = json.loads((dist / "manifest.json").read_text(encoding="utf-8"))
+    del manifest["source"]
+    (dist / "manifest.json").write_text(json.dumps(manifest), encoding="utf-8")
+    (dist / built["filename"]).write_bytes(b"// prebuilt")
+
+    assert WidgetAssets().variants["identity"] == built["variants"]["identity"]
+
+
+@pytest.fixture(scope="module")
+def assets():
+    return WidgetAssets()
+
+
+@pytest.mark.parametrize("header, with_br, expected", [
+    (None, True, "identity"),
+    ("", True, "identity"),
+    ("gzip, deflate, br", True, "br"),
+    ("gzip, deflate, br", False, "gzip"),
+    ("gzip;q=0, br", True, "br"),
+    ("gzip;q=0", True, "identity"),
+    ("gzip; q=0.0, deflate", True, "identity"),
+    ("br;q=0, gzip;q=0.5", True, "gzip"),
+    ("br;q=0.5, gzip", True, "gzip"),
+    ("*", True, "br"),
+    ("*;q=0", True, "identity"),
+    ("*, gzip;q=0", False, "identity"),
+    ("GZIP", True, "gzip"),
+    ("gzip;q=abc", True, "identity"),
+])
+def test_pick_encoding_respects_quality(assets, monkeypatch, header, with_br, expected):
+    variants = dict(assets.variants)
+    variants["br"] = b"br"
+    if not with_br:
+        del variants["br"]
+    monkeypatch.setattr(assets, "variants", variants)
+    assert assets.pick_encoding(header) == expected
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, False),
+    ('"other"', False),
+    ("*", True),
+    ('"other", {etag}', True),
+    ("W/{etag}", True),
+])
+def test_not_modified(header, expected):
+    etag = '"abc"'
+    assert WidgetAssets.not_modified(header and header.format(etag=etag), etag) is expected
+
+
+@pytest.fixture(scope="module")
+def client():
+    import main
+    return TestClient(main.app)
+
+
+def test_loader_etag_and_304(client):
+    first = client.get("/static/widget.js")
+    assert first.status_code == 200
+    assert first.headers["cache-control"] == static_assets.LOADER_CACHE_CONTROL
+    etag = first.headers["etag"]
+
+    second = client.get("/static/widget.js", headers={"If-None-Match": etag})
+    assert second.status_code == 304
+    assert second.content == b""
+    assert second.headers["etag"] == etag
+    assert client.get("/static/widget.js", headers={"If-None-Match": '"stale"'}).status_code == 200
+
+
+def test_bundle_encoding_negotiation_and_304(client):
+    import main
+    filename = main.widget_assets.filename
+    url = f"/static/dist/{filename}"
+
+    compressed = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert compressed.status_code == 200
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in compressed.headers["vary"]
+    assert compressed.headers["cache-control"] == static_assets.IMMUTABLE_CACHE_CONTROL
+    assert compressed.content == main.widget_assets.variants["identity"]
+
+    refused = client.get(url, headers={"Accept-Encoding": "gzip;q=0"})
+    assert "content-encoding" not in refused.headers
+    assert refused.content == main.widget_assets.variants["identity"]
+    # У каждой кодировки свой ETag: сжатый ответ не подтверждает несжатый
+    assert refused.headers["etag"] != compressed.headers["etag"]
+    assert client.get(url, headers={"Accept-Encoding": "identity",
+                                    "If-None-Match": compressed.headers["etag"]}).status_code == 200
+
+    cached = client.get(url, headers={"Accept-Encoding": "gzip", "If-None-Match": compressed.headers["etag"]})
+    assert cached.status_code == 304
+    assert cached.headers["etag"] == compressed.headers["etag"]
+    assert gzip.decompress(main.widget_assets.variants["gzip"]) == main.widget_assets.variants["identity"]
+
+
+def test_unknown_bundle_is_404(client):
+    assert client.get("/static/dist/widget.000000000000.js").status_code == 404
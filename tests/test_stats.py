@@ -0,0 +1,154 @@
+import math
+import random
+
+import pytest
+from fastapi.testclient import TestClient
+
+from stats import SlidingWindowCounter, LatencySketch, DashboardStats
+
+
+class FakeClock:
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def exact_quantile(values: list, q: float) -> float:
+    """Тот же ранг, что и в LatencySketch.quantile: q * (n - 1) с округлением вниз."""
+    return sorted(values)[math.floor(q * (len(values) - 1))]
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_sketch_quantiles_within_relative_error(seed):
+    rng = random.Random(seed)
+    # Задержки LLM: медиана около секунды, длинный хвост
+    values = [rng.lognormvariate(7, 1) for _ in range(20_000)]
+    sketch = LatencySketch(relative_error=0.02)
+    for value in values:
+        sketch.add(value)
+
+    for q in (0.5, 0.9, 0.99, 0.999):
+        exact = exact_quantile(values, q)
+        assert sketch.quantile(q) == pytest.approx(exact, rel=0.021)
+    assert sketch.quantile(1.0) == pytest.approx(max(values), rel=0.021)
+    assert sketch.count == len(values)
+
+
+def test_sketch_values_below_min_value_are_not_reported_as_min_value():
+    sketch = LatencySketch(min_value=1.0)
+    sketch.add(0.3)
+    sketch.add(5000)
+    assert sketch.quantile(0.5) == pytest.approx(0.3)
+    assert sketch.quantile(1.0) == pytest.approx(5000, rel=0.02)
+
+    # В нулевой корзине отдаём среднее попавших туда значений
+    for value in (0.1, 0.2, 0.3):
+        sketch.add(value)
+    assert sketch.quantile(0.5) == pytest.approx(0.225)
+
+
+def test_sketch_values_above_max_value_are_capped_by_observed_max():
+    sketch = LatencySketch(max_value=1000)
+    sketch.add(10)
+    sketch.add(50_000)
+    assert sketch.quantile(1.0) == 50_000
+    assert sketch.summary()["max"] == 50_000
+
+
+def test_empty_sketch_summary():
+    assert LatencySketch().summary() == {"count": 0, "avg": None, "p50": None, "p90": None, "p99": None, "max": None}
+
+
+def test_window_keeps_events_until_their_bucket_leaves_window():
+    clock = FakeClock(36_000.0)  # начало минутной корзины
+    counter = SlidingWindowCounter(3600, buckets=60, clock=clock)  # корзины по минуте
+    counter.add(100)
+    clock.now += 30
+    counter.add(200)
+    clock.now += 1800
+    counter.add(300)
+
+    clock.now = 36_000 + 3599
+    assert counter.read() == (3, 600)
+    # Минута первых двух событий выпала из окна
+    clock.now = 36_000 + 3600
+    assert counter.read() == (1, 300)
+    clock.now = 36_000 + 1830 + 3600
+    assert counter.read() == (0, 0)
+
+
+def test_window_resets_after_long_idle():
+    clock = FakeClock()
+    counter = SlidingWindowCounter(60, buckets=6, clock=clock)
+    for _ in range(5):
+        counter.add(1)
+        clock.now += 7
+    assert counter.read() == (5, 5)
+
+    clock.now += 10 * 60
+    assert counter.read() == (0, 0)
+    counter.add(2)
+    assert counter.read() == (1, 2)
+
+
+def test_dashboard_snapshot_windows_and_bands():
+    clock = FakeClock(1_000_000.0)
+    stats = DashboardStats(clock=clock)
+    stats.record_message()
+    stats.record_lead(60_000)
+    stats.record_lead(2_000_000)
+    clock.now += 2 * 3600
+    stats.record_lead(700_000)
+    stats.record_cache("chat_replay", True)
+    stats.record_cache("chat_replay", False)
+    stats.record_cache("chat_replay", False)
+
+    snapshot = stats.snapshot()
+    assert snapshot["messages_last_hour"] == 0
+    assert snapshot["leads"]["last_hour"] == 1
+    assert snapshot["leads"]["last_hour_amount"] == 700_000
+    assert snapshot["leads"]["last_24h"] == 3
+    assert snapshot["leads"]["last_24h_amount"] == 2_760_000
+    assert snapshot["leads"]["total"] == 3
+    assert snapshot["leads"]["amount_bands"] == {
+        "50-100 тыс": 1, "100-500 тыс": 0, "0.5-1 млн": 1, "1-5 млн": 1, "от 5 млн": 0,
+    }
+    assert snapshot["cache"]["chat_replay"] == {"hits": 1, "misses": 2, "hit_ratio": 0.333}
+
+    clock.now += 86400
+    assert stats.snapshot()["leads"]["last_24h"] == 0
+
+
+@pytest.fixture
+def client(monkeypatch):
+    import main
+    monkeypatch.setattr(main, "ADMIN_TOKEN", "test-admin-token")
+    return TestClient(main.app)
+
+
+def test_admin_stats_requires_token(client):
+    assert client.get("/admin/stats").status_code == 403
+    assert client.get("/admin/stats", headers={"X-Admin-Token": "wrong"}).status_code == 403
+
+
+def test_admin_stats_payload(client):
+    import main
+    main.dashboard.record_llm(1200.0, 300.0)
+    response = client.get("/admin/stats", headers={"X-Admin-Token": "test-admin-token"})
+    assert response.status_code == 200
+    body = response.json()
+
+    assert body["worker_id"] == main.WORKER_ID
+    assert isinstance(body["sessions_active"], int)
+    assert body["llm_admission"]["max_concurrent"] == main.LLM_MAX_CONCURRENT
+    assert set(body["leads"]) == {
+        "last_hour", "last_hour_amount", "last_24h", "last_24h_amount", "total", "amount_bands", "emails_sent",
+    }
+    assert set(body["llm"]["latency_ms"]) == {"count", "avg", "p50", "p90", "p99", "max"}
+    assert body["llm"]["latency_ms"]["count"] >= 1
+    assert body["llm"]["first_token_ms"]["max"] >= 300.0
+    assert isinstance(body["llm"]["errors"], int)
+    for counters in body["cache"].values():
+        assert set(counters) == {"hits", "misses", "hit_ratio"}
@@ -0,0 +1,87 @@
+import json
+import asyncio
+
+from fastapi.testclient import TestClient
+
+import tracing
+from tracing import start_trace, span, current_request_id, OTLPFileExporter, TraceRecorder
+
+
+def test_spans_from_worker_threads_join_the_trace():
+    async def handler():
+        with start_trace("http.chat", session_id="s1") as trace:
+            with span("check_application") as attrs:
+                attrs["amount"] = 150_000
+
+            def in_thread():
+                with span("lead_handling"):
+                    return current_request_id()
+            request_id = await asyncio.to_thread(in_thread)
+        return trace, request_id
+
+    trace, request_id = asyncio.run(handler())
+    assert request_id == trace.request_id
+    spans = trace.to_dict()["spans"]
+    assert [s["name"] for s in spans] == ["check_application", "lead_handling"]
+    assert spans[0]["attributes"] == {"amount": 150_000}
+    assert trace.duration_ms >= spans[-1]["start_ms"]
+
+
+def test_span_outside_trace_is_a_noop():
+    with span("check_application", rule="million") as attrs:
+        attrs["amount"] = 1
+    assert attrs == {"rule": "million", "amount": 1}
+    assert current_request_id() == "-"
+
+
+def test_unsampled_session_gets_request_id_but_no_trace(monkeypatch):
+    recorder = TraceRecorder(capacity=10)
+    monkeypatch.setattr(tracing, "recorder", recorder)
+    monkeypatch.setattr(tracing, "TRACE_SAMPLE_RATE", 0.0)
+
+    with start_trace("http.chat", session_id="s1") as trace:
+        with span("rate_limit") as attrs:
+            attrs["retry_after"] = 0
+        request_id = current_request_id()
+    assert trace is None
+    assert len(request_id) == 16 and request_id != "-"
+    assert current_request_id() == "-"
+    assert recorder.recent() == []
+
+
+def test_sampling_keeps_whole_sessions():
+    sessions = [f"session-{i}" for i in range(10_000)]
+    sampled = [session for session in sessions if tracing.is_sampled(session, 0.1)]
+    assert 800 < len(sampled) < 1200
+    # Решение зависит только от сессии: все сообщения разговора в выборке или все вне её
+    assert all(tracing.is_sampled(session, 0.1) for session in sampled)
+    assert all(tracing.is_sampled(session, 1.0) for session in sessions[:10])
+    assert not any(tracing.is_sampled(session, 0.0) for session in sessions[:10])
+
+
+def test_otlp_exporter_writes_batches_off_the_request_path(tmp_path, monkeypatch):
+    path = tmp_path / "traces.jsonl"
+    exporter = OTLPFileExporter(str(path), flush_interval=0.01)
+    monkeypatch.setattr(tracing, "recorder", TraceRecorder(capacity=10, exporter=exporter))
+
+    for i in range(3):
+        with start_trace("http.chat", session_id=f"s{i}"):
+            with span("rate_limit"):
+                pass
+    exporter.close()
+
+    lines = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert len(lines) == 3
+    spans = lines[0]["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert [s["name"] for s in spans] == ["http.chat", "rate_limit"]
+    assert spans[1]["parentSpanId"] == spans[0]["spanId"]
+
+
+def test_admin_token_only_accepted_in_header(monkeypatch):
+    import main
+    monkeypatch.setattr(main, "ADMIN_TOKEN", "s3cret-token")
+    client = TestClient(main.app)
+
+    assert client.get("/debug/traces", params={"token": "s3cret-token"}).status_code == 403
+    assert client.get("/debug/traces", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    assert client.get("/debug/traces", headers={"X-Admin-Token": "s3cret-token"}).status_code == 200
@@ -0,0 +1,57 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from schemas import MAX_MESSAGE_CHARS, MAX_REQUEST_BYTES
+
+
+@pytest.fixture(scope="module")
+def client():
+    import main
+    return TestClient(main.app)
+
+
+def test_chat_validation_error_uses_chat_reply_shape(client):
+    response = client.post("/chat", json={"message": "а" * (MAX_MESSAGE_CHARS + 1)})
+    assert response.status_code == 422
+    body = response.json()
+    assert body["error"] == "validation_error"
+    assert "слишком длинное" in body["reply"]
+
+
+def test_other_endpoints_keep_default_validation_errors(client):
+    response = client.get("/admin/profile", params={"seconds": "abc"})
+    assert response.status_code == 422
+    body = response.json()
+    assert "reply" not in body
+    assert body["detail"][0]["loc"] == ["query", "seconds"]
+
+
+def chunked(body: bytes, size: int = 1024):
+    """Тело генератором: httpx шлёт его с Transfer-Encoding: chunked, без Content-Length."""
+    for start in range(0, len(body), size):
+        yield body[start:start + size]
+
+
+def test_oversized_body_is_rejected_by_content_length(client):
+    body = b'{"message": "' + b"a" * MAX_REQUEST_BYTES + b'"}'
+    response = client.post("/chat", content=body, headers={"Content-Type": "application/json"})
+    assert response.status_code == 413
+    assert "слишком длинное" in response.json()["reply"]
+
+
+def test_oversized_chunked_body_is_rejected(client):
+    body = b'{"message": "' + b"a" * MAX_REQUEST_BYTES + b'"}'
+    response = client.post("/chat", content=chunked(body), headers={"Content-Type": "application/json"})
+    assert response.status_code == 413
+    assert "слишком длинное" in response.json()["reply"]
+
+
+def test_small_chunked_body_reaches_handler(client):
+    body = json.dumps({"message": "а" * (MAX_MESSAGE_CHARS + 1)}, ensure_ascii=False).encode()
+    assert len(body) <= MAX_REQUEST_BYTES
+    response = client.post("/chat", content=chunked(body, 100), headers={"Content-Type": "application/json"})
+    # Тело дошло до валидации целиком — ошибка та же, что и с Content-Length
+    assert response.status_code == 422
+    assert response.json()["error"] == "validation_error"
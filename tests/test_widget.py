@@ -0,0 +1,83 @@
+"""
+Оконная отрисовка виджета (MAX_RENDERED / MAX_HISTORY) в jsdom.
+Нужны node и jsdom (npm install --no-save jsdom), иначе тесты пропускаются.
+"""
+import json
+import shutil
+import subprocess
+
+import pytest
+
+SCRIPT = r"""
+const { loadWidget } = require("./benchmarks/widget_render.js");
+
+async function rowsAfter(messages, expandAll) {
+    const widget = loadWidget(3);
+    for (let i = 0; i < messages; i++) {
+        await widget.send("Сообщение " + i);
+    }
+    const result = {
+        rows: widget.chat.children.length - 1,
+        loadEarlier: widget.loadEarlier.style.display,
+        lastRow: widget.chat.lastChild.textContent,
+    };
+    widget.loadEarlier.onclick();
+    result.rowsAfterOneClick = widget.chat.children.length - 1;
+    if (expandAll) {
+        while (widget.loadEarlier.style.display !== "none") {
+            widget.loadEarlier.onclick();
+        }
+        result.rowsExpanded = widget.chat.children.length - 1;
+        result.firstRow = widget.loadEarlier.nextSibling.textContent;
+    }
+    widget.window.close();
+    return result;
+}
+
+(async () => {
+    const out = {
+        short: await rowsAfter(10, false),
+        window: await rowsAfter(60, false),
+        history: await rowsAfter(600, true),
+    };
+    console.log(JSON.stringify(out));
+})();
+"""
+
+
+def _jsdom_available() -> bool:
+    if not shutil.which("node"):
+        return False
+    check = subprocess.run(["node", "-e", "require.resolve('jsdom')"], capture_output=True)
+    return check.returncode == 0
+
+
+pytestmark = pytest.mark.skipif(not _jsdom_available(), reason="нужны node и jsdom")
+
+
+@pytest.fixture(scope="module")
+def rendered():
+    result = subprocess.run(["node", "-e", SCRIPT], capture_output=True, text=True, timeout=120, check=True)
+    return json.loads(result.stdout)
+
+
+def test_short_history_is_fully_rendered(rendered):
+    assert rendered["short"]["rows"] == 20
+    assert rendered["short"]["loadEarlier"] == "none"
+    assert rendered["short"]["lastRow"] == "Бот: слово0 слово1 слово2 "
+
+
+def test_window_keeps_last_max_rendered_rows(rendered):
+    # 60 сообщений — 120 строк, в DOM только последние MAX_RENDERED = 100
+    assert rendered["window"]["rows"] == 100
+    assert rendered["window"]["loadEarlier"] == "block"
+    # "Показать ранние" подгружает LOAD_EARLIER_BATCH = 50, но не больше, чем есть
+    assert rendered["window"]["rowsAfterOneClick"] == 120
+
+
+def test_history_is_capped_at_max_history(rendered):
+    # 600 сообщений — 1200 строк, в памяти остаются последние MAX_HISTORY = 1000
+    assert rendered["history"]["rows"] == 100
+    assert rendered["history"]["rowsAfterOneClick"] == 150
+    assert rendered["history"]["rowsExpanded"] == 1000
+    assert rendered["history"]["firstRow"] == "Вы: Сообщение 100"
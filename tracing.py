@@ -0,0 +1,263 @@
+import os
+import json
+import time
+import uuid
+import zlib
+import queue
+import threading
+import contextvars
+from collections import deque
+from datetime import datetime
+
+# Текущая трасса запроса; asyncio.to_thread копирует контекст, поэтому спаны
+# из рабочих потоков попадают в ту же трассу
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+# id запроса без трассы (сессия не попала в выборку) — только для логов
+_request_id = contextvars.ContextVar("request_id", default="-")
+
+# Доля сессий, которые трассируются. Решение принимается по session_id,
+# поэтому разговор в /debug/traces?session_id= виден целиком или не виден вовсе
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+
+
+class Trace:
+    """Одна трасса: запрос /chat или сообщение WebSocket со всеми этапами обработки."""
+
+    __slots__ = ("request_id", "name", "session_id", "started_at", "_start", "duration_ms", "spans", "attributes")
+
+    def __init__(self, name: str, session_id: str = None, **attributes):
+        self.request_id = os.urandom(8).hex()
+        self.name = name
+        self.session_id = session_id
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.duration_ms = None
+        self.spans = []  # (имя, начало, конец, атрибуты); в миллисекунды переводим при чтении
+        self.attributes = attributes
+
+    def span_dicts(self) -> list:
+        return [
+            {
+                "name": name,
+                "start_ms": round((start - self._start) * 1000, 3),
+                "duration_ms": round((end - start) * 1000, 3),
+                "attributes": attributes,
+            }
+            for name, start, end, attributes in self.spans
+        ]
+
+    def to_dict(self) -> dict:
+        return {
+            "request_id": self.request_id,
+            "name": self.name,
+            "session_id": self.session_id,
+            "started_at": datetime.fromtimestamp(self.started_at).isoformat(),
+            "duration_ms": self.duration_ms,
+            "attributes": self.attributes,
+            "spans": self.span_dicts(),
+        }
+
+
+class OTLPFileExporter:
+    """
+    Пишет трассы в файл JSON Lines в формате OTLP/JSON (одна строка — один
+    ExportTraceServiceRequest), который понимает OpenTelemetry Collector (filelog/otlpjsonfile).
+
+    export() только кладёт трассу в очередь: сериализация и запись идут
+    в отдельном потоке пачками раз в flush_interval секунд, файл открыт всё время.
+    Поток не просыпается на каждый запрос и не отбирает GIL у event loop.
+    Если диск не успевает и очередь полна, трасса в файл не попадает
+    (в кольцевом буфере она остаётся).
+    """
+
+    def __init__(self, path: str, service_name: str = "fortis-chatbot",
+                 max_pending: int = 10_000, flush_interval: float = 1.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.service_name = service_name
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._file = open(path, "a", encoding="utf-8")
+        self._thread = threading.Thread(target=self._write_loop, name="otlp-file-exporter", daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _attributes(values: dict) -> list:
+        return [{"key": key, "value": {"stringValue": str(value)}} for key, value in values.items() if value is not None]
+
+    def export(self, trace: Trace):
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        """Дописываем очередь и закрываем файл (при остановке сервиса)."""
+        self._queue.put(None)
+        self._thread.join(timeout=10)
+
+    def _write_loop(self):
+        closing = False
+        while not closing:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            closing = None in batch
+            lines = [self._serialize(trace) for trace in batch if trace is not None]
+            try:
+                self._file.write("".join(line + "\n" for line in lines))
+                self._file.flush()
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Не удалось экспортировать {len(lines)} трасс: {e}")
+            if not closing:
+                time.sleep(self.flush_interval)
+        self._file.close()
+
+    def _serialize(self, trace: Trace) -> str:
+        trace_id = uuid.UUID(int=int(trace.request_id, 16)).hex
+        root_id = trace.request_id
+        start_ns = int(trace.started_at * 1e9)
+        spans = [{
+            "traceId": trace_id,
+            "spanId": root_id,
+            "name": trace.name,
+            "startTimeUnixNano": str(start_ns),
+            "endTimeUnixNano": str(start_ns + int(trace.duration_ms * 1e6)),
+            "attributes": self._attributes({"session_id": trace.session_id, **trace.attributes}),
+        }]
+        for i, span in enumerate(trace.span_dicts()):
+            span_start = start_ns + int(span["start_ms"] * 1e6)
+            spans.append({
+                "traceId": trace_id,
+                "spanId": f"{root_id[:12]}{i:04x}",
+                "parentSpanId": root_id,
+                "name": span["name"],
+                "startTimeUnixNano": str(span_start),
+                "endTimeUnixNano": str(span_start + int(span["duration_ms"] * 1e6)),
+                "attributes": self._attributes(span["attributes"]),
+            })
+
+        return json.dumps({"resourceSpans": [{
+            "resource": {"attributes": self._attributes({"service.name": self.service_name})},
+            "scopeSpans": [{"scope": {"name": "fortis.tracing"}, "spans": spans}],
+        }]}, ensure_ascii=False)
+
+
+class TraceRecorder:
+    """Кольцевой буфер последних трасс в памяти (+ необязательный экспорт в файл)."""
+
+    def __init__(self, capacity: int, exporter: OTLPFileExporter = None):
+        self._traces = deque(maxlen=capacity)
+        self.exporter = exporter
+
+    def record(self, trace: Trace):
+        self._traces.append(trace)
+        if self.exporter:
+            self.exporter.export(trace)
+
+    def close(self):
+        if self.exporter:
+            self.exporter.close()
+
+    def recent(self, limit: int = 50, session_id: str = None) -> list:
+        """Последние трассы, новые сверху; с session_id — таймлайн одного разговора."""
+        result = []
+        for trace in reversed(self._traces):
+            if session_id and trace.session_id != session_id:
+                continue
+            result.append(trace.to_dict())
+            if len(result) >= limit:
+                break
+        return result
+
+
+def _create_exporter():
+    path = os.getenv("TRACE_OTLP_FILE")
+    if not path:
+        return None
+    try:
+        return OTLPFileExporter(path)
+    except OSError as e:
+        print(f"⚠️ Экспорт трасс в {path} отключён: {e}")
+        return None
+
+
+recorder = TraceRecorder(
+    capacity=int(os.getenv("TRACE_BUFFER_SIZE", "500")),
+    exporter=_create_exporter(),
+)
+
+
+def is_sampled(session_id: str, rate: float = None) -> bool:
+    """Попадает ли сессия в выборку трассировки (детерминированно по session_id)."""
+    rate = TRACE_SAMPLE_RATE if rate is None else rate
+    if rate >= 1:
+        return True
+    if rate <= 0:
+        return False
+    return zlib.crc32((session_id or "").encode()) < rate * 2**32
+
+
+class start_trace:
+    """
+    Открываем трассу на время обработки запроса:
+        with start_trace("http.chat", session_id=...) as trace: ...
+    Для сессии вне выборки (TRACE_SAMPLE_RATE) trace — None: спаны ничего
+    не делают, в буфер ничего не пишется, в логах остаётся только id запроса.
+    Класс, а не @contextmanager — по той же причине, что и span.
+    """
+
+    __slots__ = ("trace", "_token")
+
+    def __init__(self, name: str, session_id: str = None, **attributes):
+        self.trace = Trace(name, session_id, **attributes) if is_sampled(session_id) else None
+
+    def __enter__(self):
+        if self.trace is None:
+            self._token = _request_id.set(os.urandom(8).hex())
+        else:
+            self._token = _current_trace.set(self.trace)
+        return self.trace
+
+    def __exit__(self, *exc_info):
+        trace = self.trace
+        if trace is None:
+            _request_id.reset(self._token)
+            return False
+        trace.duration_ms = round((time.perf_counter() - trace._start) * 1000, 3)
+        _current_trace.reset(self._token)
+        recorder.record(trace)
+        return False
+
+
+class span:
+    """
+    Этап внутри текущей трассы. Вне трассы ничего не делает.
+        with span("rate_limit", limiter="llm") as attrs: attrs["retry_after"] = ...
+    Класс, а не @contextmanager: спанов несколько на запрос, генератор заметно дороже.
+    """
+
+    __slots__ = ("name", "attributes", "trace", "start")
+
+    def __init__(self, name: str, **attributes):
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self) -> dict:
+        self.trace = _current_trace.get()
+        if self.trace is not None:
+            self.start = time.perf_counter()
+        return self.attributes
+
+    def __exit__(self, *exc_info):
+        if self.trace is not None:
+            self.trace.spans.append((self.name, self.start, time.perf_counter(), self.attributes))
+        return False
+
+
+def current_request_id() -> str:
+    trace = _current_trace.get()
+    return trace.request_id if trace else _request_id.get()